@@ -1,70 +1,91 @@
 # api/v1/routes.py
-from fastapi import APIRouter, HTTPException, BackgroundTasks
+from fastapi import APIRouter, HTTPException, BackgroundTasks, Header
 from loguru import logger
-import asyncio # NEW: Import asyncio for concurrent processing
+from typing import List, Optional
+import asyncio
 import traceback
 
-from models.request_response import RAGRequest, RAGResponse
-from services.document_loader import DocumentLoader
-from services.vector_store import VectorStoreManager
-from services.agent_executor import RAGAgentExecutor
+from models.request_response import RAGRequest, RAGResponse, JobSubmitResponse, JobStatusResponse
+from services.pipeline import document_registry, answer_questions
 from services.response_builder import ResponseBuilder
+from services.job_manager import job_manager, JobQueueFullError
+from core.admission import admission_controller, AdmissionRejected, Ticket
+from core.config import settings
+from core.metrics import request_id_var
+from core.profiling import request_profiler
+from utils.file_downloader import FileDownloader
 
 router = APIRouter()
 
+def _check_document_count(document_urls: List[str]):
+    """Reject requests with more documents than one request may index"""
+    if len(document_urls) > settings.MAX_DOCUMENTS_PER_REQUEST:
+        raise HTTPException(
+            status_code=422,
+            detail=f"At most {settings.MAX_DOCUMENTS_PER_REQUEST} documents per request"
+        )
+
+async def _admit(request: RAGRequest, authorization: Optional[str]) -> Ticket:
+    """Reserve a share of the concurrency budget, or reject with 429/503 and Retry-After"""
+    token = authorization.split(" ", 1)[-1] if authorization else None
+    weight = admission_controller.weigh(len(request.questions))
+    try:
+        if settings.ADMISSION_PROBE_DOCUMENT_SIZE:
+            # Requests that would be rejected anyway are turned away before the size probes
+            admission_controller.check(weight, token=token)
+            async with FileDownloader() as downloader:
+                sizes = await asyncio.gather(*(downloader.probe_size(url) for url in request.document_urls()))
+            weight = admission_controller.weigh(len(request.questions), sum(size or 0 for size in sizes))
+        return await admission_controller.acquire(weight, token=token)
+    except AdmissionRejected as e:
+        logger.warning(f"Rejected request of weight {weight:.1f}: {e.detail}")
+        raise HTTPException(
+            status_code=e.status_code,
+            detail=e.detail,
+            headers={"Retry-After": str(e.retry_after)}
+        )
+
 @router.post("/hackrx/run", response_model=RAGResponse)
-async def run_rag_pipeline(request: RAGRequest, background_tasks: BackgroundTasks):
+async def run_rag_pipeline(
+    request: RAGRequest,
+    background_tasks: BackgroundTasks,
+    authorization: Optional[str] = Header(None),
+    x_profile: Optional[str] = Header(None)
+):
     """
     MODIFIED: High-performance RAG pipeline that completes question fragments
     and processes all questions concurrently.
     """
-    try:
-        logger.info(f"Processing RAG request with {len(request.questions)} questions")
-        
-        # Steps 1, 2, and 3 remain sequential as they are prerequisites
-        logger.info("Step 1: Loading and processing document...")
-        document_loader = DocumentLoader()
-        documents = await document_loader.load_from_url(str(request.documents))
-        
-        logger.info("Step 2: Creating embeddings and storing in vector database...")
-        vector_store = VectorStoreManager()
-        await vector_store.initialize()
-        doc_ids = await vector_store.add_documents(documents)
-        
-        logger.info("Step 3: Initializing agent executor...")
-        agent_executor = RAGAgentExecutor(vector_store)
-        
-        # MODIFIED: Step 4 now runs all questions in parallel for maximum speed
-        logger.info("Step 4: Processing questions concurrently through agent...")
-        
-        async def process_single_question(question: str, index: int):
-            """Helper function to manage the completion and processing of one question."""
-            logger.info(f"Starting pipeline for question {index}/{len(request.questions)}...")
-            try:
-                # NEW: First, complete the question if it's a fragment
-                completed_question = await agent_executor.complete_question(question)
-                if completed_question != question:
-                    logger.info(f"Completed Q{index}: '{question[:50]}...' -> '{completed_question[:100]}...'")
+    profiling = request_profiler.wanted(authorization, x_profile)
+    async with request_profiler.profile(request_id_var.get(), enabled=profiling):
+        return await _run_rag_pipeline(request, background_tasks, authorization)
 
-                # Then, process the now-complete question
-                answer = await agent_executor.process_question(completed_question)
-                return answer
-            except Exception as e:
-                logger.error(f"Error processing question {index}: {str(e)}")
-                return f"An error occurred while processing this question."
 
-        # Create a list of concurrent tasks
-        tasks = [process_single_question(q, i+1) for i, q in enumerate(request.questions)]
+async def _run_rag_pipeline(request: RAGRequest, background_tasks: BackgroundTasks, authorization: Optional[str]):
+    document_urls = request.document_urls()
+    _check_document_count(document_urls)
+    
+    ticket = await _admit(request, authorization)
+    try:
+        logger.info(f"Processing RAG request with {len(document_urls)} documents and {len(request.questions)} questions")
         
-        # Execute all tasks in parallel and gather the results
-        answers = await asyncio.gather(*tasks, return_exceptions=True)
+        # Steps 1 and 2 are prerequisites, step 4 runs all questions in parallel.
+        # Documents are indexed in parallel, and concurrent requests for the same document share one ingestion
+        leases = await document_registry.acquire_all(document_urls)
+        try:
+            answers = await answer_questions([lease.indexed for lease in leases], request.questions)
+        except Exception:
+            for lease in leases:
+                await lease.release()
+            raise
         
         logger.info("Step 5: Building structured response...")
         response_builder = ResponseBuilder()
         structured_response = response_builder.build_response(answers)
         
-        # Cleanup runs in the background after the response is sent
-        background_tasks.add_task(vector_store.cleanup, doc_ids)
+        # Cleanup runs in the background after the response is sent, once no other request uses the document
+        for lease in leases:
+            background_tasks.add_task(lease.release)
         
         logger.info("RAG pipeline completed successfully")
         return structured_response
@@ -75,4 +96,25 @@ async def run_rag_pipeline(request: RAGRequest, background_tasks: BackgroundTask
         raise HTTPException(
             status_code=500,
             detail=f"Internal server error: {str(e)}"
-        )
\ No newline at end of file
+        )
+    finally:
+        admission_controller.release(ticket)
+
+@router.post("/jobs", response_model=JobSubmitResponse, status_code=202)
+async def submit_job(request: RAGRequest):
+    """Queue a RAG request and return immediately; poll GET /jobs/{job_id} for answers"""
+    document_urls = request.document_urls()
+    _check_document_count(document_urls)
+    try:
+        job_id = await job_manager.submit(document_urls, request.questions)
+    except JobQueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return JobSubmitResponse(job_id=job_id, status="queued")
+
+@router.get("/jobs/{job_id}", response_model=JobStatusResponse)
+async def get_job(job_id: str):
+    """Progress and the answers finished so far"""
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return job
@@ -1,44 +1,36 @@
 # app/main.py
-from fastapi import FastAPI, HTTPException, Depends, Security
+from fastapi import FastAPI, HTTPException, Depends, Security, Request, Response
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 import uvicorn
 from core.config import settings
-from core.logger import setup_logger
+from core.logger import setup_logger, sample_request_logs
 from app.api.v1.router import router as api_router
+from services.job_manager import job_manager
+from core.metrics import request_id_var, new_request_id, observe_stage
+from core.loop_watchdog import loop_watchdog
+from core import offload
+from services.warmup import warmup
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, generate_latest
+from prometheus_client.openmetrics.exposition import CONTENT_TYPE_LATEST as OPENMETRICS_CONTENT_TYPE
+from prometheus_client.openmetrics.exposition import generate_latest as generate_openmetrics
+import time
 
 # Setup logger
 logger = setup_logger()
 
-# In a startup script or at the top of main.py, before the app starts
-
 import os
-import json
-
-# Assume 'load_secret_from_manager' is your function to get the JSON string
-def load_secret_from_manager():
-    # In a real app, this would fetch from HashiCorp Vault, AWS Secrets Manager, etc.
-    # For this example, we'll just read from a local file to simulate.
-    with open("secrets/logistics-truck-8e649bec2a5b.json", "r") as f:
-        return f.read()
 
 def setup_gcp_credentials():
     """
-    Loads the GCP credential from a secret manager and saves it to a temporary file.
-    Sets the required environment variable.
+    Point Google Cloud libraries at the service account file, unless the environment
+    already does. The file is only referenced, never rewritten on import.
     """
-    gcp_json_content = load_secret_from_manager()
-    
-    # Define a path for the temporary credentials file
     credentials_path = "secrets/logistics-truck-8e649bec2a5b.json"
-
-    # Write the content to the file
-    with open(credentials_path, "w") as f:
-        f.write(gcp_json_content)
-    
-    # Set the environment variable that Google Cloud libraries automatically look for
-    os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = credentials_path
-    print(f"GCP credentials set up at: {credentials_path}")
+    if "GOOGLE_APPLICATION_CREDENTIALS" not in os.environ and os.path.exists(credentials_path):
+        os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = credentials_path
+        logger.info(f"GCP credentials set up at: {credentials_path}")
 
 # Run this setup function before initializing any services
 setup_gcp_credentials()
@@ -59,6 +51,22 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def request_context(request: Request, call_next):
+    """Give every request an id for logs and metric exemplars, and time it"""
+    request_id = request.headers.get("X-Request-ID") or new_request_id()
+    token = request_id_var.set(request_id)
+    sample_request_logs()
+    started = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        if request.url.path != "/metrics":
+            observe_stage("request", time.perf_counter() - started)
+        request_id_var.reset(token)
+    response.headers["X-Request-ID"] = request_id
+    return response
+
 # Security
 security = HTTPBearer()
 
@@ -70,14 +78,58 @@ def verify_token(credentials: HTTPAuthorizationCredentials = Security(security))
 # Include API routes
 app.include_router(api_router, prefix="/api/v1", dependencies=[Depends(verify_token)])
 
+@app.on_event("startup")
+async def start_job_manager():
+    await job_manager.start()
+
+@app.on_event("startup")
+async def start_loop_watchdog():
+    if settings.LOOP_WATCHDOG_ENABLED:
+        loop_watchdog.start()
+
+@app.on_event("startup")
+async def start_warmup():
+    if settings.WARMUP_ENABLED:
+        warmup.start()
+    else:
+        warmup.skip()
+
+@app.on_event("shutdown")
+async def stop_job_manager():
+    await job_manager.stop()
+
+@app.on_event("shutdown")
+async def stop_background_workers():
+    await warmup.stop()
+    await loop_watchdog.stop()
+    offload.shutdown()
+    # Flush records still queued for the log writer
+    await logger.complete()
+
 @app.get("/")
 async def root():
     return {"message": "Agentic RAG Backend is running!"}
 
+@app.get("/metrics")
+async def metrics(request: Request):
+    """Prometheus metrics; OpenMetrics (with request id exemplars) when the scraper asks for it"""
+    if "application/openmetrics-text" in request.headers.get("Accept", ""):
+        return Response(generate_openmetrics(REGISTRY), media_type=OPENMETRICS_CONTENT_TYPE)
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
 @app.get("/health")
 async def health_check():
     return {"status": "healthy", "version": "1.0.0"}
 
+@app.get("/ready")
+async def readiness_check():
+    """Ready once the start-up warm-up has finished; 503 with the state of each step until then"""
+    ready = warmup.ready
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"status": "ready" if ready else "warming_up", "steps": warmup.status}
+    )
+
 if __name__ == "__main__":
     uvicorn.run(
         "main:app",
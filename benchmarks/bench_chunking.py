@@ -0,0 +1,84 @@
+# benchmarks/bench_chunking.py
+"""
+Chunking throughput on large synthetic policies, after a check that a section header
+in the last window of a document still starts a span of its own.
+
+Usage: python -m benchmarks.bench_chunking --size-mb 5 --repeat 3
+"""
+import argparse
+import time
+from typing import Callable, List
+
+from langchain.schema import Document
+
+from benchmarks.policy_corpus import generate_policy_pages
+from utils.chunking import AdvancedChunker
+
+
+def _legacy_split(documents: List[Document], encoding) -> List[Document]:
+    """The previous DocumentLoader path: character splitting plus a re-encode per chunk"""
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=1000,
+        chunk_overlap=200,
+        separators=["\n\n", "\n", ".", "!", "?", ",", " ", ""]
+    )
+    chunks = splitter.split_documents(documents)
+    for chunk in chunks:
+        chunk.metadata["token_count"] = len(encoding.encode(chunk.page_content))
+    return chunks
+
+
+def check_final_header(chunker: AdvancedChunker) -> None:
+    """Regression check: the last section's header is cut at even inside the final window"""
+    body = "The insured person shall follow the conditions of this policy at all times.\n" * 40
+    tail = "Cataract surgery is covered after twenty four months.\n" * 2
+    text = f"EXCLUSIONS:\n{body}WAITING PERIOD:\n{tail}"
+    spans = chunker.split_text_spans(text)
+    header_start = text.index("WAITING PERIOD:")
+    last = spans[-1]
+    assert last.start == header_start and last.section == "waiting period", \
+        f"final span {last.start}-{last.end} ({last.section}) does not start at the header at {header_start}"
+    assert all(span.end <= header_start for span in spans[:-1]), "a span crosses the final section header"
+    print("final window: section header near the end of the document starts its own span")
+
+
+def _measure(name: str, func: Callable[[], list], size_bytes: int, repeat: int) -> None:
+    best = float("inf")
+    count = 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        count = len(func())
+        best = min(best, time.perf_counter() - started)
+    print(f"{name:<28} {size_bytes / best / 1e6:8.2f} MB/s  {best * 1000:9.1f} ms  {count:6d} chunks")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--size-mb", type=float, default=5.0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--chunk-tokens", type=int, default=250)
+    parser.add_argument("--overlap-tokens", type=int, default=50)
+    parser.add_argument("--skip-legacy", action="store_true")
+    args = parser.parse_args()
+
+    pages = generate_policy_pages(args.size_mb)
+    documents = [Document(page_content=page, metadata={"source": "bench", "page": i}) for i, page in enumerate(pages)]
+    size_bytes = sum(len(page.encode("utf-8")) for page in pages)
+    text = "\n\n".join(pages)
+
+    chunker = AdvancedChunker(chunk_size=args.chunk_tokens, chunk_overlap=args.overlap_tokens)
+    chunker.split_text_spans(text[:10000])  # warm the encoding
+    check_final_header(chunker)
+
+    print(f"{len(pages)} pages, {size_bytes / 1e6:.2f} MB")
+    _measure("spans (policy)", lambda: chunker.split_text_spans(text), size_bytes, args.repeat)
+    _measure("documents (policy)", lambda: chunker.chunk_documents(documents, "policy"), size_bytes, args.repeat)
+    _measure("documents (general)", lambda: chunker.chunk_documents(documents, "general"), size_bytes, args.repeat)
+    if not args.skip_legacy:
+        _measure("legacy char splitter", lambda: _legacy_split(documents, chunker.encoding), size_bytes, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+# benchmarks/bench_e2e.py
+"""
+End-to-end benchmark of POST /api/v1/hackrx/run without any external service.
+
+Gemini is replaced by `FakeChatModel` (lognormal latency, optional 429s), the embedding
+API by `HashEmbeddings`, Pinecone by the in-memory vector backend, and documents are
+synthetic policy PDFs served from a local HTTP server. Requests go through the real
+FastAPI app (middleware, auth, admission control, singleflight ingestion, agent).
+
+For every combination of document size, question count and concurrency it reports
+throughput, latency percentiles, LLM calls per question and peak memory, and writes
+everything to a JSON file so runs can be compared.
+
+With `--record PATH` the fake model calls are also written to a cassette; `--replay PATH`
+answers from a cassette instead (e.g. one recorded against Gemini with LLM_CASSETTE_MODE),
+with the recorded latencies scaled by `--replay-latency-scale`.
+
+Usage: python -m benchmarks.bench_e2e --doc-sizes-mb 0.1,0.5 --questions 5,10 --concurrency 1,4
+"""
+import argparse
+import asyncio
+import functools
+import http.server
+import itertools
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from typing import Dict, List
+
+import numpy as np
+
+# Must be set before the application's settings are imported
+os.environ["VECTOR_BACKEND"] = "memory"
+# Later rounds would be answered from the shared cache; SHARED_CACHE_ENABLED=true measures warm runs
+os.environ.setdefault("SHARED_CACHE_ENABLED", "false")
+
+from benchmarks.fakes import FakeChatModel, HashEmbeddings, ModelCallStats
+from benchmarks.policy_corpus import generate_policy_pages, write_policy_pdf
+
+QUESTIONS = [
+    "What is the waiting period for pre-existing diseases?",
+    "What is the room rent limit per day?",
+    "Is cataract surgery covered, and up to what amount?",
+    "What co-payment applies to insured persons above 60?",
+    "Are maternity expenses covered under this policy?",
+    "How much is payable for ambulance charges?",
+    "Within how many days must a claim be intimated to the TPA?",
+    "Which items of personal comfort are excluded?",
+    "How does the grievance redressal procedure work?",
+    "Can the policy be ported to another insurer?",
+]
+
+class _QuietHandler(http.server.SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+def serve_directory(directory: str) -> http.server.ThreadingHTTPServer:
+    """Serve `directory` over HTTP on a free local port, from a background thread"""
+    handler = functools.partial(_QuietHandler, directory=directory)
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def _percentile(values: List[float], q: float) -> float:
+    return float(np.percentile(values, q)) if values else 0.0
+
+
+def _llm_calls() -> float:
+    from prometheus_client import REGISTRY
+    return REGISTRY.get_sample_value("rag_stage_duration_seconds_count", {"stage": "llm_call"}) or 0.0
+
+
+def _peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+async def run_scenario(client, base_url: str, pdf_dir: str, stats: ModelCallStats, args,
+                       size_mb: float, question_count: int, concurrency: int) -> Dict:
+    # Every request gets its own document, so ingestion is part of what is measured
+    total_requests = concurrency * args.rounds
+    urls, document_bytes = [], 0
+    for i in range(total_requests):
+        name = f"policy-{size_mb}mb-{question_count}q-{concurrency}c-{i}.pdf"
+        pages = generate_policy_pages(size_mb, seed=hash((size_mb, question_count, concurrency, i)) & 0xFFFF)
+        document_bytes = write_policy_pdf(os.path.join(pdf_dir, name), pages)
+        urls.append(f"{base_url}/{name}")
+    questions = [QUESTIONS[i % len(QUESTIONS)] for i in range(question_count)]
+    headers = {"Authorization": f"Bearer {args.token}"}
+
+    latencies, statuses = [], {}
+    pending = iter(urls)
+
+    async def client_loop():
+        for url in pending:
+            started = time.perf_counter()
+            response = await client.post(
+                "/api/v1/hackrx/run",
+                json={"documents": url, "questions": questions},
+                headers=headers
+            )
+            latencies.append(time.perf_counter() - started)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    stats.reset()
+    llm_calls_before = _llm_calls()
+    if args.trace_memory:
+        tracemalloc.reset_peak()
+    started = time.perf_counter()
+    await asyncio.gather(*(client_loop() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    # Let background cleanup of the documents finish before the next scenario
+    await asyncio.sleep(0.1)
+
+    answered = statuses.get(200, 0) * question_count
+    llm_calls = int(_llm_calls() - llm_calls_before)
+    result = {
+        "document_size_mb": size_mb,
+        "document_bytes": document_bytes,
+        "questions": question_count,
+        "concurrency": concurrency,
+        "requests": total_requests,
+        "status_codes": {str(code): count for code, count in sorted(statuses.items())},
+        "elapsed_seconds": round(elapsed, 3),
+        "requests_per_second": round(total_requests / elapsed, 3),
+        "questions_per_second": round(answered / elapsed, 3),
+        "latency_p50_seconds": round(_percentile(latencies, 50), 3),
+        "latency_p95_seconds": round(_percentile(latencies, 95), 3),
+        "latency_p99_seconds": round(_percentile(latencies, 99), 3),
+        "llm_calls": llm_calls,
+        "llm_calls_per_question": round(llm_calls / max(1, total_requests * question_count), 2),
+        "llm_throttled": stats.throttled,
+        "llm_failures": stats.failures,
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+    }
+    if args.trace_memory:
+        result["peak_traced_mb"] = round(tracemalloc.get_traced_memory()[1] / (1024 * 1024), 1)
+    return result
+
+
+async def run(args) -> List[Dict]:
+    import httpx
+    from core.config import settings
+    from core.llm import override_models, use_cassette
+
+    stats = ModelCallStats()
+    override_models(
+        chat_model_factory=FakeChatModel.factory(
+            stats,
+            latency_ms=args.llm_latency_ms,
+            latency_sigma=args.llm_latency_sigma,
+            rate_limit_probability=args.llm_429_rate,
+            retry_backoff_ms=args.retry_backoff_ms,
+            seed=args.seed
+        ),
+        embeddings_factory=HashEmbeddings.factory(settings.VECTOR_DIMENSION, latency_ms=args.embed_latency_ms)
+    )
+    if args.replay:
+        use_cassette(args.replay, "replay", latency_scale=args.replay_latency_scale)
+    elif args.record:
+        use_cassette(args.record, "record")
+    # Hashed bag-of-words vectors have lower cosine similarities than Gemini embeddings
+    settings.SIMILARITY_THRESHOLD = args.similarity_threshold
+    # The app only accepts its configured token; use a throwaway one when none is set
+    args.token = args.token or settings.API_TOKEN or "benchmark-token"
+    settings.API_TOKEN = args.token
+
+    from app.main import app
+    from loguru import logger
+    # Keep the report readable: only the application's warnings and errors
+    logger.remove()
+    logger.add(sys.stderr, level=args.log_level)
+
+    pdf_dir = tempfile.mkdtemp(prefix="bench-e2e-")
+    server = serve_directory(pdf_dir)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    if args.trace_memory:
+        tracemalloc.start()
+
+    results = []
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+                for size_mb, question_count, concurrency in itertools.product(
+                    args.doc_sizes_mb, args.questions, args.concurrency
+                ):
+                    result = await run_scenario(
+                        client, base_url, pdf_dir, stats, args, size_mb, question_count, concurrency
+                    )
+                    results.append(result)
+                    print(
+                        f"{size_mb:>6} MB {question_count:>3} q x{concurrency:<3} "
+                        f"{result['requests_per_second']:>7.2f} req/s  "
+                        f"p50 {result['latency_p50_seconds']:>7.3f}s  p95 {result['latency_p95_seconds']:>7.3f}s  "
+                        f"p99 {result['latency_p99_seconds']:>7.3f}s  "
+                        f"{result['llm_calls_per_question']:>5.2f} LLM calls/q  "
+                        f"peak RSS {result['peak_rss_mb']:.0f} MB  {result['status_codes']}"
+                    )
+    finally:
+        server.shutdown()
+        override_models()
+        use_cassette(None)
+    return results
+
+
+def _floats(value: str) -> List[float]:
+    return [float(v) for v in value.split(",")]
+
+
+def _ints(value: str) -> List[int]:
+    return [int(v) for v in value.split(",")]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--doc-sizes-mb", type=_floats, default=[0.1, 0.5])
+    parser.add_argument("--questions", type=_ints, default=[5, 10])
+    parser.add_argument("--concurrency", type=_ints, default=[1, 4])
+    parser.add_argument("--rounds", type=int, default=2, help="requests per concurrent client and scenario")
+    parser.add_argument("--llm-latency-ms", type=float, default=300.0, help="median fake LLM latency")
+    parser.add_argument("--llm-latency-sigma", type=float, default=0.5)
+    parser.add_argument("--llm-429-rate", type=float, default=0.0, help="probability that an LLM call is throttled")
+    parser.add_argument("--retry-backoff-ms", type=float, default=500.0)
+    parser.add_argument("--embed-latency-ms", type=float, default=20.0, help="fake latency per embedding call")
+    parser.add_argument("--similarity-threshold", type=float, default=0.1)
+    parser.add_argument("--record", default=None, help="also record model calls to this cassette")
+    parser.add_argument("--replay", default=None, help="answer model calls from this cassette")
+    parser.add_argument("--replay-latency-scale", type=float, default=1.0, help="0 replays without latency")
+    parser.add_argument("--trace-memory", action="store_true", help="also report the traced Python heap peak (slower)")
+    parser.add_argument("--log-level", default="WARNING")
+    parser.add_argument("--token", default=None, help="API token, defaults to the configured one")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default="bench_e2e.json")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "config": {k: v for k, v in vars(args).items() if k != "token"},
+        "scenarios": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {len(results)} scenarios to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
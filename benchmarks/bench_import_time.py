@@ -0,0 +1,87 @@
+# benchmarks/bench_import_time.py
+"""
+Cold import time of the application: `import app.main` in fresh interpreters, with
+`-X importtime` to name the slowest top-level packages.
+
+Usage: python -m benchmarks.bench_import_time --runs 5 --output import_time.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+
+def _import_once(module: str) -> Tuple[float, Dict[str, float]]:
+    """Wall time of one cold import, and import time per top-level package"""
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        env={**os.environ, "PYTHONDONTWRITEBYTECODE": "1"}
+    )
+    wall = time.perf_counter() - started
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+
+    packages: Dict[str, float] = defaultdict(float)
+    for line in result.stderr.splitlines():
+        # "import time: self [us] | cumulative | imported package", nested imports indented
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        package = name.strip().split(".")[0]
+        # A package's first import is the one that pays for it, and covers its submodules
+        packages[package] = max(packages[package], int(cumulative) / 1e6)
+    # The imported module itself covers everything
+    packages.pop(module.split(".")[0], None)
+    return wall, packages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--module", default="app.main")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--output", help="write the results as JSON to this path")
+    args = parser.parse_args()
+
+    # The first run also fills the OS file cache; it is not counted
+    _import_once(args.module)
+    walls: List[float] = []
+    per_package: Dict[str, List[float]] = defaultdict(list)
+    for _ in range(args.runs):
+        wall, packages = _import_once(args.module)
+        walls.append(wall)
+        for name, seconds in packages.items():
+            per_package[name].append(seconds)
+
+    top = sorted(
+        ((name, statistics.median(times)) for name, times in per_package.items()),
+        key=lambda item: -item[1]
+    )[:args.top]
+
+    print(f"import {args.module}: median {statistics.median(walls):.2f}s, "
+          f"min {min(walls):.2f}s, max {max(walls):.2f}s over {args.runs} runs")
+    for name, seconds in top:
+        print(f"  {name:<32} {seconds * 1000:8.1f} ms")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({
+                "module": args.module,
+                "runs": args.runs,
+                "median_seconds": round(statistics.median(walls), 3),
+                "min_seconds": round(min(walls), 3),
+                "max_seconds": round(max(walls), 3),
+                "top_packages_ms": {name: round(seconds * 1000, 1) for name, seconds in top},
+            }, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
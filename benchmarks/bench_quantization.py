@@ -0,0 +1,80 @@
+# benchmarks/bench_quantization.py
+"""
+Recall and memory of the quantized local vector index against exact float32 search.
+
+Embeddings are synthetic: noisy points around random topic centroids, which gives the
+clustered neighbourhoods real document embeddings have. Queries are perturbed copies of
+stored vectors, like a question paraphrasing one chunk.
+
+Usage: python -m benchmarks.bench_quantization --vectors 20000 --queries 200
+"""
+import argparse
+import tempfile
+import time
+
+import numpy as np
+
+from utils.quantized_index import QuantizedVectorIndex
+
+
+def _clustered_vectors(n: int, dimension: int, topics: int, rng: np.random.Generator) -> np.ndarray:
+    centroids = rng.standard_normal((topics, dimension)).astype(np.float32)
+    assignment = rng.integers(0, topics, size=n)
+    return centroids[assignment] + 0.6 * rng.standard_normal((n, dimension)).astype(np.float32)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--vectors", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--dimension", type=int, default=768)
+    parser.add_argument("--topics", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--rescore-multiplier", type=int, default=10)
+    parser.add_argument("--query-noise", type=float, default=0.6)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    vectors = _clustered_vectors(args.vectors, args.dimension, args.topics, rng)
+    targets = vectors[rng.integers(0, args.vectors, size=args.queries)]
+    queries = targets + args.query_noise * rng.standard_normal(targets.shape).astype(np.float32)
+    ids = [str(i) for i in range(args.vectors)]
+
+    storage = tempfile.TemporaryDirectory()
+    indexes = {}
+    for mode in ("float32", "int8", "binary"):
+        index = QuantizedVectorIndex(
+            args.dimension,
+            quantization=mode,
+            rescore_multiplier=args.rescore_multiplier,
+            storage_dir=storage.name
+        )
+        index.add(ids, vectors)
+        indexes[mode] = index
+
+    exact = [{doc_id for doc_id, _ in indexes["float32"].search(q, args.k)} for q in queries]
+    baseline_bytes = indexes["float32"].nbytes
+
+    print(f"{args.vectors} vectors x {args.dimension} dims, {args.queries} queries, recall@{args.k}")
+    for mode, index in indexes.items():
+        started = time.perf_counter()
+        found = [{doc_id for doc_id, _ in index.search(q, args.k)} for q in queries]
+        elapsed = time.perf_counter() - started
+
+        recall = np.mean([len(f & e) / args.k for f, e in zip(found, exact)])
+        # Binary mode reads its float32 rescoring vectors from the mapped file, they are not resident
+        resident = index.resident_nbytes
+        print(
+            f"{mode:<8} recall {recall:6.3f}  {index.nbytes / 1e6:8.1f} MB total  "
+            f"{resident / 1e6:8.1f} MB resident ({baseline_bytes / resident:5.1f}x)  "
+            f"{args.queries / elapsed:8.0f} queries/s"
+        )
+
+    for index in indexes.values():
+        index.close()
+    storage.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+# benchmarks/bench_text_cleaner.py
+"""
+Fused TextCleaner against the previous multi-pass implementation, on synthetic
+policies and on pathological inputs that trigger regex backtracking.
+
+Also checks that sentence splitting keeps amounts, percentages and abbreviations intact,
+and that compressed context quotes them exactly as the document does.
+
+Usage: python -m benchmarks.bench_text_cleaner --size-mb 5
+"""
+import argparse
+import asyncio
+import re
+import time
+import unicodedata
+from typing import Callable, Dict
+
+from langchain.schema import Document
+
+from benchmarks.policy_corpus import generate_policy_pages
+from core import offload
+from core.config import settings
+from services.clause_matcher import ClauseMatcher
+from services.context_compressor import ContextCompressor
+from services.document_loader import DocumentLoader
+from utils.text_cleaner import TextCleaner
+
+SENTENCE_SAMPLE = (
+    "4.2 Room Rent\n"
+    "Room rent is covered up to 1.5% of the Sum Insured, i.e. Rs. 7,500.50 per day. "
+    "A co-payment of 12.5% applies to claims above INR 2,00,000. "
+    "Approx. 3.75 lakh is the limit for cataract surgery, e.g. per eye. "
+    "Ambulance charges are paid up to Rs. 2,000 per hospitalization. "
+    "The No. of claims is not limited! "
+    "Is the deductible 0.5%? Yes."
+)
+EXPECTED_SENTENCES = [
+    "4.2 Room Rent\nRoom rent is covered up to 1.5% of the Sum Insured, i.e. Rs. 7,500.50 per day.",
+    "A co-payment of 12.5% applies to claims above INR 2,00,000.",
+    "Approx. 3.75 lakh is the limit for cataract surgery, e.g. per eye.",
+    "Ambulance charges are paid up to Rs. 2,000 per hospitalization.",
+    "The No. of claims is not limited!",
+    "Is the deductible 0.5%?",
+    "Yes.",
+]
+
+
+class LegacyTextCleaner:
+    """The multi-pass cleaner this module replaced, kept here for comparison"""
+
+    def __init__(self):
+        self.patterns = {
+            'extra_whitespace': re.compile(r'\s+'),
+            'page_numbers': re.compile(r'Page\s+\d+\s*(?:of\s*\d+)?', re.IGNORECASE),
+            'bullet_points': re.compile(r'^\s*[•·▪▫‣⁃]\s*', re.MULTILINE),
+            'numbered_lists': re.compile(r'^\s*\d+\.\s*', re.MULTILINE),
+        }
+
+    def clean_text(self, text: str) -> str:
+        text = unicodedata.normalize('NFKD', text)
+        text = self.patterns['page_numbers'].sub('', text)
+        text = self.patterns['bullet_points'].sub('• ', text)
+        text = self.patterns['numbered_lists'].sub('', text)
+        text = self.patterns['extra_whitespace'].sub(' ', text)
+        return text.strip()
+
+    def extract_policy_sections(self, text: str) -> Dict[str, str]:
+        sections = {}
+        section_patterns = {
+            'definitions': r'definitions?\s*:?\s*(.*?)(?=\n[A-Z\s]+:|\n\d+\.|\Z)',
+            'coverage': r'coverage\s*:?\s*(.*?)(?=\n[A-Z\s]+:|\n\d+\.|\Z)',
+            'exclusions': r'exclusions?\s*:?\s*(.*?)(?=\n[A-Z\s]+:|\n\d+\.|\Z)',
+            'waiting_period': r'waiting\s+period\s*:?\s*(.*?)(?=\n[A-Z\s]+:|\n\d+\.|\Z)',
+            'claims': r'claims?\s*:?\s*(.*?)(?=\n[A-Z\s]+:|\n\d+\.|\Z)',
+        }
+        for section_name, pattern in section_patterns.items():
+            match = re.search(pattern, text, re.IGNORECASE | re.DOTALL)
+            if match:
+                sections[section_name] = self.clean_text(match.group(1))
+        return sections
+
+
+def _time(func: Callable[[], object], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def _report(name: str, size_bytes: int, legacy: float, fused: float) -> None:
+    print(f"{name:<34} legacy {size_bytes / legacy / 1e6:8.2f} MB/s   "
+          f"fused {size_bytes / fused / 1e6:8.2f} MB/s   x{legacy / fused:5.1f}")
+
+
+def check_sentence_splitting() -> None:
+    """Regression check: amounts and percentages survive splitting and compression verbatim"""
+    cleaner = TextCleaner()
+    spans = cleaner.sentence_spans(SENTENCE_SAMPLE)
+    sentences = [SENTENCE_SAMPLE[start:end] for start, end in spans]
+    assert sentences == EXPECTED_SENTENCES, f"unexpected sentences: {sentences}"
+
+    chunk = Document(page_content=SENTENCE_SAMPLE, metadata={"section": "Room Rent"})
+    filler = Document(page_content="General conditions apply to every claim under this policy.")
+    matcher = ClauseMatcher().fit([chunk, filler])
+    compressor = ContextCompressor(matcher, max_sentences=1, neighbours=0)
+    (compressed, _), = compressor.compress("What is the co-payment percentage?", [(chunk, 1.0)])
+    assert "A co-payment of 12.5% applies to claims above INR 2,00,000." in compressed.page_content, \
+        f"compressed context lost the amounts: {compressed.page_content!r}"
+    print("sentence splitting: amounts, percentages and abbreviations kept intact")
+
+
+def pathological_inputs(scale: int) -> Dict[str, str]:
+    """Inputs that make naive whitespace/lookahead patterns backtrack"""
+    return {
+        "long whitespace run": " \t" * scale + "x",
+        "blank lines": "\n \n" * scale,
+        "'Page' without numbers": "Page " * scale,
+        "dotted numbers": "1." * scale,
+        "bullets only": "\n • " * scale,
+        "section body, no boundary": "definitions\n" + ("word " * 20 + "\n") * (scale // 100),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--size-mb", type=float, default=5.0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--scale", type=int, default=20000, help="size of the pathological inputs")
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    check_sentence_splitting()
+    legacy, fused = LegacyTextCleaner(), TextCleaner()
+
+    pages = generate_policy_pages(args.size_mb)
+    size_bytes = sum(len(page.encode("utf-8")) for page in pages)
+    print(f"{len(pages)} pages, {size_bytes / 1e6:.2f} MB")
+
+    legacy_time = _time(lambda: [legacy.clean_text(page) for page in pages], args.repeat)
+    _report("clean_text per page", size_bytes, legacy_time,
+            _time(lambda: [fused.clean_text(page) for page in pages], args.repeat))
+    _report("clean_page (keeps lines)", size_bytes, legacy_time,
+            _time(lambda: fused.clean_pages(pages), args.repeat))
+
+    # Ingestion's path: batches of pages on the shared offload process pool
+    settings.OFFLOAD_PROCESSES = args.workers
+
+    async def clean_offloaded():
+        return await DocumentLoader.clean_pages(pages)
+
+    asyncio.run(clean_offloaded())  # starts the worker processes
+    _report(f"clean_pages ({args.workers} processes)", size_bytes, legacy_time,
+            _time(lambda: asyncio.run(clean_offloaded()), args.repeat))
+    offload.shutdown()
+
+    document = "\n".join(pages)
+    _report("extract_policy_sections", len(document),
+            _time(lambda: legacy.extract_policy_sections(document), 1),
+            _time(lambda: fused.extract_policy_sections(document), 1))
+
+    print("\nPathological inputs")
+    for name, text in pathological_inputs(args.scale).items():
+        _report(f"clean_text: {name}", len(text),
+                _time(lambda: legacy.clean_text(text), 1), _time(lambda: fused.clean_text(text), 1))
+        _report(f"sections: {name}", len(text),
+                _time(lambda: legacy.extract_policy_sections(text), 1),
+                _time(lambda: fused.extract_policy_sections(text), 1))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+# benchmarks/fakes.py
+"""
+Local stand-ins for Gemini and the embedding API, for benchmarks that must not burn quota.
+
+`FakeChatModel` answers the prompts the agent actually sends (entity expansion, the
+structured-chat agent loop, table QA) with well-formed replies after a lognormal delay,
+and throttles a configurable fraction of calls with 429s that are retried like the real
+client does. `HashEmbeddings` is a deterministic feature-hashed bag of words.
+"""
+import asyncio
+import hashlib
+import json
+import random
+import re
+import time
+from dataclasses import dataclass
+from typing import Any, List, Optional
+
+import numpy as np
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from core.llm_gateway import BATCH_MARKER, split_packed_prompt
+
+WORD_PATTERN = re.compile(r"[a-z0-9]+")
+
+EXCLUSION_PATTERN = re.compile(r"exclu|not covered|not liable", re.IGNORECASE)
+FACT_PATTERN = re.compile(r"waiting period|limit|how many|maximum|co-?pay|capped|within", re.IGNORECASE)
+
+
+class FakeRateLimitError(Exception):
+    """Raised when a call is still throttled after all retries"""
+
+
+@dataclass
+class ModelCallStats:
+    """Counters shared by every fake model instance of a benchmark run"""
+    calls: int = 0
+    throttled: int = 0
+    failures: int = 0
+
+    def reset(self):
+        self.calls = self.throttled = self.failures = 0
+
+
+class FakeChatModel(BaseChatModel):
+    """Chat model replying to the agent's prompts locally, with simulated latency and 429s"""
+
+    model: str = "fake-gemini"
+    temperature: float = 0.0
+    stats: Any = None
+    latency_ms: float = 800.0
+    # Spread of the lognormal latency around its median
+    latency_sigma: float = 0.5
+    rate_limit_probability: float = 0.0
+    max_retries: int = 3
+    retry_backoff_ms: float = 500.0
+    seed: Optional[int] = None
+    rng: Any = None
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def _next_delay(self) -> float:
+        if self.rng is None:
+            self.rng = random.Random(self.seed)
+        return self.rng.lognormvariate(0.0, self.latency_sigma) * self.latency_ms / 1000
+
+    def _throttled(self) -> bool:
+        return self.rate_limit_probability > 0 and self.rng.random() < self.rate_limit_probability
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any
+    ) -> ChatResult:
+        for attempt in range(self.max_retries + 1):
+            self._count_call()
+            time.sleep(self._next_delay())
+            if not self._throttled():
+                return self._result(messages)
+            self.stats.throttled += 1
+            time.sleep(self.retry_backoff_ms * 2 ** attempt / 1000)
+        self.stats.failures += 1
+        raise FakeRateLimitError("429 Resource has been exhausted (e.g. check quota).")
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any
+    ) -> ChatResult:
+        for attempt in range(self.max_retries + 1):
+            self._count_call()
+            await asyncio.sleep(self._next_delay())
+            if not self._throttled():
+                return self._result(messages)
+            self.stats.throttled += 1
+            await asyncio.sleep(self.retry_backoff_ms * 2 ** attempt / 1000)
+        self.stats.failures += 1
+        raise FakeRateLimitError("429 Resource has been exhausted (e.g. check quota).")
+
+    def _count_call(self):
+        if self.stats is not None:
+            self.stats.calls += 1
+
+    def _result(self, messages: List[BaseMessage]) -> ChatResult:
+        text = self.reply(messages[-1].content if messages else "")
+        message = AIMessage(
+            content=text,
+            usage_metadata={
+                "input_tokens": sum(len(str(m.content)) for m in messages) // 4,
+                "output_tokens": len(text) // 4,
+                "total_tokens": (sum(len(str(m.content)) for m in messages) + len(text)) // 4
+            }
+        )
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    @staticmethod
+    def reply(prompt: str) -> str:
+        """The reply a cooperative model would give to one of the agent's prompts"""
+        if BATCH_MARKER in prompt:
+            # Packed by the LLM gateway: one answer per task, as the JSON object it asks for
+            tasks = split_packed_prompt(prompt)
+            return json.dumps({str(index): FakeChatModel.reply(task) for index, task in enumerate(tasks, 1)})
+
+        if "query analysis assistant" in prompt:
+            return '```json\n{"entities": []}\n```'
+
+        if "Completed Question:" in prompt:
+            fragment = re.search(r'Input: "(.*)"', prompt)
+            return f"What does the policy say about {fragment.group(1) if fragment else 'this'}?"
+
+        if "JSON blob" not in prompt:
+            return "The policy document does not specify this."
+
+        if "Observation:" in prompt:
+            # The structured-chat scratchpad has a tool result: answer from it
+            observation = prompt.rsplit("Observation:", 1)[1].strip()
+            sentence = re.split(r"(?<=[.!?])\s", observation, maxsplit=1)[0][:300]
+            return _action_blob("Final Answer", f"According to the policy: {sentence}")
+
+        question = prompt.strip().split("\n", 1)[0]
+        if EXCLUSION_PATTERN.search(question):
+            tool = "find_policy_exclusions"
+        elif FACT_PATTERN.search(question):
+            tool = "lookup_policy_facts"
+        else:
+            tool = "general_semantic_search"
+        return _action_blob(tool, question)
+
+    @classmethod
+    def factory(cls, stats: ModelCallStats, **config: Any):
+        """A `core.llm.override_models` chat factory sharing `stats` across instances"""
+        def create(model: str = "fake-gemini", temperature: float = 0.0, callbacks=None, **_: Any):
+            return cls(model=model, temperature=temperature, callbacks=callbacks, stats=stats, **config)
+        return create
+
+
+def _action_blob(action: str, action_input: str) -> str:
+    blob = json.dumps({"action": action, "action_input": action_input}, indent=2)
+    return f"Action:\n```\n{blob}\n```"
+
+
+class HashEmbeddings(Embeddings):
+    """Deterministic embeddings: signed feature hashing of words and word bigrams, L2-normalised"""
+
+    def __init__(self, dimension: int = 768, latency_ms: float = 0.0):
+        self.dimension = dimension
+        self.latency_ms = latency_ms
+
+    def _embed(self, text: str) -> List[float]:
+        words = WORD_PATTERN.findall(text.lower())
+        vector = np.zeros(self.dimension, dtype=np.float32)
+        for feature in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+            digest = hashlib.blake2b(feature.encode(), digest_size=8).digest()
+            bucket = int.from_bytes(digest[:4], "little") % self.dimension
+            vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector /= norm
+        return vector.tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        return self._embed(text)
+
+    @classmethod
+    def factory(cls, dimension: int = 768, latency_ms: float = 0.0):
+        """A `core.llm.override_models` embeddings factory"""
+        return lambda model=None: cls(dimension=dimension, latency_ms=latency_ms)
@@ -0,0 +1,89 @@
+# benchmarks/policy_corpus.py
+import random
+from typing import List
+
+CLAUSE_TEMPLATES = [
+    "Pre-existing diseases are covered after a waiting period of {n} months of continuous coverage.",
+    "Room rent is limited to {p}% of the sum insured per day, subject to a maximum of Rs. {amount}.",
+    "Expenses related to cataract surgery are capped at Rs. {amount} per eye per policy year.",
+    "A co-payment of {p}% applies to all claims made by insured persons above the age of {age} years.",
+    "The Company shall not be liable for any claim arising out of items of personal comfort listed in Annexure II.",
+    "Maternity expenses are covered up to Rs. {amount} after {n} months of continuous coverage.",
+    "Ambulance charges are payable up to Rs. {amount} per hospitalisation.",
+    "Claims must be intimated to the TPA within {n} days of admission to the hospital.",
+]
+
+SECTION_TITLES = [
+    "Definitions", "Coverage", "Waiting Period", "Exclusions", "Claims Procedure",
+    "Renewal", "Grievance Redressal", "Portability", "Cancellation", "Moratorium Period",
+]
+
+
+def generate_policy_pages(size_mb: float, page_chars: int = 3000, seed: int = 42) -> List[str]:
+    """Generate synthetic policy pages totalling roughly `size_mb` megabytes of text"""
+    rng = random.Random(seed)
+    target = int(size_mb * 1024 * 1024)
+    pages, current, total = [], [], 0
+    section = 0
+
+    while total < target:
+        if rng.random() < 0.08:
+            section += 1
+            title = SECTION_TITLES[section % len(SECTION_TITLES)]
+            line = f"SECTION {section} - {title}" if rng.random() < 0.5 else f"{section}.{rng.randint(1, 9)} {title}"
+        else:
+            line = rng.choice(CLAUSE_TEMPLATES).format(
+                n=rng.choice([12, 24, 30, 36, 48]),
+                p=rng.choice([1, 2, 10, 20]),
+                amount=rng.choice([5000, 20000, 40000, 100000]),
+                age=rng.choice([60, 61, 65]),
+            )
+        current.append(line)
+        length = len(line) + 1
+        total += length
+
+        if sum(len(l) + 1 for l in current) >= page_chars:
+            pages.append(f"Page {len(pages) + 1} of N\n" + "\n".join(current))
+            current = []
+
+    if current:
+        pages.append(f"Page {len(pages) + 1} of N\n" + "\n".join(current))
+    return pages
+
+
+def _pdf_escape(line: str) -> str:
+    return line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def write_policy_pdf(path: str, pages: List[str]) -> int:
+    """Write pages as a minimal text-only PDF (one Helvetica text block per page), returning its size"""
+    page_count = len(pages)
+    # Objects: 1 catalog, 2 page tree, 3 font, then a page and its content stream per page
+    page_refs = " ".join(f"{4 + 2 * i} 0 R" for i in range(page_count))
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        f"<< /Type /Pages /Kids [{page_refs}] /Count {page_count} >>".encode(),
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    for i, page in enumerate(pages):
+        text = " T* ".join(f"({_pdf_escape(line)}) Tj" for line in page.split("\n"))
+        stream = f"BT /F1 8 Tf 10 TL 30 810 Td {text} ET".encode("latin-1", errors="replace")
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {5 + 2 * i} 0 R >>".encode()
+        )
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(output))
+        output += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(output)
+    output += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    output += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    output += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+
+    with open(path, "wb") as f:
+        f.write(output)
+    return len(output)
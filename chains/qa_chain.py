@@ -2,17 +2,16 @@
 # chains/qa_chain.py
 from langchain.chains import LLMChain
 from langchain.prompts import PromptTemplate
-from langchain_google_genai import ChatGoogleGenerativeAI
 from typing import List, Dict, Any
 from langchain.schema import Document
 from loguru import logger
 from core.config import settings
+from core.llm import create_chat_model
 
 class QAChain:
     def __init__(self):
-        self.llm = ChatGoogleGenerativeAI(
+        self.llm = create_chat_model(
             model="gemini-pro",
-            google_api_key=settings.GOOGLE_API_KEY,
             temperature=0.1,
             convert_system_message_to_human=True
         )
@@ -0,0 +1,189 @@
+# core/admission.py
+import asyncio
+import math
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Deque, Dict, Optional, Tuple
+from loguru import logger
+
+from core.config import settings
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request cannot be admitted; maps to a 429/503 with Retry-After"""
+
+    def __init__(self, status_code: int, detail: str, retry_after: int):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+@dataclass
+class Ticket:
+    """A granted share of the concurrency budget, returned to `release`"""
+    weight: float
+    started: float = field(default_factory=time.monotonic)
+
+
+@dataclass
+class TokenBucket:
+    tokens: float
+    updated: float
+
+
+class AdmissionController:
+    """
+    Global concurrency budget in front of the RAG pipeline. Requests cost weight units
+    by document size and question count; requests that do not fit wait in a bounded
+    FIFO queue until a deadline, and are rejected fast once the queue is full.
+    Optionally every API token gets a per-minute budget of weight units as well.
+    """
+
+    def __init__(
+        self,
+        capacity: float,
+        max_queue: int,
+        queue_timeout: float,
+        token_quota_per_minute: float = 0.0
+    ):
+        self.capacity = capacity
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.token_quota_per_minute = token_quota_per_minute
+        self.in_use = 0.0
+        self.waiters: Deque[Tuple[float, asyncio.Future]] = deque()
+        self.buckets: Dict[str, TokenBucket] = {}
+        # Moving average of how long an admitted request holds its share
+        self.average_duration = 30.0
+
+    def weigh(self, questions: int, document_bytes: Optional[int] = None) -> float:
+        """Cost of a request in budget units, capped so any single request can run"""
+        weight = settings.ADMISSION_BASE_COST + questions * settings.ADMISSION_QUESTION_COST
+        if document_bytes:
+            weight += document_bytes / 1e6 * settings.ADMISSION_MB_COST
+        return min(weight, self.capacity)
+
+    def check(self, weight: float, token: Optional[str] = None):
+        """
+        Raise what `acquire` would raise right now for a request of at least `weight`,
+        without reserving or charging anything, so callers can reject before costly work.
+        """
+        weight = min(weight, self.capacity)
+        if not self._fits(weight) and len(self.waiters) >= self.max_queue:
+            raise AdmissionRejected(503, "Server is at capacity, try again later", self._retry_after())
+        if token is not None:
+            self._charge_token(token, weight, charge=False)
+
+    async def acquire(
+        self,
+        weight: float,
+        token: Optional[str] = None,
+        timeout: Optional[float] = -1,
+        bounded: bool = True
+    ) -> Ticket:
+        """
+        Wait for `weight` units of the budget. `timeout=-1` uses the configured queue
+        deadline and `None` waits indefinitely; `bounded=False` skips the queue-length
+        limit (for internal callers that already queue, like the job workers).
+        The token's quota is only charged for requests that end up admitted.
+        """
+        weight = min(weight, self.capacity)
+        fits = self._fits(weight)
+        if not fits and bounded and len(self.waiters) >= self.max_queue:
+            raise AdmissionRejected(503, "Server is at capacity, try again later", self._retry_after())
+        if token is not None:
+            self._charge_token(token, weight)
+
+        if fits:
+            self.in_use += weight
+            return Ticket(weight)
+
+        future = asyncio.get_running_loop().create_future()
+        entry = (weight, future)
+        self.waiters.append(entry)
+        timeout = self.queue_timeout if timeout == -1 else timeout
+
+        try:
+            await asyncio.wait({future}, timeout=timeout)
+        except asyncio.CancelledError:
+            if not self._abandon(entry) and token is not None:
+                self._refund_token(token, weight)
+            raise
+
+        if not future.done():
+            if not self._abandon(entry) and token is not None:
+                self._refund_token(token, weight)
+            raise AdmissionRejected(503, "Timed out waiting for capacity, try again later", self._retry_after())
+        return Ticket(weight)
+
+    def release(self, ticket: Ticket):
+        self.in_use = max(0.0, self.in_use - ticket.weight)
+        duration = time.monotonic() - ticket.started
+        self.average_duration = 0.9 * self.average_duration + 0.1 * duration
+        self._wake()
+
+    def _fits(self, weight: float) -> bool:
+        return not self.waiters and self.in_use + weight <= self.capacity
+
+    def _abandon(self, entry: Tuple[float, asyncio.Future]) -> bool:
+        """Give up a queue entry; True if its share had been granted just before"""
+        weight, future = entry
+        granted = future.done() and not future.cancelled()
+        if granted:
+            # Granted just as the waiter gave up, hand the share back
+            self.in_use = max(0.0, self.in_use - weight)
+        else:
+            future.cancel()
+            try:
+                self.waiters.remove(entry)
+            except ValueError:
+                pass
+        self._wake()
+        return granted
+
+    def _wake(self):
+        # FIFO: a large request at the head is not overtaken by smaller ones
+        while self.waiters and self.in_use + self.waiters[0][0] <= self.capacity:
+            weight, future = self.waiters.popleft()
+            if future.done():
+                continue
+            self.in_use += weight
+            future.set_result(True)
+
+    def _charge_token(self, token: str, weight: float, charge: bool = True):
+        if self.token_quota_per_minute <= 0:
+            return
+
+        now = time.monotonic()
+        rate = self.token_quota_per_minute / 60.0
+        bucket = self.buckets.get(token)
+        if bucket is None:
+            bucket = self.buckets[token] = TokenBucket(self.token_quota_per_minute, now)
+
+        bucket.tokens = min(self.token_quota_per_minute, bucket.tokens + (now - bucket.updated) * rate)
+        bucket.updated = now
+        if bucket.tokens < weight:
+            retry_after = math.ceil((weight - bucket.tokens) / rate)
+            logger.warning(f"API token quota exceeded, retry in {retry_after}s")
+            raise AdmissionRejected(429, "Request quota exceeded for this API token", retry_after)
+        if charge:
+            bucket.tokens -= weight
+
+    def _refund_token(self, token: str, weight: float):
+        bucket = self.buckets.get(token)
+        if bucket is not None:
+            bucket.tokens = min(self.token_quota_per_minute, bucket.tokens + weight)
+
+    def _retry_after(self) -> int:
+        queued = sum(weight for weight, _ in self.waiters)
+        return max(1, math.ceil(self.average_duration * (self.in_use + queued) / self.capacity))
+
+
+admission_controller = AdmissionController(
+    capacity=settings.ADMISSION_CAPACITY,
+    max_queue=settings.ADMISSION_MAX_QUEUE,
+    queue_timeout=settings.ADMISSION_QUEUE_TIMEOUT,
+    token_quota_per_minute=settings.ADMISSION_TOKEN_QUOTA_PER_MINUTE
+)
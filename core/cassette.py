@@ -0,0 +1,241 @@
+# core/cassette.py
+"""
+Record/replay of LLM and embedding calls.
+
+In record mode every call to the real clients is appended to a cassette (gzipped JSON
+lines when the path ends in `.gz`) with its prompt, response and latency. In replay mode
+the cassette answers instead of the clients, optionally sleeping for the recorded latency
+times `latency_scale`, so agent runs take the same tool paths on every run and offline.
+"""
+import asyncio
+import base64
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Any, Deque, Dict, List, Optional
+
+import numpy as np
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from loguru import logger
+
+
+class CassetteMissError(Exception):
+    """Raised in replay mode for a call that was never recorded"""
+
+
+def _digest(*parts: str) -> str:
+    hasher = hashlib.sha256()
+    for part in parts:
+        hasher.update(part.encode("utf-8", errors="replace"))
+        hasher.update(b"\0")
+    return hasher.hexdigest()[:32]
+
+
+def _message_pairs(messages: List[BaseMessage]) -> List[List[str]]:
+    return [[message.type, message.content if isinstance(message.content, str) else json.dumps(message.content)]
+            for message in messages]
+
+
+class Cassette:
+    """An append-only file of recorded calls, indexed by prompt hash for replay"""
+
+    def __init__(self, path: str, mode: str = "replay"):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Unknown cassette mode: {mode}")
+        self.path = path
+        self.mode = mode
+        self._lock = threading.Lock()
+        self._file = None
+        # Responses for the same key are replayed in recording order, the last one repeating
+        self._entries: Dict[str, Deque[dict]] = defaultdict(deque)
+        if mode == "replay":
+            self._load()
+
+    def _open(self, mode: str):
+        if self.path.endswith(".gz"):
+            return gzip.open(self.path, mode + "t", encoding="utf-8")
+        return open(self.path, mode, encoding="utf-8")
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            raise FileNotFoundError(f"Cassette not found: {self.path}")
+        count = 0
+        with self._open("r") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                self._entries[entry["key"]].append(entry)
+                # Agent prompts carry the shared chat history, which depends on question order
+                if entry.get("loose_key"):
+                    self._entries[entry["loose_key"]].append(entry)
+                count += 1
+        logger.info(f"Loaded {count} recorded calls from {self.path}")
+
+    def write(self, entry: dict):
+        line = json.dumps(entry, separators=(",", ":"))
+        with self._lock:
+            if self._file is None:
+                directory = os.path.dirname(self.path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                self._file = self._open("a")
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    def lookup(self, *keys: str) -> Optional[dict]:
+        with self._lock:
+            for key in keys:
+                entries = self._entries.get(key)
+                if entries:
+                    return entries.popleft() if len(entries) > 1 else entries[0]
+        return None
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+class CassetteChatModel(BaseChatModel):
+    """Chat model that records the wrapped model's calls, or replays them without it"""
+
+    cassette: Any
+    inner: Any = None
+    model_name: str = ""
+    latency_scale: float = 1.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "cassette-chat"
+
+    def _keys(self, messages: List[BaseMessage]) -> List[str]:
+        pairs = _message_pairs(messages)
+        return [
+            _digest("chat", self.model_name, json.dumps(pairs)),
+            _digest("chat-last", self.model_name, json.dumps(pairs[-1:]))
+        ]
+
+    def _replayed(self, messages: List[BaseMessage]):
+        keys = self._keys(messages)
+        entry = self.cassette.lookup(*keys)
+        if entry is None:
+            raise CassetteMissError(f"No recorded response for prompt {keys[0]}: {str(messages[-1].content)[:100]}")
+        return entry, entry["latency"] * self.latency_scale
+
+    def _record(self, messages: List[BaseMessage], result: ChatResult, latency: float):
+        keys = self._keys(messages)
+        message = result.generations[0].message
+        self.cassette.write({
+            "kind": "chat",
+            "key": keys[0],
+            "loose_key": keys[1],
+            "model": self.model_name,
+            "prompt": _message_pairs(messages),
+            "response": message.content,
+            "usage": getattr(message, "usage_metadata", None),
+            "latency": round(latency, 4)
+        })
+
+    @staticmethod
+    def _result(entry: dict) -> ChatResult:
+        message = AIMessage(content=entry["response"])
+        if entry.get("usage"):
+            message.usage_metadata = entry["usage"]
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any
+    ) -> ChatResult:
+        if self.cassette.mode == "replay":
+            entry, delay = self._replayed(messages)
+            if delay > 0:
+                time.sleep(delay)
+            return self._result(entry)
+
+        started = time.perf_counter()
+        result = self.inner._generate(messages, stop=stop, **kwargs)
+        self._record(messages, result, time.perf_counter() - started)
+        return result
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any
+    ) -> ChatResult:
+        if self.cassette.mode == "replay":
+            entry, delay = self._replayed(messages)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            return self._result(entry)
+
+        started = time.perf_counter()
+        result = await self.inner._agenerate(messages, stop=stop, **kwargs)
+        self._record(messages, result, time.perf_counter() - started)
+        return result
+
+
+class CassetteEmbeddings(Embeddings):
+    """Embeddings that record the wrapped client's vectors, or replay them without it"""
+
+    def __init__(self, cassette: Cassette, inner: Optional[Embeddings] = None,
+                 model_name: str = "", latency_scale: float = 1.0):
+        self.cassette = cassette
+        self.inner = inner
+        self.model_name = model_name
+        self.latency_scale = latency_scale
+
+    def _key(self, kind: str, text: str) -> str:
+        return _digest(kind, self.model_name, text)
+
+    def _embed(self, kind: str, texts: List[str]) -> List[List[float]]:
+        keys = [self._key(kind, text) for text in texts]
+        if self.cassette.mode == "replay":
+            vectors, delay = [], 0.0
+            for key, text in zip(keys, texts):
+                entry = self.cassette.lookup(key)
+                if entry is None:
+                    raise CassetteMissError(f"No recorded embedding for {key}: {text[:100]}")
+                vectors.append(np.frombuffer(base64.b64decode(entry["vector"]), dtype=np.float32).tolist())
+                delay += entry["latency"]
+            if delay * self.latency_scale > 0:
+                time.sleep(delay * self.latency_scale)
+            return vectors
+
+        started = time.perf_counter()
+        if kind == "query":
+            vectors = [self.inner.embed_query(texts[0])]
+        else:
+            vectors = self.inner.embed_documents(texts)
+        # The batch latency is spread over its texts so replays of other batchings add up the same
+        latency = (time.perf_counter() - started) / max(1, len(texts))
+        for key, vector in zip(keys, vectors):
+            self.cassette.write({
+                "kind": "embedding",
+                "key": key,
+                "model": self.model_name,
+                "vector": base64.b64encode(np.asarray(vector, dtype=np.float32).tobytes()).decode("ascii"),
+                "latency": round(latency, 5)
+            })
+        return vectors
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._embed("document", texts) if texts else []
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed("query", [text])[0]
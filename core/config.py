@@ -7,6 +7,11 @@ class Settings(BaseSettings):
     # API Configuration
     API_TOKEN: str
     LOG_LEVEL: str = "INFO"
+    LOG_FORMAT: str = "text"  # text or json (one JSON object per line)
+    LOG_ENQUEUE: bool = True  # write logs from a background thread
+    LOG_SAMPLE_RATE: float = 0.1  # share of requests that log every question and tool call
+    LOG_MAX_MESSAGE_CHARS: int = 1000
+    AGENT_VERBOSE: bool = False  # print LangChain's agent trace to stdout
     
     # Google Gemini Configuration
     GOOGLE_API_KEY: str
@@ -26,10 +31,104 @@ class Settings(BaseSettings):
     # Document Processing
     CHUNK_SIZE: int = 1000
     CHUNK_OVERLAP: int = 200
+    CHILD_CHUNK_TOKENS: int = 100
+    CHILD_CHUNK_OVERLAP_TOKENS: int = 20
+    PARENT_MAX_TOKENS: int = 1200
+    INGEST_CONCURRENCY: int = 4  # documents downloaded, parsed and embedded at once, across all requests
+    MAX_DOCUMENTS_PER_REQUEST: int = 10
     
     # Retrieval Configuration
     TOP_K_RESULTS: int = 5
     SIMILARITY_THRESHOLD: float = 0.7
+    CHILD_SEARCH_FETCH_MULTIPLIER: int = 3
+    PARENT_CONTEXT_TOKEN_BUDGET: int = 2000
+    HYBRID_DENSE_WEIGHT: float = 1.0
+    HYBRID_SPARSE_WEIGHT: float = 1.0
+    RRF_K: int = 60
+    RERANK_ENABLED: bool = True
+    RERANK_FETCH_MULTIPLIER: int = 4
+    
+    # Serve dense search from an in-process quantized copy of the vectors
+    LOCAL_DENSE_SEARCH: bool = False
+    VECTOR_QUANTIZATION: str = "int8"  # float32, int8 or binary
+    QUANTIZED_RESCORE_MULTIPLIER: int = 10
+    # Binary mode keeps its float32 rescoring vectors in a memory-mapped file here, not in RAM
+    QUANTIZED_INDEX_DIR: str = "data/vector_index"
+    # "memory" keeps vectors only in the local index and never talks to Pinecone (benchmarks, offline runs)
+    VECTOR_BACKEND: str = "pinecone"
+    
+    # Answer questions straight from the fact index when a single fact clearly matches
+    FACT_FAST_PATH_ENABLED: bool = True
+    
+    # Route searches to the sections a question is about, using the document digest built at ingestion
+    SECTION_ROUTING_ENABLED: bool = True
+    SECTION_ROUTING_MAX_SECTIONS: int = 3
+    SECTION_ROUTING_MIN_SCORE: float = 0.1  # TF-IDF cosine of the question and the best section
+    SECTION_ROUTING_MIN_RESULTS: int = 2  # fewer routed results fall back to searching the whole document
+    
+    # Repeated or rephrased questions in one request are answered once
+    QUESTION_DEDUP_ENABLED: bool = True
+    QUESTION_DEDUP_SIMILARITY: float = 0.97  # cosine of the query embeddings; content words must match too
+    
+    # Trim retrieved chunks to the sentences relevant to the question
+    CONTEXT_COMPRESSION_ENABLED: bool = True
+    CONTEXT_COMPRESSION_MAX_SENTENCES: int = 8
+    CONTEXT_COMPRESSION_NEIGHBOURS: int = 1
+    
+    # Record model calls to a cassette, or replay them from it instead of calling Gemini
+    LLM_CASSETTE_MODE: str = ""  # "", "record" or "replay"
+    LLM_CASSETTE_PATH: str = "data/llm_cassette.jsonl.gz"
+    LLM_CASSETTE_LATENCY_SCALE: float = 1.0  # replay with the recorded latencies, 0 for none
+    
+    # Micro-batching of short LLM tasks (question completion, query analysis, table QA) across one request's questions
+    LLM_BATCH_ENABLED: bool = True
+    LLM_BATCH_WINDOW_MS: float = 20.0  # how long a prompt waits for others to join it
+    LLM_BATCH_MAX_SIZE: int = 8
+    LLM_BATCH_MAX_PROMPT_CHARS: int = 6000  # longer prompts are sent on their own
+    
+    # Opt-in request profiling: X-Profile header from these tokens (comma separated), or a random sample
+    PROFILING_TOKENS: str = ""
+    PROFILING_SAMPLE_RATE: float = 0.0
+    PROFILING_DIR: str = "data/profiles"
+    PROFILING_INTERVAL_MS: float = 5.0
+    PROFILING_BLOCKING_THRESHOLD_MS: float = 50.0  # event loop stalls at least this long are reported
+    
+    # CPU-bound work (parsing, chunking, index fitting) runs on shared pools instead of the event loop
+    OFFLOAD_THREADS: int = 4
+    OFFLOAD_PROCESSES: int = 0  # >0 parses and cleans documents in worker processes
+    
+    # Event loop watchdog: lag histogram, and the blocking stack logged for long stalls
+    LOOP_WATCHDOG_ENABLED: bool = True
+    LOOP_WATCHDOG_INTERVAL_MS: float = 100.0
+    LOOP_WATCHDOG_THRESHOLD_MS: float = 250.0
+    
+    # Background warm-up after start-up; /ready returns 503 until it has finished
+    WARMUP_ENABLED: bool = True
+    WARMUP_RETRY_SECONDS: float = 15.0
+    
+    # Cache shared by the workers of a node (SQLite in WAL mode): embeddings and final answers
+    SHARED_CACHE_ENABLED: bool = True
+    SHARED_CACHE_PATH: str = "data/shared_cache.db"
+    SHARED_CACHE_MAX_MB: float = 512.0
+    SHARED_CACHE_EMBEDDING_TTL_SECONDS: float = 7 * 24 * 3600.0
+    SHARED_CACHE_ANSWER_TTL_SECONDS: float = 3600.0
+    SHARED_CACHE_DEFAULT_TTL_SECONDS: float = 3600.0
+    
+    # Async job API
+    JOB_WORKERS: int = 2
+    JOB_MAX_PENDING: int = 100
+    JOB_STORE_PATH: str = "data/jobs.db"
+    JOB_STALE_SECONDS: int = 600  # running jobs without progress for this long are requeued on startup
+    
+    # Admission control for /hackrx/run, in weight units (a small request costs ~2)
+    ADMISSION_CAPACITY: float = 16.0
+    ADMISSION_MAX_QUEUE: int = 32
+    ADMISSION_QUEUE_TIMEOUT: float = 30.0  # seconds a request may wait for capacity
+    ADMISSION_BASE_COST: float = 1.0
+    ADMISSION_QUESTION_COST: float = 0.1
+    ADMISSION_MB_COST: float = 0.5
+    ADMISSION_PROBE_DOCUMENT_SIZE: bool = True  # HEAD the document URL to weigh it by size
+    ADMISSION_TOKEN_QUOTA_PER_MINUTE: float = 0.0  # weight units per API token per minute, 0 disables
     
     class Config:
         env_file = ".env"
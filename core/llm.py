@@ -0,0 +1,110 @@
+# core/llm.py
+import atexit
+from typing import Any, Callable, Optional
+
+from core.config import settings
+from core.cassette import Cassette, CassetteChatModel, CassetteEmbeddings
+
+# Replacements installed by benchmarks and offline tooling; None means the real Gemini clients
+_chat_model_factory: Optional[Callable[..., Any]] = None
+_embeddings_factory: Optional[Callable[..., Any]] = None
+
+# Record/replay of every model call, configured by LLM_CASSETTE_* or `use_cassette`
+_cassette: Optional[Cassette] = None
+_cassette_latency_scale: float = settings.LLM_CASSETTE_LATENCY_SCALE
+_cassette_configured = False
+
+
+def _get_cassette() -> Optional[Cassette]:
+    if not _cassette_configured and settings.LLM_CASSETTE_MODE:
+        use_cassette(settings.LLM_CASSETTE_PATH, settings.LLM_CASSETTE_MODE, settings.LLM_CASSETTE_LATENCY_SCALE)
+    return _cassette
+
+
+def _create_client_chat_model(model: str, temperature: float, **kwargs: Any):
+    if _chat_model_factory is not None:
+        return _chat_model_factory(model=model, temperature=temperature, **kwargs)
+    # Imported on first use: the Gemini SDK is one of the slowest imports of the app
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    return ChatGoogleGenerativeAI(
+        model=model,
+        google_api_key=settings.GOOGLE_API_KEY,
+        temperature=temperature,
+        **kwargs
+    )
+
+
+def _create_client_embeddings():
+    if _embeddings_factory is not None:
+        return _embeddings_factory(model=settings.EMBEDDING_MODEL)
+    from langchain_google_genai import GoogleGenerativeAIEmbeddings
+    return GoogleGenerativeAIEmbeddings(
+        model=settings.EMBEDDING_MODEL,
+        google_api_key=settings.GOOGLE_API_KEY
+    )
+
+
+def create_chat_model(model: Optional[str] = None, temperature: float = 0.1, **kwargs: Any):
+    """The chat model used by the agent and the chains"""
+    model = model or settings.GOOGLE_GEMINI_MODEL_NAME
+    cassette = _get_cassette()
+    if cassette is None:
+        return _create_client_chat_model(model, temperature, **kwargs)
+
+    # Callbacks belong to the outer model so every call is observed exactly once
+    callbacks = kwargs.pop("callbacks", None)
+    inner = None if cassette.mode == "replay" else _create_client_chat_model(model, temperature, **kwargs)
+    return CassetteChatModel(
+        cassette=cassette,
+        inner=inner,
+        model_name=model,
+        latency_scale=_cassette_latency_scale,
+        callbacks=callbacks
+    )
+
+
+def create_embeddings():
+    """The embedding client used by the vector store"""
+    cassette = _get_cassette()
+    if cassette is None:
+        return _create_client_embeddings()
+    inner = None if cassette.mode == "replay" else _create_client_embeddings()
+    return CassetteEmbeddings(
+        cassette,
+        inner=inner,
+        model_name=settings.EMBEDDING_MODEL,
+        latency_scale=_cassette_latency_scale
+    )
+
+
+def override_models(
+    chat_model_factory: Optional[Callable[..., Any]] = None,
+    embeddings_factory: Optional[Callable[..., Any]] = None
+):
+    """Swap the model clients process-wide, e.g. for local stand-ins; call with no arguments to reset"""
+    global _chat_model_factory, _embeddings_factory
+    _chat_model_factory = chat_model_factory
+    _embeddings_factory = embeddings_factory
+
+
+def cassette_active() -> bool:
+    """Whether model calls are being recorded or replayed"""
+    return _get_cassette() is not None
+
+
+def use_cassette(path: Optional[str], mode: str = "replay", latency_scale: float = 1.0) -> Optional[Cassette]:
+    """
+    Record model calls to, or replay them from, the cassette at `path` for models created
+    from now on. `latency_scale` 1.0 replays recorded latencies, 0 replays instantly.
+    Pass None to go back to the live clients.
+    """
+    global _cassette, _cassette_latency_scale, _cassette_configured
+    _cassette_configured = True
+    if _cassette is not None:
+        _cassette.close()
+        _cassette = None
+    if path:
+        _cassette = Cassette(path, mode)
+        _cassette_latency_scale = latency_scale
+        atexit.register(_cassette.close)
+    return _cassette
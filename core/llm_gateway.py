@@ -0,0 +1,162 @@
+# core/llm_gateway.py
+"""
+Micro-batching of short, independent LLM tasks (question completion, query analysis,
+table QA).
+
+The questions of one request run concurrently and issue these at nearly the same moment.
+Each request gets its own gateway, so prompts are only ever packed with prompts of the
+same request and one caller's document text never reaches a call made for another. The
+gateway holds each prompt for up to LLM_BATCH_WINDOW_MS; the prompts collected by then are packed into one
+structured prompt that asks for a JSON object with one answer per task number, and the
+answers are handed back to their callers. Gemini has no synchronous multi-prompt request
+(its batch mode is asynchronous and takes minutes), so packing is the only batching
+available to a request that is waiting for its answer.
+
+A lone prompt is sent as is, and tasks the packed answer does not cover are retried
+individually, so callers always get the answer a plain call would give them.
+"""
+import asyncio
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from loguru import logger
+
+from core.config import settings
+from core.llm import cassette_active
+from core.metrics import LLM_BATCH_SIZE
+
+BATCH_MARKER = "You are given several independent tasks."
+TASK_HEADER = "### Task {index}"
+TASK_PATTERN = re.compile(r"^### Task (\d+)\n", re.MULTILINE)
+JSON_FENCE = re.compile(r"^```(?:json)?\s*|\s*```$")
+
+
+def pack_prompts(prompts: List[str]) -> str:
+    """One prompt asking for the answers of all `prompts`, keyed by their 1-based number"""
+    tasks = "\n\n".join(
+        f"{TASK_HEADER.format(index=index)}\n{prompt.strip()}" for index, prompt in enumerate(prompts, 1)
+    )
+    return (
+        f"{BATCH_MARKER} Complete each one on its own, exactly as if it were the only one, "
+        f"following its instructions about the answer format.\n"
+        f"Return ONLY a JSON object mapping each task number to that task's complete answer as a string, "
+        f'e.g. {{"1": "...", "2": "..."}}.\n\n{tasks}'
+    )
+
+
+def split_packed_prompt(prompt: str) -> List[str]:
+    """The task prompts inside a packed prompt, in order"""
+    parts = TASK_PATTERN.split(prompt)
+    # parts: [preamble, "1", task 1, "2", task 2, ...]
+    return [task.strip() for task in parts[2::2]]
+
+
+def unpack_response(text: str, count: int) -> Dict[int, str]:
+    """Answers by 0-based task index; tasks missing from the response are left out"""
+    data = json.loads(JSON_FENCE.sub("", text.strip()))
+    answers = {}
+    for key, value in data.items():
+        if not str(key).isdigit() or not 1 <= int(key) <= count or value is None:
+            continue
+        answers[int(key) - 1] = value if isinstance(value, str) else json.dumps(value)
+    return answers
+
+
+class LLMGateway:
+    """Sends short prompts submitted within a few milliseconds of each other as one call to `llm`"""
+
+    def __init__(self, llm: Any, window: float = 0.02, max_batch: int = 8, max_prompt_chars: int = 6000):
+        self.llm = llm
+        self.window = window
+        self.max_batch = max_batch
+        self.max_prompt_chars = max_prompt_chars
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._flushes = set()
+
+    async def generate(self, prompt: str) -> str:
+        """The model's answer to `prompt`, possibly sent together with other callers' prompts"""
+        if len(prompt) > self.max_prompt_chars:
+            return await self._single(prompt)
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((prompt, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.window, self._flush)
+        return await future
+
+    async def _single(self, prompt: str) -> str:
+        response = await self.llm.ainvoke(prompt)
+        return response.content.strip()
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        task = asyncio.create_task(self._send(batch))
+        self._flushes.add(task)
+        task.add_done_callback(self._flushes.discard)
+
+    async def _send(self, batch: List[Tuple[str, asyncio.Future]]):
+        LLM_BATCH_SIZE.observe(len(batch))
+        prompts = [prompt for prompt, _ in batch]
+        answers: Dict[int, str] = {}
+        try:
+            if len(batch) == 1:
+                answers[0] = await self._single(prompts[0])
+            else:
+                packed = await self._single(pack_prompts(prompts))
+                try:
+                    answers = unpack_response(packed, len(prompts))
+                except (ValueError, AttributeError) as e:
+                    logger.warning(f"Could not parse batched answer for {len(prompts)} tasks: {str(e)}")
+        except Exception as e:
+            # The call itself failed (e.g. throttled): every caller sees the error, as a plain call would
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        missing = [index for index in range(len(batch)) if index not in answers]
+        if missing:
+            logger.warning(f"Batched answer covered {len(batch) - len(missing)}/{len(batch)} tasks, retrying the rest")
+        results = await asyncio.gather(*(self._single(prompts[index]) for index in missing), return_exceptions=True)
+        for index, result in zip(missing, results):
+            answers[index] = result
+
+        for index, (_, future) in enumerate(batch):
+            if future.done():
+                continue
+            if isinstance(answers[index], BaseException):
+                future.set_exception(answers[index])
+            else:
+                future.set_result(answers[index])
+
+
+class _DirectGateway(LLMGateway):
+    """Same interface, one call per prompt"""
+
+    async def generate(self, prompt: str) -> str:
+        return await self._single(prompt)
+
+
+def create_llm_gateway(llm: Any) -> LLMGateway:
+    """
+    A gateway for one request's prompts, sent with `llm`. Batching is off with
+    LLM_BATCH_ENABLED=false, and while a cassette is recording or replaying: packed prompts
+    depend on timing, so a replay could not find them.
+    """
+    if settings.LLM_BATCH_ENABLED and not cassette_active():
+        return LLMGateway(
+            llm,
+            window=settings.LLM_BATCH_WINDOW_MS / 1000,
+            max_batch=settings.LLM_BATCH_MAX_SIZE,
+            max_prompt_chars=settings.LLM_BATCH_MAX_PROMPT_CHARS
+        )
+    return _DirectGateway(llm)
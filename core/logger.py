@@ -1,9 +1,19 @@
-
 # core/logger.py
+import json
 import logging
+import random
 import sys
+import traceback
+from contextvars import ContextVar
 from loguru import logger
 from core.config import settings
+from core.metrics import request_id_var
+
+# Whether the current request's per-question logs are written, decided once per request
+log_sampled_var: ContextVar[bool] = ContextVar("log_sampled", default=True)
+
+TEXT_FORMAT = "{time:YYYY-MM-DD HH:mm:ss} | {level: <8} | {extra[request_id]} | {name}:{function}:{line} - {message}"
+CONSOLE_FORMAT = "<green>{time:YYYY-MM-DD HH:mm:ss}</green> | <level>{level: <8}</level> | {extra[request_id]} | <cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> - <level>{message}</level>"
 
 class InterceptHandler(logging.Handler):
     def emit(self, record):
@@ -23,28 +33,87 @@ class InterceptHandler(logging.Handler):
             level, record.getMessage()
         )
 
+
+class _MutedLogger:
+    """Drops debug and info messages; warnings and errors still go to the real logger"""
+
+    def debug(self, *args, **kwargs):
+        pass
+
+    def info(self, *args, **kwargs):
+        pass
+
+    def __getattr__(self, name):
+        return getattr(logger, name)
+
+
+_muted_logger = _MutedLogger()
+
+
+def hot_logger():
+    """
+    Logger for messages written once per question or tool call. Only a sample of requests
+    (LOG_SAMPLE_RATE) write them, so log volume does not grow with question count.
+    """
+    return logger if log_sampled_var.get() else _muted_logger
+
+
+def sample_request_logs():
+    """Decide whether the current request (or job) writes its per-question logs"""
+    log_sampled_var.set(settings.LOG_SAMPLE_RATE >= 1 or random.random() < settings.LOG_SAMPLE_RATE)
+
+
+def _patch(record):
+    record["extra"].setdefault("request_id", request_id_var.get())
+    # Cap payloads such as full queries or retrieved context
+    message = record["message"]
+    if len(message) > settings.LOG_MAX_MESSAGE_CHARS:
+        record["message"] = f"{message[:settings.LOG_MAX_MESSAGE_CHARS]}... [{len(message)} chars]"
+
+
+def _json_format(record) -> str:
+    entry = {
+        "time": record["time"].isoformat(),
+        "level": record["level"].name,
+        "logger": record["name"],
+        "function": record["function"],
+        "line": record["line"],
+        "message": record["message"],
+    }
+    # request_id, stage timings and anything else bound to the record
+    entry.update({key: value for key, value in record["extra"].items() if key != "json"})
+    if record["exception"] is not None:
+        entry["exception"] = "".join(traceback.format_exception(*record["exception"]))
+    record["extra"]["json"] = json.dumps(entry, default=str)
+    return "{extra[json]}\n"
+
+
 def setup_logger():
     # Remove default logger
     logger.remove()
-    
-    # Add custom logger
+    logger.configure(patcher=_patch)
+    json_logs = settings.LOG_FORMAT == "json"
+
+    # Add custom logger; with enqueue, a background thread does the writing
     logger.add(
         sys.stderr,
-        format="<green>{time:YYYY-MM-DD HH:mm:ss}</green> | <level>{level: <8}</level> | <cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> - <level>{message}</level>",
+        format=_json_format if json_logs else CONSOLE_FORMAT,
         level=settings.LOG_LEVEL,
-        colorize=True
+        colorize=not json_logs,
+        enqueue=settings.LOG_ENQUEUE
     )
-    
+
     # Add file logging
     logger.add(
         "logs/app.log",
         rotation="10 MB",
         retention="10 days",
-        format="{time:YYYY-MM-DD HH:mm:ss} | {level: <8} | {name}:{function}:{line} - {message}",
-        level=settings.LOG_LEVEL
+        format=_json_format if json_logs else TEXT_FORMAT,
+        level=settings.LOG_LEVEL,
+        enqueue=settings.LOG_ENQUEUE
     )
-    
+
     # Intercept standard logging
     logging.basicConfig(handlers=[InterceptHandler()], level=0, force=True)
-    
+
     return logger
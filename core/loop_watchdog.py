@@ -0,0 +1,83 @@
+# core/loop_watchdog.py
+import asyncio
+import sys
+import threading
+import time
+from typing import Optional
+
+from loguru import logger
+
+from core.config import settings
+from core.metrics import LOOP_LAG
+from core.profiling import stack_labels
+
+
+class LoopWatchdog:
+    """
+    Measures event loop lag with a heartbeat timer, and logs what the loop is running
+    when a heartbeat is overdue by more than `threshold`. The stack is taken from a
+    separate thread while the loop is still blocked, so it names the offending call.
+    """
+
+    def __init__(self, interval: float = 0.1, threshold: float = 0.25):
+        self.interval = interval
+        self.threshold = threshold
+        self._loop_thread_id: Optional[int] = None
+        self._last_beat = 0.0
+        self._reported_beat = 0.0
+        self._task: Optional[asyncio.Task] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if self._task is not None:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.perf_counter()
+        self._stop.clear()
+        self._task = asyncio.create_task(self._heartbeat())
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+        logger.info(f"Event loop watchdog started (threshold {self.threshold * 1000:.0f} ms)")
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._stop.set()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        self._thread.join()
+
+    async def _heartbeat(self):
+        while True:
+            expected = time.perf_counter() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.perf_counter()
+            LOOP_LAG.observe(max(0.0, now - expected))
+            self._last_beat = now
+
+    def _watch(self):
+        while not self._stop.wait(self.threshold / 2):
+            beat = self._last_beat
+            overdue = time.perf_counter() - beat - self.interval
+            if overdue < self.threshold or beat == self._reported_beat:
+                continue
+            # One report per stall
+            self._reported_beat = beat
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            stack = stack_labels(frame)[::-1][:12]
+            logger.warning(
+                f"Event loop blocked for at least {overdue * 1000:.0f} ms, currently in:\n  " + "\n  ".join(stack)
+            )
+
+
+loop_watchdog = LoopWatchdog(
+    interval=settings.LOOP_WATCHDOG_INTERVAL_MS / 1000,
+    threshold=settings.LOOP_WATCHDOG_THRESHOLD_MS / 1000
+)
@@ -0,0 +1,135 @@
+# core/metrics.py
+import asyncio
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+from uuid import UUID
+
+from langchain.callbacks.base import AsyncCallbackHandler
+from langchain.schema import LLMResult
+from loguru import logger
+from prometheus_client import Counter, Histogram
+
+# Set per HTTP request (or job) and attached to log lines and histogram exemplars.
+# It is deliberately not a metric label: one series per request would explode cardinality.
+request_id_var: ContextVar[str] = ContextVar("request_id", default="-")
+# Set while a request is being profiled; every stage it runs (in any of its tasks) is appended
+stage_spans_var: ContextVar[Optional[List[dict]]] = ContextVar("stage_spans", default=None)
+
+STAGE_SECONDS = Histogram(
+    "rag_stage_duration_seconds",
+    "Latency of pipeline stages",
+    labelnames=["stage"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+)
+AGENT_ITERATIONS = Histogram(
+    "rag_agent_iterations",
+    "Tool-calling iterations per agent run",
+    buckets=(0, 1, 2, 3, 4, 5, 6, 8, 10)
+)
+LOOP_LAG = Histogram(
+    "rag_event_loop_lag_seconds",
+    "How late the event loop ran a timer, a measure of how long it was blocked",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+)
+LLM_BATCH_SIZE = Histogram(
+    "rag_llm_batch_size",
+    "Prompts sent together in one LLM call by the micro-batching gateway",
+    buckets=(1, 2, 3, 4, 6, 8, 12, 16)
+)
+LLM_TOKENS = Counter("rag_llm_tokens_total", "LLM tokens used", labelnames=["kind"])
+CACHE_EVENTS = Counter("rag_cache_events_total", "Cache and shortcut lookups", labelnames=["cache", "result"])
+
+
+def new_request_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+def observe_stage(stage: str, seconds: float):
+    request_id = request_id_var.get()
+    exemplar = {"request_id": request_id} if request_id != "-" else None
+    STAGE_SECONDS.labels(stage=stage).observe(seconds, exemplar=exemplar)
+    logger.debug("stage {stage} took {ms} ms", stage=stage, ms=round(seconds * 1000, 1))
+    spans = stage_spans_var.get()
+    if spans is not None:
+        try:
+            task = asyncio.current_task()
+        except RuntimeError:
+            task = None
+        spans.append({
+            "stage": stage,
+            "task": task.get_name() if task is not None else "-",
+            "end": time.perf_counter(),
+            "seconds": seconds
+        })
+
+
+@contextmanager
+def track_stage(stage: str):
+    """Time a block of (sync or async) code as one pipeline stage"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - started)
+
+
+def record_cache(cache: str, hit: bool):
+    CACHE_EVENTS.labels(cache=cache, result="hit" if hit else "miss").inc()
+
+
+class LLMMetricsHandler(AsyncCallbackHandler):
+    """LangChain callback timing every LLM call and counting its tokens"""
+
+    def __init__(self):
+        self.started: Dict[UUID, float] = {}
+
+    async def on_llm_start(self, serialized: Dict[str, Any], prompts, *, run_id: UUID, **kwargs: Any) -> None:
+        self.started[run_id] = time.perf_counter()
+
+    async def on_chat_model_start(self, serialized: Dict[str, Any], messages, *, run_id: UUID, **kwargs: Any) -> None:
+        self.started[run_id] = time.perf_counter()
+
+    async def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        started = self.started.pop(run_id, None)
+        if started is not None:
+            observe_stage("llm_call", time.perf_counter() - started)
+
+        usage = self._usage(response)
+        if usage:
+            LLM_TOKENS.labels(kind="prompt").inc(usage.get("input_tokens", 0))
+            LLM_TOKENS.labels(kind="completion").inc(usage.get("output_tokens", 0))
+
+    async def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        started = self.started.pop(run_id, None)
+        if started is not None:
+            observe_stage("llm_call_error", time.perf_counter() - started)
+
+    @staticmethod
+    def _usage(response: LLMResult) -> Optional[Dict[str, int]]:
+        # Newer integrations put usage on the message, older ones in llm_output
+        for generations in response.generations:
+            for generation in generations:
+                message = getattr(generation, "message", None)
+                usage = getattr(message, "usage_metadata", None)
+                if usage:
+                    return usage
+        token_usage = (response.llm_output or {}).get("token_usage") or {}
+        if token_usage:
+            return {
+                "input_tokens": token_usage.get("prompt_tokens", 0),
+                "output_tokens": token_usage.get("completion_tokens", 0)
+            }
+        return None
+
+
+class AgentIterationCounter(AsyncCallbackHandler):
+    """Counts the tool calls of one agent run"""
+
+    def __init__(self):
+        self.iterations = 0
+
+    async def on_agent_action(self, action, *, run_id: UUID, **kwargs: Any) -> None:
+        self.iterations += 1
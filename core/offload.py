@@ -0,0 +1,66 @@
+# core/offload.py
+"""
+One place to run CPU-bound work off the event loop.
+
+`run_in_thread` uses a shared thread pool sized by OFFLOAD_THREADS. The GIL still
+serialises pure-Python work, but the loop gets its turn every switch interval instead of
+stalling until the call returns. `run_in_process` uses a shared process pool
+(OFFLOAD_PROCESSES > 0) for picklable module-level functions that are worth shipping their
+inputs and outputs across processes, and falls back to the thread pool otherwise.
+"""
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Optional, TypeVar
+
+from loguru import logger
+
+from core.config import settings
+
+T = TypeVar("T")
+
+_thread_pool: Optional[ThreadPoolExecutor] = None
+_process_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _threads() -> Executor:
+    global _thread_pool
+    if _thread_pool is None:
+        _thread_pool = ThreadPoolExecutor(max_workers=settings.OFFLOAD_THREADS, thread_name_prefix="offload")
+    return _thread_pool
+
+
+def _processes() -> Optional[Executor]:
+    global _process_pool
+    if _process_pool is None and settings.OFFLOAD_PROCESSES > 0:
+        _process_pool = ProcessPoolExecutor(max_workers=settings.OFFLOAD_PROCESSES)
+    return _process_pool
+
+
+async def run_in_thread(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Run `func` on the shared offload thread pool, with the caller's context (request id, profiling)"""
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(_threads(), functools.partial(context.run, func, *args, **kwargs))
+
+
+async def run_in_process(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Run a picklable `func` on the shared process pool, or the thread pool when it is disabled"""
+    pool = _processes()
+    if pool is None:
+        return await run_in_thread(func, *args, **kwargs)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(pool, functools.partial(func, *args, **kwargs))
+
+
+def shutdown():
+    """Stop the pools; called on application shutdown"""
+    global _thread_pool, _process_pool
+    if _process_pool is not None:
+        logger.info("Shutting down offload process pool")
+        _process_pool.shutdown(wait=False, cancel_futures=True)
+        _process_pool = None
+    if _thread_pool is not None:
+        _thread_pool.shutdown(wait=False, cancel_futures=True)
+        _thread_pool = None
@@ -0,0 +1,219 @@
+# core/profiling.py
+"""
+Opt-in per-request profiling.
+
+A profiled request runs with a background thread sampling the stacks of every busy thread
+(the event loop and executor workers) every few milliseconds. The result is written to
+PROFILING_DIR/<request id>/ as:
+
+- profile.collapsed: folded stacks ("thread;outer;...;inner count"), the input format of
+  flamegraph.pl, speedscope and similar tools
+- blocking.json: stretches of at least PROFILING_BLOCKING_THRESHOLD_MS during which the
+  event loop never got back to its selector, with the stack seen most often in each
+- stages.json: every pipeline stage the request ran, with the asyncio task it ran in
+
+Sampling covers the whole process, so requests running concurrently show up as well.
+"""
+import asyncio
+import json
+import os
+import random
+import re
+import sys
+import sysconfig
+import threading
+import time
+from collections import Counter
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional
+
+from loguru import logger
+
+from core.config import settings
+from core.metrics import stage_spans_var
+
+# Frames of threads waiting for work rather than doing it
+IDLE_FILES = ("selectors.py", "threading.py", "queue.py")
+PATH_MARKERS = ("site-packages" + os.sep, sysconfig.get_paths()["stdlib"] + os.sep, os.getcwd() + os.sep)
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    filename = code.co_filename
+    # Keep paths short and stable across machines
+    for marker in PATH_MARKERS:
+        index = filename.find(marker)
+        if index >= 0:
+            filename = filename[index + len(marker):]
+            break
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})"
+
+
+def stack_labels(frame) -> List[str]:
+    """Labels of a frame and its callers, outermost first"""
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    labels.reverse()
+    return labels
+
+
+class SamplingProfiler:
+    """Samples thread stacks from a background thread and tracks event loop blocking"""
+
+    def __init__(self, loop_thread_id: int, interval: float = 0.005, blocking_threshold: float = 0.05):
+        self.loop_thread_id = loop_thread_id
+        self.interval = interval
+        self.blocking_threshold = blocking_threshold
+        self.stacks: Counter = Counter()
+        self.blocking: List[dict] = []
+        self.samples = 0
+        self.started = 0.0
+        self.duration = 0.0
+        self._busy_since: Optional[float] = None
+        self._busy_stacks: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self.started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self._end_busy(time.perf_counter())
+        self.duration = time.perf_counter() - self.started
+
+    def _run(self):
+        own_id = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            now = time.perf_counter()
+            self.samples += 1
+            if len(names) != threading.active_count():
+                names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                idle = frame.f_code.co_filename.endswith(IDLE_FILES)
+                if thread_id == self.loop_thread_id:
+                    if idle:
+                        self._end_busy(now)
+                        continue
+                    stack = ";".join(["event-loop"] + stack_labels(frame))
+                    if self._busy_since is None:
+                        self._busy_since = now
+                    self._busy_stacks[stack] += 1
+                elif idle:
+                    continue
+                else:
+                    stack = ";".join([names.get(thread_id, str(thread_id))] + stack_labels(frame))
+                self.stacks[stack] += 1
+
+    def _end_busy(self, now: float):
+        if self._busy_since is None:
+            return
+        blocked = now - self._busy_since
+        if blocked >= self.blocking_threshold and self._busy_stacks:
+            stack, count = self._busy_stacks.most_common(1)[0]
+            self.blocking.append({
+                "start_ms": round((self._busy_since - self.started) * 1000, 1),
+                "duration_ms": round(blocked * 1000, 1),
+                "samples": sum(self._busy_stacks.values()),
+                "top_stack_samples": count,
+                # Innermost frames first: usually enough to name the blocking call
+                "top_stack": stack.split(";")[::-1][:15]
+            })
+        self._busy_since = None
+        self._busy_stacks = Counter()
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+class RequestProfiler:
+    """Decides which requests to profile and writes their reports"""
+
+    def __init__(self):
+        self._active = asyncio.Lock()
+
+    @staticmethod
+    def wanted(authorization: Optional[str], profile_header: Optional[str]) -> bool:
+        """Profile when an authorized token asks for it, or when the request is sampled"""
+        if profile_header and profile_header.lower() not in ("0", "false", "no"):
+            token = authorization.split(" ", 1)[-1] if authorization else None
+            allowed = [t.strip() for t in settings.PROFILING_TOKENS.split(",") if t.strip()]
+            if token in allowed:
+                return True
+            logger.warning("Ignoring profiling request from a token not in PROFILING_TOKENS")
+        return settings.PROFILING_SAMPLE_RATE > 0 and random.random() < settings.PROFILING_SAMPLE_RATE
+
+    @asynccontextmanager
+    async def profile(self, request_id: str, enabled: bool = True):
+        """Profile the enclosed block; only one request is profiled at a time, others run unprofiled"""
+        if not enabled or self._active.locked():
+            yield
+            return
+
+        async with self._active:
+            profiler = SamplingProfiler(
+                threading.get_ident(),
+                interval=settings.PROFILING_INTERVAL_MS / 1000,
+                blocking_threshold=settings.PROFILING_BLOCKING_THRESHOLD_MS / 1000
+            )
+            spans: List[dict] = []
+            token = stage_spans_var.set(spans)
+            profiler.start()
+            try:
+                yield
+            finally:
+                profiler.stop()
+                stage_spans_var.reset(token)
+                try:
+                    directory = await asyncio.get_running_loop().run_in_executor(
+                        None, self._write, request_id, profiler, spans
+                    )
+                    logger.info(
+                        f"[{request_id}] profile written to {directory}: {profiler.samples} samples, "
+                        f"{len(profiler.blocking)} event loop stalls"
+                    )
+                except Exception as e:
+                    logger.error(f"Could not write profile of request {request_id}: {str(e)}")
+
+    @staticmethod
+    def _write(request_id: str, profiler: SamplingProfiler, spans: List[dict]) -> str:
+        # Request ids may come from the X-Request-ID header
+        directory = os.path.join(settings.PROFILING_DIR, re.sub(r"[^A-Za-z0-9_-]", "_", request_id))
+        os.makedirs(directory, exist_ok=True)
+
+        with open(os.path.join(directory, "profile.collapsed"), "w") as f:
+            f.write(profiler.collapsed())
+
+        blocked_ms = sum(stall["duration_ms"] for stall in profiler.blocking)
+        with open(os.path.join(directory, "blocking.json"), "w") as f:
+            json.dump({
+                "duration_ms": round(profiler.duration * 1000, 1),
+                "threshold_ms": round(profiler.blocking_threshold * 1000, 1),
+                "blocked_ms": round(blocked_ms, 1),
+                "stalls": sorted(profiler.blocking, key=lambda stall: -stall["duration_ms"])
+            }, f, indent=2)
+
+        stages: List[Dict] = [
+            {
+                "stage": span["stage"],
+                "task": span["task"],
+                "start_ms": round((span["end"] - span["seconds"] - profiler.started) * 1000, 1),
+                "duration_ms": round(span["seconds"] * 1000, 1)
+            }
+            for span in spans
+        ]
+        with open(os.path.join(directory, "stages.json"), "w") as f:
+            json.dump(sorted(stages, key=lambda stage: stage["start_ms"]), f, indent=2)
+        return directory
+
+
+request_profiler = RequestProfiler()
@@ -0,0 +1,241 @@
+# core/shared_cache.py
+"""
+Cache tier shared by every worker process on a node.
+
+Entries live in one SQLite database in WAL mode, so readers in any worker never wait on
+a writer and every write is a transaction: a crashed worker leaves either the old value
+or the new one. Each namespace ("embedding", "answer") has its own TTL, and the total
+size is bounded: once it goes over `max_bytes`, expired entries and then the least
+recently used ones are evicted. Triggers keep the running total, so bounding it costs
+no table scans.
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from loguru import logger
+
+from core.config import settings
+from core.metrics import record_cache
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    expires_at REAL NOT NULL,
+    accessed_at REAL NOT NULL,
+    PRIMARY KEY (namespace, key)
+);
+CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed_at);
+CREATE TABLE IF NOT EXISTS stats (id INTEGER PRIMARY KEY CHECK (id = 0), bytes INTEGER NOT NULL);
+INSERT OR IGNORE INTO stats VALUES (0, 0);
+CREATE TRIGGER IF NOT EXISTS entries_insert AFTER INSERT ON entries
+    BEGIN UPDATE stats SET bytes = bytes + NEW.size; END;
+CREATE TRIGGER IF NOT EXISTS entries_update AFTER UPDATE OF size ON entries
+    BEGIN UPDATE stats SET bytes = bytes + NEW.size - OLD.size; END;
+CREATE TRIGGER IF NOT EXISTS entries_delete AFTER DELETE ON entries
+    BEGIN UPDATE stats SET bytes = bytes - OLD.size; END;
+"""
+
+# Per-entry bookkeeping (row, index entry) on top of key and value
+ROW_OVERHEAD = 64
+# Hits refresh an entry's LRU position at most this often, so most reads stay reads
+TOUCH_INTERVAL = 60.0
+# Eviction frees space down to this fraction of max_bytes, so it does not run on every write
+EVICT_TO = 0.9
+
+
+def cache_key(*parts: str) -> str:
+    """Stable key for any combination of strings (model name, document ids, text)"""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class SharedCache:
+    """Size-bounded LRU cache with per-namespace TTLs in a WAL-mode SQLite file"""
+
+    def __init__(self, path: str, max_bytes: int, ttls: Dict[str, float]):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.max_bytes = max_bytes
+        self.ttls = ttls
+        self.lock = threading.Lock()
+        # Writers in other workers hold the lock for milliseconds; wait instead of failing
+        self.connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5.0)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(SCHEMA)
+
+    def get_many(self, namespace: str, keys: List[str]) -> Dict[str, bytes]:
+        """Values of the keys present and not expired"""
+        if not keys:
+            return {}
+        now = time.time()
+        found: Dict[str, bytes] = {}
+        stale: List[str] = []
+        with self.lock:
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                rows = self.connection.execute(
+                    f"SELECT key, value, expires_at, accessed_at FROM entries "
+                    f"WHERE namespace = ? AND key IN ({','.join('?' * len(batch))})",
+                    (namespace, *batch)
+                ).fetchall()
+                for key, value, expires_at, accessed_at in rows:
+                    if expires_at <= now:
+                        continue
+                    found[key] = value
+                    if accessed_at < now - TOUCH_INTERVAL:
+                        stale.append(key)
+            if stale:
+                self.connection.executemany(
+                    "UPDATE entries SET accessed_at = ? WHERE namespace = ? AND key = ?",
+                    [(now, namespace, key) for key in stale]
+                )
+        return found
+
+    def get(self, namespace: str, key: str) -> Optional[bytes]:
+        return self.get_many(namespace, [key]).get(key)
+
+    def set_many(self, namespace: str, items: Iterable[Tuple[str, bytes]]):
+        """Store values atomically, then evict if the cache went over its size"""
+        now = time.time()
+        expires_at = now + self.ttls.get(namespace, settings.SHARED_CACHE_DEFAULT_TTL_SECONDS)
+        rows = [
+            (namespace, key, value, len(key) + len(value) + ROW_OVERHEAD, expires_at, now)
+            for key, value in items
+        ]
+        if not rows:
+            return
+        with self.lock:
+            self.connection.execute("BEGIN IMMEDIATE")
+            try:
+                self.connection.executemany(
+                    "INSERT INTO entries VALUES (?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT (namespace, key) DO UPDATE SET value = excluded.value, size = excluded.size, "
+                    "expires_at = excluded.expires_at, accessed_at = excluded.accessed_at",
+                    rows
+                )
+                self._evict(now)
+                self.connection.execute("COMMIT")
+            except Exception:
+                self.connection.execute("ROLLBACK")
+                raise
+
+    def set(self, namespace: str, key: str, value: bytes):
+        self.set_many(namespace, [(key, value)])
+
+    def size(self) -> int:
+        with self.lock:
+            return self.connection.execute("SELECT bytes FROM stats").fetchone()[0]
+
+    def _evict(self, now: float):
+        # Runs inside the caller's write transaction
+        total = self.connection.execute("SELECT bytes FROM stats").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        self.connection.execute("DELETE FROM entries WHERE expires_at <= ?", (now,))
+        target = self.max_bytes * EVICT_TO
+        evicted = 0
+        while self.connection.execute("SELECT bytes FROM stats").fetchone()[0] > target:
+            cursor = self.connection.execute(
+                "DELETE FROM entries WHERE rowid IN (SELECT rowid FROM entries ORDER BY accessed_at LIMIT 256)"
+            )
+            if cursor.rowcount == 0:
+                break
+            evicted += cursor.rowcount
+        logger.info(f"Shared cache over {self.max_bytes / 1024 / 1024:.0f} MB, evicted {evicted} least recently used entries")
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+
+class SharedCacheEmbeddings(Embeddings):
+    """Embeddings served from the shared cache when any worker has computed them before"""
+
+    def __init__(self, inner: Embeddings, cache: SharedCache, model_name: str = ""):
+        self.inner = inner
+        self.cache = cache
+        self.model_name = model_name
+
+    def _embed(self, kind: str, texts: List[str]) -> List[List[float]]:
+        keys = [cache_key(kind, self.model_name, text) for text in texts]
+        try:
+            cached = self.cache.get_many("embedding", keys)
+        except sqlite3.Error as e:
+            logger.error(f"Shared cache lookup failed, embedding without it: {str(e)}")
+            cached = {}
+
+        vectors: List[Optional[List[float]]] = [
+            np.frombuffer(cached[key], dtype=np.float32).tolist() if key in cached else None
+            for key in keys
+        ]
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        for vector in vectors:
+            record_cache("embedding", vector is not None)
+        if not missing:
+            return vectors
+
+        # Only the texts no worker has embedded yet go to the client, in one call
+        if kind == "query":
+            computed = [self.inner.embed_query(texts[0])]
+        else:
+            computed = self.inner.embed_documents([texts[i] for i in missing])
+        for i, vector in zip(missing, computed):
+            vectors[i] = vector
+        try:
+            self.cache.set_many("embedding", [
+                (keys[i], np.asarray(vector, dtype=np.float32).tobytes())
+                for i, vector in zip(missing, computed)
+            ])
+        except sqlite3.Error as e:
+            logger.error(f"Could not store embeddings in the shared cache: {str(e)}")
+        return vectors
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._embed("document", texts) if texts else []
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed("query", [text])[0]
+
+
+_shared_cache: Optional[SharedCache] = None
+_shared_cache_failed = False
+_shared_cache_lock = threading.Lock()
+
+
+def get_shared_cache() -> Optional[SharedCache]:
+    """The node-wide cache, or None when SHARED_CACHE_ENABLED is off or it cannot be opened"""
+    global _shared_cache, _shared_cache_failed
+    if not settings.SHARED_CACHE_ENABLED or _shared_cache_failed:
+        return None
+    if _shared_cache is None:
+        with _shared_cache_lock:
+            if _shared_cache is None:
+                try:
+                    _shared_cache = SharedCache(
+                        settings.SHARED_CACHE_PATH,
+                        max_bytes=int(settings.SHARED_CACHE_MAX_MB * 1024 * 1024),
+                        ttls={
+                            "embedding": settings.SHARED_CACHE_EMBEDDING_TTL_SECONDS,
+                            "answer": settings.SHARED_CACHE_ANSWER_TTL_SECONDS,
+                        }
+                    )
+                except sqlite3.Error as e:
+                    logger.error(f"Could not open the shared cache at {settings.SHARED_CACHE_PATH}: {str(e)}")
+                    _shared_cache_failed = True
+                    return None
+    return _shared_cache
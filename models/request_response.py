@@ -1,15 +1,40 @@
 
 # models/request_response.py
-from pydantic import BaseModel, HttpUrl
-from typing import List, Optional, Dict, Any
+from pydantic import BaseModel, HttpUrl, field_validator
+from typing import List, Optional, Dict, Any, Union
 
 class RAGRequest(BaseModel):
-    documents: HttpUrl
+    # One document URL, or several to answer across (e.g. a policy and its addendum)
+    documents: Union[HttpUrl, List[HttpUrl]]
     questions: List[str]
+    
+    @field_validator("documents")
+    @classmethod
+    def require_documents(cls, value):
+        if isinstance(value, list) and not value:
+            raise ValueError("At least one document URL is required")
+        return value
+    
+    def document_urls(self) -> List[str]:
+        documents = self.documents if isinstance(self.documents, list) else [self.documents]
+        # Keep the order, drop repeated URLs
+        return list(dict.fromkeys(str(url) for url in documents))
 
 class RAGResponse(BaseModel):
     answers: List[str]
 
+class JobSubmitResponse(BaseModel):
+    job_id: str
+    status: str
+
+class JobStatusResponse(BaseModel):
+    job_id: str
+    status: str
+    completed: int
+    total: int
+    answers: List[Optional[str]]
+    error: Optional[str] = None
+
 class ErrorResponse(BaseModel):
     error: str
     details: Optional[str] = None
@@ -139,30 +139,55 @@
 
 
 # services/agent_executor.py
-from typing import List
+from typing import List, Optional, Union
 import asyncio
 import json
 from langchain.agents import AgentExecutor, create_structured_chat_agent
 from langchain.tools import Tool
-from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain.memory import ConversationBufferMemory
 from loguru import logger
-from langchain import hub
+from core.logger import hot_logger
 
 from core.config import settings
 from services.vector_store import VectorStoreManager
 from services.clause_matcher import ClauseMatcher
+from services.document_loader import IngestedDocument
+from services.fact_index import CLAUSE_REFERENCE
+from services.context_compressor import ContextCompressor
+from core.metrics import AgentIterationCounter, AGENT_ITERATIONS, LLMMetricsHandler, record_cache, track_stage
+from core.llm import create_chat_model
+from core.llm_gateway import create_llm_gateway
+from core.offload import run_in_thread
+from core.shared_cache import cache_key, get_shared_cache
+from chains.prompts.structured_chat import structured_chat_prompt
 
 class RAGAgentExecutor:
-    def __init__(self, vector_store: VectorStoreManager):
+    def __init__(
+        self,
+        vector_store: VectorStoreManager,
+        ingested: Union[IngestedDocument, List[IngestedDocument], None] = None
+    ):
         self.vector_store = vector_store
-        self.clause_matcher = ClauseMatcher()
-        self.llm = ChatGoogleGenerativeAI(
-            model=settings.GOOGLE_GEMINI_MODEL_NAME,
-            google_api_key=settings.GOOGLE_API_KEY,
-            temperature=0.1,
+        if ingested is None:
+            self.documents: List[IngestedDocument] = []
+        else:
+            self.documents = ingested if isinstance(ingested, list) else [ingested]
+        self.ingested = self.documents[0] if len(self.documents) == 1 else None
+        # Retrieval is scoped to this request's documents
+        self.document_ids = [doc.document_id for doc in self.documents if doc.document_id] or None
+        # Sentences are scored with the document's own TF-IDF vocabulary when there is a single one
+        self.clause_matcher = self.ingested.clause_matcher if self.ingested is not None else ClauseMatcher()
+        self.compressor = ContextCompressor(
+            self.clause_matcher,
+            max_sentences=settings.CONTEXT_COMPRESSION_MAX_SENTENCES,
+            neighbours=settings.CONTEXT_COMPRESSION_NEIGHBOURS
         )
+        self.llm = create_chat_model(temperature=0.1, callbacks=[LLMMetricsHandler()])
+        # Short one-shot tasks go through the gateway, which batches them across this request's questions
+        self.gateway = create_llm_gateway(self.llm)
+        # Answers are shared with the other workers, keyed by the documents' content hashes
+        self.answer_cache = get_shared_cache() if self.document_ids else None
         self.memory = ConversationBufferMemory(
             memory_key="chat_history",
             return_messages=True
@@ -175,14 +200,75 @@ class RAGAgentExecutor:
     # NEW: Specialized Tool Implementations
     # =================================================================
 
+    def _compress(self, query: str, results: List[tuple]) -> List[tuple]:
+        """Trim retrieved context to the relevant sentences before it reaches the LLM"""
+        if not settings.CONTEXT_COMPRESSION_ENABLED or not results:
+            return results
+        try:
+            return self.compressor.compress(query, results) or results
+        except Exception as e:
+            logger.error(f"Error compressing context: {e}")
+            return results
+
+    async def _routed_search(self, query: str, k: int, sparse_query: Optional[str] = None) -> List[tuple]:
+        """
+        Search the sections the document digest routes the query to, and the whole
+        document when routing finds no section or too little in the ones it found.
+        """
+        sections = None
+        if settings.SECTION_ROUTING_ENABLED and self.ingested is not None:
+            sections = self.ingested.digest.route(
+                query,
+                max_sections=settings.SECTION_ROUTING_MAX_SECTIONS,
+                min_score=settings.SECTION_ROUTING_MIN_SCORE
+            )
+            record_cache("section_route", bool(sections))
+        if sections:
+            results = await self.vector_store.search_with_parent_context(
+                query, k=k, sparse_query=sparse_query, document_ids=self.document_ids, sections=sections
+            )
+            if len(results) >= settings.SECTION_ROUTING_MIN_RESULTS:
+                hot_logger().info(f"Routed search to sections {sections}")
+                return results
+            hot_logger().info(f"Routed search to {sections} found {len(results)} results, searching the whole document")
+        return await self.vector_store.search_with_parent_context(
+            query, k=k, sparse_query=sparse_query, document_ids=self.document_ids
+        )
+
+    def _format_ranked(self, results: List[tuple]) -> List[str]:
+        """
+        Hybrid search scores are fused reciprocal ranks (or reranker scores), not
+        relevance on a fixed scale, so hits are shown by rank only.
+        """
+        return [
+            f"Result {i + 1} of {len(results)} (best match first):\n{self._label(doc.page_content, doc.metadata.get('source'))}"
+            for i, (doc, _) in enumerate(results)
+        ]
+
+    def _label(self, text: str, source: Optional[str]) -> str:
+        """Name the source document when a request spans several"""
+        if len(self.documents) > 1 and source:
+            return f"[Source: {source}]\n{text}"
+        return text
+
     async def _query_tabular_data_tool(self, query: str) -> str:
         """
         Specialized tool for answering questions about data in tables.
         """
-        logger.info(f"Tool engaged: query_tabular_data_tool for query: '{query}'")
+        hot_logger().info(f"Tool engaged: query_tabular_data_tool for query: '{query}'")
         try:
+            # Direct lookup in the tables extracted at ingestion, no LLM call needed
+            for document in self.documents:
+                match = document.tables.lookup(query)
+                record_cache("table_lookup", match is not None)
+                if match is not None:
+                    hot_logger().info(f"Answered from extracted table row '{match.row_label}'")
+                    return self._label(match.to_text(), document.source)
+
             table_search_query = f"table of benefits schedule policy {query}"
-            table_chunks = await self.vector_store.similarity_search(table_search_query, k=3)
+            table_chunks = await self.vector_store.similarity_search(
+                table_search_query, k=3, document_ids=self.document_ids
+            )
             
             if not table_chunks:
                 return "Could not find any relevant tables in the document to answer this question."
@@ -199,8 +285,7 @@ class RAGAgentExecutor:
 
             Answer:"""
 
-            response = await self.llm.ainvoke(prompt)
-            return response.content.strip()
+            return await self.gateway.generate(prompt)
             
         except Exception as e:
             logger.error(f"Error in Table QA tool: {e}")
@@ -210,23 +295,89 @@ class RAGAgentExecutor:
         """
         Specialized tool to check if an item or condition is covered by searching for exclusions.
         """
-        logger.info(f"Tool engaged: find_exclusions_tool for query: '{query}'")
+        hot_logger().info(f"Tool engaged: find_exclusions_tool for query: '{query}'")
         try:
-            exclusion_search_query = f'{query} exclusion "not covered" limitation "items of personal comfort" "annexure ii"'
-            results = await self.vector_store.similarity_search_with_score(exclusion_search_query, k=5)
+            # Exact exclusion vocabulary goes to the lexical side; the embedding query stays clean
+            exclusion_search_query = f"{query} exclusions and limitations"
+            exclusion_keywords = f"{query} exclusion excluded not covered limitation personal comfort annexure ii"
+            results = await self._routed_search(exclusion_search_query, k=5, sparse_query=exclusion_keywords)
 
             if not results:
                 return f"No specific exclusions or limitations regarding '{query}' were found. This does not guarantee coverage."
 
-            return "\n---\n".join([f"Result (Relevance: {score:.2f}):\n{doc.page_content}" for doc, score in results])
+            results = self._compress(exclusion_search_query, results)
+            return "\n---\n".join(self._format_ranked(results))
 
         except Exception as e:
             logger.error(f"Error in Exclusion Finder tool: {e}")
             return "An error occurred while searching for exclusions."
 
+    async def _keyword_clause_search_tool(self, query: str) -> str:
+        """
+        Lexical search over the TF-IDF index fitted at ingestion, for exact policy terms.
+        """
+        hot_logger().info(f"Tool engaged: keyword_clause_search_tool for query: '{query}'")
+        try:
+            matchers = [doc.clause_matcher for doc in self.documents if doc.clause_matcher.is_fitted]
+            if not matchers:
+                return "Keyword search is not available for this document."
+
+            results = [
+                result
+                for matcher in matchers
+                for result in matcher.find_relevant_clauses_batch([query], top_k=5, threshold=0.1)[0]
+            ]
+            if not results:
+                return f"No clauses containing the terms in '{query}' were found."
+
+            results = sorted(results, key=lambda item: item[1], reverse=True)[:5]
+            return "\n---\n".join([
+                f"Result (Keyword match: {score:.2f}):\n{self._label(doc.page_content, doc.metadata.get('source'))}"
+                for doc, score in results
+            ])
+
+        except Exception as e:
+            logger.error(f"Error in keyword clause search tool: {e}")
+            return "An error occurred during the keyword search."
+
+    async def _lookup_policy_facts_tool(self, query: str) -> str:
+        """
+        Looks up waiting periods, limits and clauses in the fact index built at ingestion.
+        """
+        hot_logger().info(f"Tool engaged: lookup_policy_facts_tool for query: '{query}'")
+        try:
+            documents = [doc for doc in self.documents if doc.facts.facts or doc.facts.clause_sources]
+            if not documents:
+                return "No precomputed policy facts are available for this document."
+
+            clause = CLAUSE_REFERENCE.search(query)
+            number = clause.group(1) if clause else query.strip()
+            lines = []
+            for document in documents:
+                source, clause_facts = document.facts.lookup_clause(number)
+                lines.extend(self._label(fact.to_text(), document.source) for fact in clause_facts)
+                if source is not None:
+                    lines.append(self._label(f"Clause {number} text:\n{source.page_content}", document.source))
+            if lines:
+                return "\n---\n".join(lines)
+
+            matches = sorted(
+                ((fact, score, document.source) for document in documents for fact, score in document.facts.search(query)),
+                key=lambda item: item[1],
+                reverse=True
+            )[:3]
+            if not matches:
+                return f"No waiting periods or limits matching '{query}' were found in the fact index."
+
+            return "\n---\n".join(self._label(fact.to_text(), source) for fact, _, source in matches)
+
+        except Exception as e:
+            logger.error(f"Error in fact lookup tool: {e}")
+            return "An error occurred while looking up policy facts."
+
     async def _semantic_search_tool(self, query: str) -> str:
         """Searches the document for general information, now with entity expansion."""
-        logger.info(f"Tool engaged: semantic_search_tool for query: '{query}'")
+        hot_logger().info(f"Tool engaged: semantic_search_tool for query: '{query}'")
         try:
             # 1. Entity Expansion Step
             expansion_prompt = f"""You are a query analysis assistant. Look at the following search query and identify if there is a geographic location (like a state or city). If there is, list that location and its primary city in a JSON array. If not, return an empty array.
@@ -237,9 +388,9 @@ class RAGAgentExecutor:
             
             expanded_query = query
             try:
-                response = await self.llm.ainvoke(expansion_prompt)
-                # A simple way to extract JSON from the response
-                json_response_str = response.content.strip().split("```json\n")[1].split("\n```")[0]
+                response = await self.gateway.generate(expansion_prompt)
+                # A simple way to extract JSON from the response, fenced or not (batched answers are unfenced)
+                json_response_str = response.split("```json\n")[1].split("\n```")[0] if "```json\n" in response else response
                 data = json.loads(json_response_str)
                 entities = data.get("entities", [])
                 if entities:
@@ -247,18 +398,18 @@ class RAGAgentExecutor:
                     # A robust way to replace the original entity
                     base_query = query.replace(entities[0], "")
                     expanded_query = f"{base_query.strip()} ({search_terms})"
-                    logger.info(f"Expanded search query to: '{expanded_query}'")
+                    hot_logger().info(f"Expanded search query to: '{expanded_query}'")
             except Exception:
                 logger.warning("Could not expand entities, using original query.")
 
-            # 2. Perform search with the (potentially expanded) query
-            results = await self.vector_store.similarity_search_with_score(expanded_query, k=5)
+            # 2. Hybrid search: dense on the original query, expanded entities on the lexical side
+            results = await self._routed_search(query, k=5, sparse_query=expanded_query)
             
             if not results:
                 return "No relevant information found in the document for this query."
             
-            formatted_results = [f"Result {i+1} (Relevance: {score:.2f}):\n{doc.page_content}" for doc, score in results]
-            return "\n---\n".join(formatted_results)
+            results = self._compress(expanded_query, results)
+            return "\n---\n".join(self._format_ranked(results))
 
         except Exception as e:
             logger.error(f"Error in semantic search tool: {e}")
@@ -282,6 +433,18 @@ class RAGAgentExecutor:
                 coroutine=self._find_exclusions_tool,
                 func=lambda q: asyncio.run(self._find_exclusions_tool(q))
             ),
+            Tool(
+                name="keyword_clause_search",
+                description="Use this to find clauses that contain exact policy terms, clause numbers, annexure names or drug/procedure names.",
+                coroutine=self._keyword_clause_search_tool,
+                func=lambda q: asyncio.run(self._keyword_clause_search_tool(q))
+            ),
+            Tool(
+                name="lookup_policy_facts",
+                description="Use this first for waiting periods, sub-limits, caps or a specific clause number (e.g. 'waiting period for cataract', 'clause 4.2').",
+                coroutine=self._lookup_policy_facts_tool,
+                func=lambda q: asyncio.run(self._lookup_policy_facts_tool(q))
+            ),
             Tool(
                 name="general_semantic_search",
                 description="Use this as a general-purpose search for any information that doesn't fit the other specialized tools, especially for finding contact details or addresses.",
@@ -291,15 +454,15 @@ class RAGAgentExecutor:
         ]
     
     def _create_agent_executor(self) -> AgentExecutor:
-        """Creates the agent using the official LangChain Hub prompt."""
-        prompt = hub.pull("hwchase17/structured-chat-agent")
+        """Creates the agent using the (vendored) LangChain Hub structured-chat prompt."""
+        prompt = structured_chat_prompt()
         agent = create_structured_chat_agent(self.llm, self.tools, prompt)
 
         return AgentExecutor(
             agent=agent,
             tools=self.tools,
             memory=self.memory,
-            verbose=True,
+            verbose=settings.AGENT_VERBOSE,
             handle_parsing_errors=True,
             max_iterations=5
         )
@@ -309,7 +472,7 @@ class RAGAgentExecutor:
         if '?' in fragment or len(fragment.split()) > 10: # Simple checks for completeness
             return fragment
             
-        logger.info(f"Input is a fragment. Attempting to complete: '{fragment}'")
+        hot_logger().info(f"Input is a fragment. Attempting to complete: '{fragment}'")
         prompt = f"""You are an AI assistant. Your task is to analyze the user's input.
         - If the input is already a complete, well-formed question, return it exactly as it is.
         - If it is an incomplete sentence fragment, complete it into the most likely, specific, and detailed question the user was trying to ask in the context of an insurance policy.
@@ -317,23 +480,67 @@ class RAGAgentExecutor:
         Input: "{fragment}"
         Completed Question:"""
         try:
-            response = await self.llm.ainvoke(prompt)
-            completed_question = response.content.strip()
-            logger.info(f"Completed question: '{completed_question}'")
+            completed_question = await self.gateway.generate(prompt)
+            hot_logger().info(f"Completed question: '{completed_question}'")
             return completed_question
         except Exception as e:
             logger.error(f"Could not complete question fragment: {e}")
             return fragment
 
+    def _answer_key(self, question: str) -> str:
+        return cache_key(
+            settings.GOOGLE_GEMINI_MODEL_NAME,
+            ",".join(sorted(self.document_ids)),
+            " ".join(question.lower().split())
+        )
+
+    async def _cached_answer(self, question: str) -> Optional[str]:
+        try:
+            value = await run_in_thread(self.answer_cache.get, "answer", self._answer_key(question))
+        except Exception as e:
+            logger.error(f"Shared cache lookup failed: {str(e)}")
+            return None
+        record_cache("answer", value is not None)
+        return value.decode("utf-8") if value is not None else None
+
+    async def _store_answer(self, question: str, answer: str):
+        try:
+            await run_in_thread(self.answer_cache.set, "answer", self._answer_key(question), answer.encode("utf-8"))
+        except Exception as e:
+            logger.error(f"Could not store answer in the shared cache: {str(e)}")
+
     async def process_question(self, question: str) -> str:
         """Invokes the agent to process a question."""
         try:
-            logger.info(f"Invoking agent for question: {question}")
-            response = await self.agent_executor.ainvoke({
-                "input": question,
-                "chat_history": self.memory.chat_memory.messages
-            })
-            return response.get("output", "I encountered an error and could not provide a response.")
+            if self.answer_cache is not None:
+                cached = await self._cached_answer(question)
+                if cached is not None:
+                    hot_logger().info(f"Answered from the shared cache: {question}")
+                    return cached
+
+            # Across several documents a single fact may be overridden by another (e.g. an addendum)
+            if settings.FACT_FAST_PATH_ENABLED and self.ingested is not None:
+                fact_answer = self.ingested.facts.answer(question)
+                record_cache("fact_fast_path", fact_answer is not None)
+                if fact_answer is not None:
+                    hot_logger().info(f"Answered from fact index without the agent: {question}")
+                    return fact_answer
+
+            hot_logger().info(f"Invoking agent for question: {question}")
+            iterations = AgentIterationCounter()
+            with track_stage("agent"):
+                response = await self.agent_executor.ainvoke({
+                    "input": question,
+                    "chat_history": self.memory.chat_memory.messages
+                }, config={"callbacks": [iterations]})
+            AGENT_ITERATIONS.observe(iterations.iterations)
+            answer = response.get("output")
+            if answer is None:
+                return "I encountered an error and could not provide a response."
+            # Runs cut short by the iteration limit are worth retrying, not sharing
+            if self.answer_cache is not None and not answer.startswith("Agent stopped"):
+                await self._store_answer(question, answer)
+            return answer
         except Exception as e:
             logger.error(f"Error processing question with agent: {str(e)}")
             return f"An error occurred while processing your question: {str(e)}"
\ No newline at end of file
@@ -1,61 +1,131 @@
 
 # services/clause_matcher.py
-from typing import List, Dict, Tuple
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+from typing import List, Dict, Optional, Tuple
 import numpy as np
 from langchain.schema import Document
 import re
 from loguru import logger
+from core.logger import hot_logger
 
 class ClauseMatcher:
     def __init__(self):
+        # sklearn takes over a second to import, so only when a matcher is first built
+        from sklearn.feature_extraction.text import TfidfVectorizer
         self.vectorizer = TfidfVectorizer(
             stop_words='english',
             ngram_range=(1, 3),
-            max_features=1000
+            max_features=20000
+        )
+        # Prefitted index: the fitted documents and their L2-normalised TF-IDF rows
+        self.documents: List[Document] = []
+        self.doc_matrix = None
+    
+    @property
+    def is_fitted(self) -> bool:
+        return self.doc_matrix is not None
+    
+    def fit(self, documents: List[Document]) -> "ClauseMatcher":
+        """Build the sparse TF-IDF matrix for a document's chunks once, at ingestion"""
+        # The caller's list itself, so passing it again is recognised without refitting
+        self.documents = documents if isinstance(documents, list) else list(documents)
+        self.doc_matrix = None
+        
+        if self.documents:
+            try:
+                self.doc_matrix = self.vectorizer.fit_transform(
+                    [doc.page_content for doc in self.documents]
+                )
+                logger.info(f"Fitted TF-IDF index over {len(self.documents)} chunks "
+                            f"({self.doc_matrix.shape[1]} features)")
+            except ValueError as e:
+                # Raised when the chunks contain nothing but stop words
+                logger.warning(f"Could not fit TF-IDF index: {str(e)}")
+        
+        return self
+    
+    def _fitted_on(self, documents: List[Document]) -> bool:
+        """Whether `documents` are the chunks the index was fitted on (same objects, same order)"""
+        if documents is self.documents:
+            return True
+        return len(documents) == len(self.documents) and all(
+            doc is fitted for doc, fitted in zip(documents, self.documents)
         )
     
     def find_relevant_clauses(
         self, 
         query: str, 
-        documents: List[Document], 
+        documents: List[Document] = None, 
         threshold: float = 0.3
     ) -> List[Tuple[Document, float]]:
-        """Find clauses most relevant to the query using semantic similarity"""
+        """
+        Find clauses most relevant to the query using the prefitted TF-IDF index.
+        Passing a different document list refits the index first.
+        """
         try:
-            if not documents:
-                return []
-            
-            # Extract text content
-            texts = [doc.page_content for doc in documents]
-            texts.append(query)  # Add query to the corpus
-            
-            # Compute TF-IDF vectors
-            tfidf_matrix = self.vectorizer.fit_transform(texts)
-            
-            # Calculate similarity between query and documents
-            query_vector = tfidf_matrix[-1]  # Last item is the query
-            doc_vectors = tfidf_matrix[:-1]  # All except the query
-            
-            similarities = cosine_similarity(query_vector, doc_vectors).flatten()
-            
-            # Create results with similarity scores
-            results = []
-            for i, similarity_score in enumerate(similarities):
-                if similarity_score >= threshold:
-                    results.append((documents[i], float(similarity_score)))
+            if documents is not None and not self._fitted_on(documents):
+                self.fit(documents)
             
-            # Sort by similarity score (descending)
-            results.sort(key=lambda x: x[1], reverse=True)
+            results = self.find_relevant_clauses_batch([query], top_k=None, threshold=threshold)[0]
             
-            logger.info(f"Found {len(results)} relevant clauses for query: {query[:50]}...")
+            hot_logger().info(f"Found {len(results)} relevant clauses for query: {query[:50]}...")
             return results
             
         except Exception as e:
             logger.error(f"Error in clause matching: {str(e)}")
             return []
     
+    def find_relevant_clauses_batch(
+        self,
+        queries: List[str],
+        top_k: Optional[int] = 5,
+        threshold: float = 0.0
+    ) -> List[List[Tuple[Document, float]]]:
+        """
+        Score several queries against the prefitted index with one sparse matrix
+        multiplication and return the top-k clauses for each query.
+        """
+        if not self.is_fitted or not queries:
+            return [[] for _ in queries]
+        
+        # Rows are L2-normalised by the vectorizer, so the dot product is the cosine similarity
+        query_matrix = self.vectorizer.transform(queries)
+        scores = (query_matrix @ self.doc_matrix.T).toarray()
+        
+        n_docs = scores.shape[1]
+        results = []
+        for row in scores:
+            if top_k is not None and top_k < n_docs:
+                top = np.argpartition(-row, top_k - 1)[:top_k]
+                top = top[np.argsort(-row[top])]
+            else:
+                top = np.argsort(-row)
+            
+            results.append([
+                (self.documents[i], float(row[i]))
+                for i in top
+                if row[i] >= threshold and row[i] > 0
+            ])
+        
+        return results
+    
+    def score_texts(self, query: str, texts: List[str]) -> np.ndarray:
+        """Cosine similarity of each text to the query, using the prefitted vocabulary"""
+        if not texts:
+            return np.zeros(0)
+        
+        try:
+            vectorizer = self.vectorizer
+            if not self.is_fitted:
+                vectorizer = type(self.vectorizer)(stop_words='english').fit(texts + [query])
+            
+            text_matrix = vectorizer.transform(texts)
+            query_vector = vectorizer.transform([query])
+            return (text_matrix @ query_vector.T).toarray().ravel()
+            
+        except ValueError:
+            # Nothing but stop words on either side
+            return np.zeros(len(texts))
+    
     def extract_specific_terms(self, text: str, term_patterns: Dict[str, str]) -> Dict[str, List[str]]:
         """Extract specific terms using regex patterns"""
         extracted_terms = {}
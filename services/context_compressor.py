@@ -0,0 +1,97 @@
+# services/context_compressor.py
+from typing import List, Set, Tuple
+import numpy as np
+from langchain.schema import Document
+from loguru import logger
+from core.logger import hot_logger
+
+from services.clause_matcher import ClauseMatcher
+from utils.chunking import SECTION_HEADER_PATTERN
+from utils.text_cleaner import TextCleaner
+
+
+class ContextCompressor:
+    """
+    Shrinks retrieved context to the sentences that matter for a question before it
+    is sent to the LLM: the best-scoring sentences, their neighbours and the section
+    header of every chunk they come from.
+    """
+
+    def __init__(
+        self,
+        clause_matcher: ClauseMatcher,
+        max_sentences: int = 8,
+        neighbours: int = 1
+    ):
+        self.clause_matcher = clause_matcher
+        self.text_cleaner = TextCleaner()
+        self.max_sentences = max_sentences
+        self.neighbours = neighbours
+
+    def compress(self, question: str, results: List[tuple]) -> List[tuple]:
+        """Compress (document, score) search results; results that keep no sentence are dropped"""
+        headers = [self._header_of(doc) for doc, _ in results]
+        # Spans index the body, the text after the section header
+        bodies = [doc.page_content[len(header):] for (doc, _), header in zip(results, headers)]
+        spans_per_doc = [self.text_cleaner.sentence_spans(body) for body in bodies]
+        flat = [body[start:end] for body, spans in zip(bodies, spans_per_doc) for start, end in spans]
+        if len(flat) <= self.max_sentences:
+            return results
+
+        scores = self.clause_matcher.score_texts(question, flat)
+        if not np.any(scores > 0):
+            return results
+
+        top = np.argpartition(-scores, self.max_sentences - 1)[:self.max_sentences]
+        selected = {int(i) for i in top if scores[i] > 0}
+
+        compressed = []
+        offset = 0
+        for (doc, score), header, body, spans in zip(results, headers, bodies, spans_per_doc):
+            keep: Set[int] = set()
+            for i in range(len(spans)):
+                if offset + i in selected:
+                    keep.update(range(max(0, i - self.neighbours), min(len(spans), i + self.neighbours + 1)))
+            offset += len(spans)
+
+            if keep:
+                compressed.append((self._compress_document(doc, header, body, spans, sorted(keep)), score))
+
+        before = sum(len(doc.page_content) for doc, _ in results)
+        after = sum(len(doc.page_content) for doc, _ in compressed)
+        hot_logger().info(f"Compressed context from {before} to {after} characters")
+        return compressed
+
+    @staticmethod
+    def _header_of(doc: Document) -> str:
+        header = SECTION_HEADER_PATTERN.match(doc.page_content)
+        return header.group(0) if header else ""
+
+    def _compress_document(
+        self,
+        doc: Document,
+        header: str,
+        body: str,
+        spans: List[Tuple[int, int]],
+        keep: List[int]
+    ) -> Document:
+        parts = []
+        # Keep the section header for grounding
+        if header.strip():
+            parts.append(header.strip())
+        elif doc.metadata.get("section"):
+            parts.append(f"Section: {doc.metadata['section']}")
+
+        # Runs of adjacent kept sentences are copied from the original text as one slice
+        run_start = run_end = None
+        for i in keep:
+            if run_end is not None and i > run_end + 1:
+                parts.append(body[spans[run_start][0]:spans[run_end][1]])
+                parts.append("...")
+                run_start = None
+            if run_start is None:
+                run_start = i
+            run_end = i
+        parts.append(body[spans[run_start][0]:spans[run_end][1]])
+
+        return Document(page_content="\n".join(parts), metadata=doc.metadata)
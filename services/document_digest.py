@@ -0,0 +1,120 @@
+# services/document_digest.py
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from langchain.schema import Document
+from loguru import logger
+
+from services.clause_matcher import ClauseMatcher
+from services.fact_index import CLAUSE_HEADING, CLAUSE_REFERENCE
+from utils.chunking import AdvancedChunker
+
+
+@dataclass
+class SectionEntry:
+    """One section of a document, named as in its chunks' `section` metadata"""
+    name: str
+    number: Optional[str]
+    chunk_count: int
+    keywords: List[str]
+
+
+@dataclass
+class DocumentDigest:
+    """
+    Compact map of a document built once at ingestion: its sections, the chunks each
+    clause number appears in, and a TF-IDF keyword vector per section. Questions are
+    routed to sections with it, so retrieval can filter on `section` instead of
+    searching the whole document.
+    """
+    sections: List[SectionEntry] = field(default_factory=list)
+    # Clause number -> indexes of the chunks it heads or appears in
+    clause_chunks: Dict[str, List[int]] = field(default_factory=dict)
+    chunk_sections: List[Optional[str]] = field(default_factory=list)
+    # Rows are L2-normalised section vectors in the document's TF-IDF vocabulary
+    section_vectors: Any = None
+    vectorizer: Any = None
+
+    @classmethod
+    def build(
+        cls,
+        documents: List[Document],
+        chunks: List[Document],
+        chunker: AdvancedChunker,
+        clause_matcher: ClauseMatcher
+    ) -> "DocumentDigest":
+        """Digest of cleaned pages and the chunks built from them"""
+        numbers: Dict[str, Optional[str]] = {}
+        for source_docs in chunker._group_by_source(documents):
+            text, _ = chunker._join_pages(source_docs)
+            for header in chunker.find_section_headers(text):
+                numbers.setdefault(header.name, header.number)
+
+        # A section's text is that of its chunks, whatever the header style of the policy
+        chunk_sections = [chunk.metadata.get("section") for chunk in chunks]
+        section_texts: Dict[str, List[str]] = {}
+        for chunk, section in zip(chunks, chunk_sections):
+            if section:
+                section_texts.setdefault(section, []).append(chunk.page_content)
+        contents = {name: "\n".join(texts) for name, texts in section_texts.items()}
+
+        clause_chunks: Dict[str, List[int]] = {}
+        for index, chunk in enumerate(chunks):
+            for match in CLAUSE_HEADING.finditer(chunk.page_content):
+                clause_chunks.setdefault(match.group("number"), []).append(index)
+            number = numbers.get(chunk_sections[index])
+            if number and index not in clause_chunks.get(number, []):
+                clause_chunks.setdefault(number, []).append(index)
+
+        counts = Counter(section for section in chunk_sections if section)
+        names = list(contents)
+        if len(names) < 2 or not clause_matcher.is_fitted:
+            return cls(clause_chunks=clause_chunks, chunk_sections=chunk_sections)
+
+        vectorizer = clause_matcher.vectorizer
+        section_vectors = vectorizer.transform([f"{name}\n{contents[name]}" for name in names])
+        terms = vectorizer.get_feature_names_out()
+        sections = []
+        for row, name in enumerate(names):
+            weights = section_vectors.getrow(row)
+            top = weights.indices[np.argsort(-weights.data)[:8]]
+            sections.append(SectionEntry(name, numbers.get(name), counts[name], [str(terms[i]) for i in top]))
+
+        logger.info(f"Built document digest: {len(sections)} sections, {len(clause_chunks)} clause numbers")
+        return cls(
+            sections=sections,
+            clause_chunks=clause_chunks,
+            chunk_sections=chunk_sections,
+            section_vectors=section_vectors,
+            vectorizer=vectorizer
+        )
+
+    def route(self, question: str, max_sections: int = 3, min_score: float = 0.1) -> List[str]:
+        """
+        Sections a question most likely concerns, best first; empty when none stands out.
+        A referenced clause ("clause 4.2") routes to the sections holding it, or its parent clause.
+        """
+        reference = CLAUSE_REFERENCE.search(question)
+        if reference is not None:
+            # "4.2.1" not found falls back to "4.2", then "4"
+            parts = reference.group(1).split(".")
+            while parts:
+                indexes = self.clause_chunks.get(".".join(parts), [])
+                sections = list(dict.fromkeys(
+                    self.chunk_sections[index] for index in indexes if self.chunk_sections[index]
+                ))
+                if sections:
+                    return sections[:max_sections]
+                parts.pop()
+
+        if self.section_vectors is None:
+            return []
+        scores = (self.section_vectors @ self.vectorizer.transform([question]).T).toarray().ravel()
+        best = float(scores.max()) if scores.size else 0.0
+        if best < min_score:
+            return []
+        # Sections close to the best one stay in, so an ambiguous question keeps its options
+        order = np.argsort(-scores)[:max_sections]
+        return [self.sections[i].name for i in order if scores[i] >= best / 2]
@@ -1,53 +1,163 @@
 # services/document_loader.py
 import aiohttp
+import asyncio
+import hashlib
 import tempfile
 import os
-from typing import List
-from langchain_community.document_loaders import PyPDFLoader
-from langchain_community.document_loaders import Docx2txtLoader
-from langchain_community.document_loaders import UnstructuredEmailLoader
-from langchain_community.embeddings import GooglePalmEmbeddings
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
 from langchain.schema import Document
 from loguru import logger
 from core.config import settings
+from core.metrics import track_stage
+from core.offload import run_in_process, run_in_thread
+from services.clause_matcher import ClauseMatcher
+from services.document_digest import DocumentDigest
+from services.fact_index import PolicyFactIndex
+from utils.chunking import AdvancedChunker
+from utils.table_extractor import TableExtractor, TableStore
+from utils.text_cleaner import PARALLEL_MIN_PAGES, TextCleaner, clean_pages
 import mimetypes
 from urllib.parse import urlparse
 
+def document_id_from_digest(digest: str) -> str:
+    """Short id of a source document, derived from the SHA-256 of its bytes"""
+    return digest[:16]
+
+
+@dataclass
+class IngestedDocument:
+    """Everything built from one source document at ingestion time"""
+    source: str
+    chunks: List[Document]
+    document_id: str = ""
+    parents: Dict[str, Document] = field(default_factory=dict)
+    tables: TableStore = field(default_factory=TableStore)
+    clause_matcher: ClauseMatcher = field(default_factory=ClauseMatcher)
+    facts: PolicyFactIndex = field(default_factory=PolicyFactIndex)
+    digest: DocumentDigest = field(default_factory=DocumentDigest)
+
+
 class DocumentLoader:
     def __init__(self):
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=settings.CHUNK_SIZE,
-            chunk_overlap=settings.CHUNK_OVERLAP,
-            separators=["\n\n", "\n", ".", "!", "?", ",", " ", ""]
+        self.child_chunker = AdvancedChunker(
+            chunk_size=settings.CHILD_CHUNK_TOKENS,
+            chunk_overlap=settings.CHILD_CHUNK_OVERLAP_TOKENS
         )
+        self.table_extractor = TableExtractor()
+        self.text_cleaner = TextCleaner()
     
-    async def load_from_url(self, url: str) -> List[Document]:
-        """Download document from URL and process it"""
+    async def ingest(self, url: str) -> IngestedDocument:
+        """
+        Download a document and build its hierarchical index: small child chunks
+        for embedding, each pointing at the parent section it came from.
+        """
+        logger.info(f"Ingesting document from: {url}")
         try:
-            logger.info(f"Downloading document from: {url}")
-            
-            # Download file
-            temp_file_path = await self._download_file(url)
-            
-            # Determine file type and load appropriately
-            documents = await self._load_document(temp_file_path, url)
-            
-            # Split documents into chunks
-            split_docs = self.text_splitter.split_documents(documents)
+            temp_file_path, digest = await self.download(url)
+        except Exception as e:
+            logger.error(f"Error downloading document from URL: {str(e)}")
+            raise
+        return await self.ingest_file(temp_file_path, url, document_id=document_id_from_digest(digest))
+    
+    async def download(self, url: str) -> Tuple[str, str]:
+        """Download a document to a temporary file and return its path and SHA-256 digest"""
+        with track_stage("download"):
+            return await self._download_file(url)
+    
+    async def ingest_file(self, temp_file_path: str, url: str, document_id: str = "") -> IngestedDocument:
+        """
+        Build the hierarchical index of an already downloaded file, deleting the file
+        afterwards. Every chunk is tagged with `document_id` for filtered retrieval.
+        """
+        try:
+            try:
+                with track_stage("parse"):
+                    documents = await self._load_document(temp_file_path, url)
+            finally:
+                os.unlink(temp_file_path)
             
-            # Clean up temporary file
-            os.unlink(temp_file_path)
+            with track_stage("clean"):
+                cleaned = await self.clean_pages([doc.page_content for doc in documents])
             
-            logger.info(f"Loaded and split document into {len(split_docs)} chunks")
-            return split_docs
+            # Table extraction, chunking and index fitting are CPU-bound: keep them off the event loop
+            return await run_in_thread(self._build, documents, url, document_id, cleaned)
             
         except Exception as e:
-            logger.error(f"Error loading document from URL: {str(e)}")
+            logger.error(f"Error ingesting document from URL: {str(e)}")
             raise
     
-    async def _download_file(self, url: str) -> str:
-        """Download file from URL to temporary location"""
+    def _build(
+        self,
+        documents: List[Document],
+        url: str,
+        document_id: str,
+        cleaned: Optional[List[str]] = None
+    ) -> IngestedDocument:
+        """Build the hierarchical index and lookup structures of parsed pages, given their cleaned text or not"""
+        if document_id:
+            for doc in documents:
+                doc.metadata["document_id"] = document_id
+        
+        # Tables are read from the raw page text, before cleaning collapses column spacing
+        with track_stage("extract_tables"):
+            tables = self.table_extractor.extract(documents)
+        
+        if cleaned is None:
+            with track_stage("clean"):
+                cleaned = self.text_cleaner.clean_pages([doc.page_content for doc in documents])
+        documents = self._clean_documents(documents, cleaned)
+        with track_stage("chunk"):
+            children, parents = self.child_chunker.build_hierarchy(
+                documents,
+                max_parent_tokens=settings.PARENT_MAX_TOKENS
+            )
+        
+        with track_stage("build_indexes"):
+            # Lexical index over the chunks, fitted once and reused for every question
+            clause_matcher = ClauseMatcher().fit(children)
+            
+            # Waiting periods, limits and clause numbers, extracted from the non-overlapping sections
+            facts = PolicyFactIndex.build(list(parents.values()) or children, clause_matcher)
+            
+            # Section map and clause locations, for routing questions to sections without the LLM
+            digest = DocumentDigest.build(documents, children, self.child_chunker, clause_matcher)
+        
+        return IngestedDocument(
+            source=url,
+            chunks=children,
+            document_id=document_id,
+            parents=parents,
+            tables=tables,
+            clause_matcher=clause_matcher,
+            facts=facts,
+            digest=digest
+        )
+    
+    @staticmethod
+    async def clean_pages(pages: List[str]) -> List[str]:
+        """
+        Clean loaded pages, keeping the line structure chunking relies on. Large documents
+        are split into one batch per offload worker process when OFFLOAD_PROCESSES > 0.
+        """
+        if settings.OFFLOAD_PROCESSES > 0 and len(pages) >= PARALLEL_MIN_PAGES:
+            size = -(-len(pages) // settings.OFFLOAD_PROCESSES)
+            batches = await asyncio.gather(*(
+                run_in_process(clean_pages, pages[start:start + size]) for start in range(0, len(pages), size)
+            ))
+            return [page for batch in batches for page in batch]
+        return await run_in_thread(clean_pages, pages)
+    
+    @staticmethod
+    def _clean_documents(documents: List[Document], cleaned: List[str]) -> List[Document]:
+        """Loaded pages with their cleaned text"""
+        return [
+            Document(page_content=text, metadata=doc.metadata)
+            for doc, text in zip(documents, cleaned)
+        ]
+    
+    async def _download_file(self, url: str) -> Tuple[str, str]:
+        """Download file from URL to temporary location, hashing it as it arrives"""
         async with aiohttp.ClientSession() as session:
             async with session.get(url) as response:
                 if response.status != 200:
@@ -66,41 +176,53 @@ class DocumentLoader:
                     delete=False, 
                     suffix=file_extension
                 ) as temp_file:
+                    # Hashing each chunk as it arrives keeps the event loop from reading the whole file again
+                    digest = hashlib.sha256()
                     async for chunk in response.content.iter_chunked(8192):
                         temp_file.write(chunk)
-                    return temp_file.name
+                        digest.update(chunk)
+                    return temp_file.name, digest.hexdigest()
     
     async def _load_document(self, file_path: str, original_url: str) -> List[Document]:
-        """Load document based on file type"""
-        file_extension = os.path.splitext(file_path)[1].lower()
+        """Load document based on file type, parsing it off the event loop"""
+        return await run_in_process(parse_file, file_path, original_url)
+
+
+def parse_file(file_path: str, original_url: str) -> List[Document]:
+    """Parse a downloaded file into page documents; module-level so it can run in a worker process"""
+    file_extension = os.path.splitext(file_path)[1].lower()
+    
+    try:
+        # Loaders pull in their parsing libraries, so import only the one this file needs
+        if file_extension == '.pdf':
+            from langchain_community.document_loaders import PyPDFLoader
+            loader = PyPDFLoader(file_path)
+        elif file_extension in ['.docx', '.doc']:
+            from langchain_community.document_loaders import Docx2txtLoader
+            loader = Docx2txtLoader(file_path)
+        elif file_extension in ['.eml', '.msg']:
+            from langchain_community.document_loaders import UnstructuredEmailLoader
+            loader = UnstructuredEmailLoader(file_path)
+        else:
+            # Try to load as plain text
+            with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+                content = f.read()
+            return [Document(
+                page_content=content,
+                metadata={"source": original_url, "file_type": file_extension}
+            )]
         
-        try:
-            if file_extension == '.pdf':
-                loader = PyPDFLoader(file_path)
-            elif file_extension in ['.docx', '.doc']:
-                loader = Docx2txtLoader(file_path)
-            elif file_extension in ['.eml', '.msg']:
-                loader = UnstructuredEmailLoader(file_path)
-            else:
-                # Try to load as plain text
-                with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                    content = f.read()
-                return [Document(
-                    page_content=content,
-                    metadata={"source": original_url, "file_type": file_extension}
-                )]
-            
-            documents = loader.load()
-            
-            # Add metadata
-            for doc in documents:
-                doc.metadata.update({
-                    "source": original_url,
-                    "file_type": file_extension
-                })
-            
-            return documents
-            
-        except Exception as e:
-            logger.error(f"Error loading document with extension {file_extension}: {str(e)}")
-            raise
+        documents = loader.load()
+        
+        # Add metadata
+        for doc in documents:
+            doc.metadata.update({
+                "source": original_url,
+                "file_type": file_extension
+            })
+        
+        return documents
+        
+    except Exception as e:
+        logger.error(f"Error loading document with extension {file_extension}: {str(e)}")
+        raise
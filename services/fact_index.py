@@ -0,0 +1,187 @@
+# services/fact_index.py
+import re
+from dataclasses import dataclass, field
+from typing import List, Dict, Optional, Set, Tuple
+from langchain.schema import Document
+from loguru import logger
+
+from services.clause_matcher import ClauseMatcher
+
+SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?;])\s+(?=[A-Z(])|\n{2,}')
+
+# A clause heading line: a clause number with at most a short title ("4.2 Waiting Period")
+CLAUSE_HEADING = re.compile(
+    r'^[ \t]*(?:(?:section|clause)[ \t]+)?(?P<number>\d+(?:\.\d+)+|\d+(?=\.))\.?[ \t]*[-:]?[ \t]*'
+    r'(?P<title>[A-Za-z][^\n.]{0,80})?[ \t]*$',
+    re.IGNORECASE | re.MULTILINE
+)
+CLAUSE_REFERENCE = re.compile(r'\b(?:section|clause)\s+(\d+(?:\.\d+)*)', re.IGNORECASE)
+
+# Words that end the subject phrase at the start of a sentence
+SUBJECT_STOP = re.compile(
+    r'\b(?:are|is|shall|will|would|can|may|must|has|have|be|covered|payable|subject|after|'
+    r'limited|capped|up|with|within|until)\b',
+    re.IGNORECASE
+)
+
+WORD_PATTERN = re.compile(r'[a-z0-9]+(?:[-.][a-z0-9]+)*')
+
+STOP_WORDS = frozenset({
+    'a', 'an', 'the', 'of', 'for', 'in', 'on', 'to', 'is', 'are', 'what', 'which', 'how',
+    'much', 'under', 'with', 'and', 'or', 'does', 'do', 'there', 'any', 'this', 'policy',
+    'plan', 'insured', 'me', 'my', 'i', 'it', 'be', 'covered', 'cover', 'coverage'
+})
+
+FACT_INTENTS = {
+    "waiting_period": re.compile(r'\bwait(?:ing)?\b', re.IGNORECASE),
+    "coverage_limit": re.compile(r'\b(?:limit|sub-?limit|cap(?:ped)?|maximum|up to|how much|co-?pay(?:ment)?|percentage)\b', re.IGNORECASE),
+}
+
+INTENT_WORDS = frozenset({
+    'wait', 'waiting', 'period', 'limit', 'sub-limit', 'sublimit', 'cap', 'capped',
+    'maximum', 'up', 'much', 'percentage', 'amount'
+})
+
+
+def _keywords(text: str) -> Set[str]:
+    return {w for w in WORD_PATTERN.findall(text.lower()) if w not in STOP_WORDS}
+
+
+@dataclass
+class PolicyFact:
+    """A value extracted from the policy together with where it came from"""
+    fact_type: str
+    subject: str
+    value: str
+    evidence: str
+    clause: Optional[str]
+    source: Document
+
+    def to_text(self) -> str:
+        reference = f" (Clause {self.clause})" if self.clause else ""
+        return f"{self.evidence.strip()}{reference}"
+
+
+@dataclass
+class PolicyFactIndex:
+    """Facts extracted once at ingestion, indexed by type, subject keyword and clause number"""
+    facts: List[PolicyFact] = field(default_factory=list)
+    by_clause: Dict[str, List[int]] = field(default_factory=dict)
+    clause_sources: Dict[str, Document] = field(default_factory=dict)
+    by_keyword: Dict[Tuple[str, str], List[int]] = field(default_factory=dict)
+
+    def __len__(self) -> int:
+        return len(self.facts)
+
+    @classmethod
+    def build(cls, chunks: List[Document], clause_matcher: Optional[ClauseMatcher] = None) -> "PolicyFactIndex":
+        """Run the ClauseMatcher extractors once over every chunk"""
+        index = cls()
+        matcher = clause_matcher or ClauseMatcher()
+        seen: Set[Tuple[str, str]] = set()
+
+        for chunk in chunks:
+            for clause, title, body in index._clause_blocks(chunk.page_content):
+                if clause:
+                    index.clause_sources.setdefault(clause, chunk)
+
+                for sentence in SENTENCE_BOUNDARY.split(body):
+                    if len(sentence.strip()) < 15:
+                        continue
+
+                    reference = CLAUSE_REFERENCE.search(sentence)
+                    extracted = {
+                        "waiting_period": matcher.find_waiting_periods(sentence),
+                        "coverage_limit": matcher.find_coverage_limits(sentence),
+                    }
+                    for fact_type, values in extracted.items():
+                        for value in values:
+                            value = value if isinstance(value, str) else " ".join(value)
+                            key = (fact_type, " ".join(sentence.split()))
+                            if not value.strip() or key in seen:
+                                continue
+                            seen.add(key)
+                            index._add(PolicyFact(
+                                fact_type=fact_type,
+                                subject=index._subject_of(sentence),
+                                value=value.strip(),
+                                evidence=key[1],
+                                clause=reference.group(1) if reference else clause,
+                                source=chunk
+                            ), title)
+
+        logger.info(f"Built fact index with {len(index.facts)} facts and {len(index.clause_sources)} clauses")
+        return index
+
+    @staticmethod
+    def _clause_blocks(text: str) -> List[Tuple[Optional[str], str, str]]:
+        """Split text into (clause number, heading title, body) blocks at clause headings"""
+        blocks = []
+        clause, title, body_start = None, "", 0
+        for match in CLAUSE_HEADING.finditer(text):
+            blocks.append((clause, title, text[body_start:match.start()]))
+            clause, title, body_start = match.group("number"), match.group("title") or "", match.end()
+        blocks.append((clause, title, text[body_start:]))
+        return [block for block in blocks if block[2].strip()]
+
+    @staticmethod
+    def _subject_of(sentence: str) -> str:
+        """The leading noun phrase of a sentence, e.g. 'pre-existing diseases'"""
+        sentence = sentence.strip()
+        stop = SUBJECT_STOP.search(sentence)
+        subject = sentence[:stop.start()] if stop and stop.start() > 0 else sentence
+        return " ".join(subject.split()[:8]).strip(" ,:-").lower()
+
+    def _add(self, fact: PolicyFact, title: str = ""):
+        fact_id = len(self.facts)
+        self.facts.append(fact)
+        if fact.clause:
+            self.by_clause.setdefault(fact.clause, []).append(fact_id)
+        for keyword in _keywords(fact.subject) | _keywords(fact.evidence) | _keywords(title):
+            self.by_keyword.setdefault((fact.fact_type, keyword), []).append(fact_id)
+
+    def lookup_clause(self, number: str) -> Tuple[Optional[Document], List[PolicyFact]]:
+        """O(1) lookup of a clause's source chunk and the facts extracted from it"""
+        number = number.strip().rstrip('.')
+        return self.clause_sources.get(number), [self.facts[i] for i in self.by_clause.get(number, [])]
+
+    def search(self, question: str, limit: int = 3) -> List[Tuple[PolicyFact, float]]:
+        """Facts whose type matches the question's intent, ranked by subject overlap"""
+        words = _keywords(question) - INTENT_WORDS
+        if not words:
+            return []
+
+        scored: Dict[int, float] = {}
+        for fact_type, pattern in FACT_INTENTS.items():
+            if not pattern.search(question):
+                continue
+            for word in words:
+                for fact_id in self.by_keyword.get((fact_type, word), ()):
+                    scored[fact_id] = scored.get(fact_id, 0.0) + 1.0
+
+        results = []
+        for fact_id, overlap in scored.items():
+            fact = self.facts[fact_id]
+            subject_hits = len(_keywords(fact.subject) & words)
+            # Share of the question covered by the fact's subject; evidence overlap breaks ties
+            score = (subject_hits + 0.1 * overlap) / len(words)
+            results.append((fact, score))
+
+        results.sort(key=lambda item: item[1], reverse=True)
+        return results[:limit]
+
+    def answer(self, question: str, min_score: float = 0.8) -> Optional[str]:
+        """
+        Answer a question straight from the index when a single fact clearly matches,
+        otherwise return None so the question goes through the agent.
+        """
+        clause = CLAUSE_REFERENCE.search(question)
+        if clause:
+            return None
+
+        matches = self.search(question, limit=2)
+        if not matches or matches[0][1] < min_score:
+            return None
+        if len(matches) > 1 and matches[1][1] >= matches[0][1] and matches[1][0].value != matches[0][0].value:
+            return None
+        return matches[0][0].to_text()
@@ -0,0 +1,117 @@
+# services/job_manager.py
+import asyncio
+from typing import List, Dict, Any, Optional, Set
+from loguru import logger
+
+from core.admission import admission_controller
+from core.config import settings
+from core.logger import sample_request_logs
+from core.metrics import request_id_var
+from services.job_store import JobStore
+from services.pipeline import document_registry, answer_questions
+from services.response_builder import ResponseBuilder
+
+
+class JobQueueFullError(Exception):
+    """Raised when too many jobs are already waiting"""
+
+
+class JobManager:
+    """Runs submitted RAG jobs on a bounded pool of in-process workers"""
+
+    def __init__(self, max_workers: int, max_pending: int, store_path: str):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.store_path = store_path
+        self.store: Optional[JobStore] = None
+        self.queue: Optional[asyncio.Queue] = None
+        self.workers: List[asyncio.Task] = []
+        # Jobs this process claimed and has not finished, handed back on stop
+        self.running: Set[str] = set()
+
+    async def start(self):
+        """Open the store, requeue unfinished jobs and start the workers"""
+        self.store = JobStore(self.store_path)
+        self.queue = asyncio.Queue()
+
+        for job_id in self.store.requeue_unfinished(settings.JOB_STALE_SECONDS):
+            self.queue.put_nowait(job_id)
+        if self.queue.qsize():
+            logger.info(f"Requeued {self.queue.qsize()} unfinished jobs")
+
+        self.workers = [asyncio.create_task(self._worker()) for _ in range(self.max_workers)]
+        logger.info(f"Job manager started with {self.max_workers} workers")
+
+    async def stop(self):
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers = []
+        if self.store is not None:
+            # Interrupted jobs are picked up again on the next start instead of waiting to go stale
+            if self.running:
+                self.store.release(list(self.running))
+                logger.info(f"Requeued {len(self.running)} interrupted jobs")
+                self.running.clear()
+            self.store.close()
+            self.store = None
+
+    async def submit(self, documents: List[str], questions: List[str]) -> str:
+        if self.queue.qsize() >= self.max_pending:
+            raise JobQueueFullError(f"{self.queue.qsize()} jobs are already waiting, try again later")
+
+        job_id = self.store.create(documents, questions)
+        await self.queue.put(job_id)
+        logger.info(f"Queued job {job_id} with {len(questions)} questions")
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return self.store.get(job_id)
+
+    async def _worker(self):
+        while True:
+            job_id = await self.queue.get()
+            try:
+                if self.store.claim(job_id):
+                    self.running.add(job_id)
+                    await self._run(job_id)
+                    self.running.discard(job_id)
+            finally:
+                self.queue.task_done()
+
+    async def _run(self, job_id: str):
+        # Stage metrics and logs of the job carry its id
+        request_id_var.set(job_id[:16])
+        sample_request_logs()
+        job = self.store.get(job_id)
+        logger.info(f"Running job {job_id}")
+        leases = []
+        # Jobs draw from the same concurrency budget as /hackrx/run, but wait as long as needed
+        ticket = await admission_controller.acquire(
+            admission_controller.weigh(len(job["questions"])), timeout=None, bounded=False
+        )
+        try:
+            leases = await document_registry.acquire_all(job["documents"])
+
+            async def on_answer(index: int, answer: str):
+                self.store.set_answer(job_id, index, answer)
+
+            answers = await answer_questions([lease.indexed for lease in leases], job["questions"], on_answer)
+            self.store.finish(job_id, ResponseBuilder().build_response(answers).answers)
+            logger.info(f"Job {job_id} completed")
+
+        except Exception as e:
+            logger.error(f"Job {job_id} failed: {str(e)}")
+            self.store.fail(job_id, str(e))
+
+        finally:
+            admission_controller.release(ticket)
+            for lease in leases:
+                await lease.release()
+
+
+job_manager = JobManager(
+    max_workers=settings.JOB_WORKERS,
+    max_pending=settings.JOB_MAX_PENDING,
+    store_path=settings.JOB_STORE_PATH
+)
@@ -0,0 +1,139 @@
+# services/job_store.py
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import List, Dict, Any, Optional
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    document TEXT NOT NULL,
+    questions TEXT NOT NULL,
+    answers TEXT NOT NULL,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+)
+"""
+
+
+class JobStore:
+    """SQLite-backed job state, so queued and finished jobs survive a restart"""
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(SCHEMA)
+
+    def create(self, documents: List[str], questions: List[str]) -> str:
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self.lock:
+            self.connection.execute(
+                "INSERT INTO jobs VALUES (?, 'queued', ?, ?, ?, NULL, ?, ?)",
+                (job_id, json.dumps(documents), json.dumps(questions), json.dumps([None] * len(questions)), now, now)
+            )
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self.lock:
+            row = self.connection.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+
+        answers = json.loads(row["answers"])
+        return {
+            "job_id": row["id"],
+            "status": row["status"],
+            "documents": self._documents(row["document"]),
+            "questions": json.loads(row["questions"]),
+            "answers": answers,
+            "completed": sum(answer is not None for answer in answers),
+            "total": len(answers),
+            "error": row["error"],
+        }
+
+    def claim(self, job_id: str) -> bool:
+        """Move a queued job to running; False if another worker got it first"""
+        with self.lock:
+            cursor = self.connection.execute(
+                "UPDATE jobs SET status = 'running', updated_at = ? WHERE id = ? AND status = 'queued'",
+                (time.time(), job_id)
+            )
+        return cursor.rowcount == 1
+
+    def set_answer(self, job_id: str, index: int, answer: str):
+        with self.lock:
+            self.connection.execute("BEGIN IMMEDIATE")
+            try:
+                row = self.connection.execute("SELECT answers FROM jobs WHERE id = ?", (job_id,)).fetchone()
+                answers = json.loads(row["answers"])
+                answers[index] = answer
+                self.connection.execute(
+                    "UPDATE jobs SET answers = ?, updated_at = ? WHERE id = ?",
+                    (json.dumps(answers), time.time(), job_id)
+                )
+                self.connection.execute("COMMIT")
+            except Exception:
+                self.connection.execute("ROLLBACK")
+                raise
+
+    def finish(self, job_id: str, answers: List[str]):
+        self._update(job_id, status="completed", answers=json.dumps(answers))
+
+    def fail(self, job_id: str, error: str):
+        self._update(job_id, status="failed", error=error)
+
+    def requeue_unfinished(self, stale_after: float) -> List[str]:
+        """
+        Put back jobs that were queued, or running without progress for `stale_after`
+        seconds (their worker died), and return their ids oldest first.
+        """
+        cutoff = time.time() - stale_after
+        with self.lock:
+            self.connection.execute(
+                "UPDATE jobs SET status = 'queued' WHERE status = 'running' AND updated_at < ?",
+                (cutoff,)
+            )
+            rows = self.connection.execute(
+                "SELECT id FROM jobs WHERE status = 'queued' ORDER BY created_at"
+            ).fetchall()
+        return [row["id"] for row in rows]
+
+    def release(self, job_ids: List[str]):
+        """Put running jobs back in the queue, e.g. when the worker that claimed them shuts down"""
+        if not job_ids:
+            return
+        with self.lock:
+            self.connection.executemany(
+                "UPDATE jobs SET status = 'queued', updated_at = ? WHERE id = ? AND status = 'running'",
+                [(time.time(), job_id) for job_id in job_ids]
+            )
+
+    @staticmethod
+    def _documents(value: str) -> List[str]:
+        # Jobs stored before multi-document requests hold a bare URL
+        return json.loads(value) if value.startswith("[") else [value]
+
+    def _update(self, job_id: str, **fields):
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self.lock:
+            self.connection.execute(
+                f"UPDATE jobs SET {assignments}, updated_at = ? WHERE id = ?",
+                (*fields.values(), time.time(), job_id)
+            )
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
@@ -0,0 +1,281 @@
+# services/pipeline.py
+import asyncio
+import os
+from dataclasses import dataclass
+from typing import List, Dict, Set, Awaitable, Callable, Optional
+from loguru import logger
+from core.logger import hot_logger
+
+from core.config import settings
+from core.metrics import record_cache, track_stage
+from core.offload import run_in_thread
+from services.document_loader import DocumentLoader, IngestedDocument, document_id_from_digest
+from services.vector_store import VectorStoreManager
+from services.agent_executor import RAGAgentExecutor
+from services.question_dedup import group_questions
+
+# Called with (question index, answer) as soon as each answer is ready
+AnswerCallback = Callable[[int, str], Awaitable[None]]
+
+
+@dataclass
+class IndexedDocument:
+    """An ingested document together with the vector store holding its chunks"""
+    ingested: IngestedDocument
+    vector_store: VectorStoreManager
+    doc_ids: List[str]
+
+    async def cleanup(self):
+        await self.vector_store.cleanup(self.doc_ids, parent_ids=list(self.ingested.parents))
+
+
+_vector_store: Optional[VectorStoreManager] = None
+_vector_store_lock: Optional[asyncio.Lock] = None
+
+
+async def get_vector_store() -> VectorStoreManager:
+    """
+    The process-wide vector store. Every document is indexed into it and searches
+    are scoped to a request's documents by their `document_id`.
+    """
+    global _vector_store, _vector_store_lock
+    if _vector_store is None:
+        if _vector_store_lock is None:
+            _vector_store_lock = asyncio.Lock()
+        async with _vector_store_lock:
+            if _vector_store is None:
+                vector_store = VectorStoreManager()
+                await vector_store.initialize()
+                _vector_store = vector_store
+    return _vector_store
+
+
+async def index_document(document_url: str) -> IndexedDocument:
+    """Load, chunk and index a document so questions can be asked against it"""
+    logger.info("Step 1: Loading and processing document...")
+    document_loader = DocumentLoader()
+    ingested = await document_loader.ingest(document_url)
+    return await _store_document(ingested)
+
+
+async def _store_document(ingested: IngestedDocument) -> IndexedDocument:
+    logger.info("Step 2: Creating embeddings and storing in vector database...")
+    vector_store = await get_vector_store()
+    vector_store.register_parents(ingested.parents)
+    doc_ids = await vector_store.add_documents(ingested.chunks)
+
+    return IndexedDocument(ingested=ingested, vector_store=vector_store, doc_ids=doc_ids)
+
+
+@dataclass
+class _SharedDocument:
+    """One in-flight or indexed document and the number of requests using it"""
+    keys: List[str]
+    task: Optional[asyncio.Task] = None
+    refs: int = 0
+    # Set when the download turned out to be the same bytes as another entry
+    delegate: Optional["_SharedDocument"] = None
+
+
+class DocumentLease:
+    """A request's hold on a shared indexed document; `release` it when done"""
+
+    def __init__(self, registry: "DocumentRegistry", entry: _SharedDocument, indexed: IndexedDocument):
+        self.registry = registry
+        self.entry = entry
+        self.indexed = indexed
+        self.released = False
+
+    async def release(self):
+        if not self.released:
+            self.released = True
+            await self.registry.release(self.entry)
+
+
+class DocumentRegistry:
+    """
+    Singleflight over document indexing. Concurrent requests for the same URL, or
+    for different URLs serving the same bytes, share one download, parse, embed and
+    upsert; the vectors are cleaned up when the last request releases the document.
+    """
+
+    def __init__(self, max_concurrent_builds: int):
+        self.entries: Dict[str, _SharedDocument] = {}
+        self._disposals: Set[asyncio.Task] = set()
+        # Shared by all requests: downloads, parsing and embedding of at most this many documents at once
+        self.build_slots = asyncio.Semaphore(max_concurrent_builds)
+
+    async def acquire(self, document_url: str) -> DocumentLease:
+        entry = self.entries.get(document_url)
+        if entry is None or self._failed(entry):
+            entry = _SharedDocument(keys=[document_url])
+            self.entries[document_url] = entry
+            entry.task = asyncio.create_task(self._build(entry, document_url))
+            record_cache("document", False)
+        else:
+            logger.info(f"Joining in-flight ingestion of {document_url}")
+            record_cache("document", True)
+
+        entry.refs += 1
+        try:
+            indexed = await asyncio.shield(entry.task)
+        except BaseException:
+            self._schedule_release(entry)
+            raise
+        return DocumentLease(self, entry, indexed)
+
+    async def acquire_all(self, document_urls: List[str]) -> List[DocumentLease]:
+        """Lease several documents, indexing them in parallel; all or nothing"""
+        results = await asyncio.gather(
+            *(self.acquire(url) for url in document_urls),
+            return_exceptions=True
+        )
+        leases = [result for result in results if isinstance(result, DocumentLease)]
+        errors = [result for result in results if isinstance(result, BaseException)]
+        if errors:
+            for lease in leases:
+                await lease.release()
+            raise errors[0]
+        return leases
+
+    async def release(self, entry: _SharedDocument):
+        task = self._schedule_release(entry)
+        if task is not None:
+            await task
+
+    async def _build(self, entry: _SharedDocument, document_url: str) -> IndexedDocument:
+        document_loader = DocumentLoader()
+        async with self.build_slots:
+            logger.info("Step 1: Loading and processing document...")
+            temp_file_path, digest = await document_loader.download(document_url)
+
+            hash_key = f"sha256:{digest}"
+            existing = self.entries.get(hash_key)
+            if existing is None or existing.refs <= 0 or self._failed(existing):
+                if entry.refs > 0:
+                    entry.keys.append(hash_key)
+                    self.entries[hash_key] = entry
+                ingested = await document_loader.ingest_file(
+                    temp_file_path, document_url, document_id=document_id_from_digest(digest)
+                )
+                return await _store_document(ingested)
+
+        # Same bytes as another document: wait for it outside the build slot
+        os.unlink(temp_file_path)
+        logger.info(f"{document_url} has the same content as an indexed document, sharing it")
+        existing.refs += 1
+        entry.delegate = existing
+        return await asyncio.shield(existing.task)
+
+    @staticmethod
+    def _failed(entry: _SharedDocument) -> bool:
+        return entry.task.done() and (entry.task.cancelled() or entry.task.exception() is not None)
+
+    def _schedule_release(self, entry: _SharedDocument) -> Optional[asyncio.Task]:
+        entry.refs -= 1
+        if entry.refs > 0:
+            return None
+
+        self._forget(entry)
+        task = asyncio.create_task(self._dispose(entry))
+        self._disposals.add(task)
+        task.add_done_callback(self._disposals.discard)
+        return task
+
+    def _forget(self, entry: _SharedDocument):
+        for key in entry.keys:
+            if self.entries.get(key) is entry:
+                del self.entries[key]
+
+    async def _dispose(self, entry: _SharedDocument):
+        # A build nobody waits for any more still has to finish before its vectors can go
+        try:
+            indexed = await asyncio.shield(entry.task)
+        except BaseException:
+            indexed = None
+        # The build may have registered its content hash after the last release
+        self._forget(entry)
+
+        if entry.delegate is not None:
+            await self.release(entry.delegate)
+        elif indexed is not None:
+            await indexed.cleanup()
+
+
+document_registry = DocumentRegistry(max_concurrent_builds=settings.INGEST_CONCURRENCY)
+
+
+async def _group_duplicate_questions(vector_store: VectorStoreManager, questions: List[str]) -> List[List[int]]:
+    """
+    Group repeated and rephrased questions so each group is answered once. The query
+    embeddings are the ones dense search computes, so with the shared cache on, the
+    retrieval that follows reuses them.
+    """
+    if not settings.QUESTION_DEDUP_ENABLED or len(questions) < 2:
+        return [[index] for index in range(len(questions))]
+
+    vectors = None
+    with track_stage("question_dedup"):
+        try:
+            vectors = await asyncio.gather(
+                *(run_in_thread(vector_store.embeddings.embed_query, question) for question in questions)
+            )
+        except Exception as e:
+            logger.warning(f"Could not embed questions, collapsing exact duplicates only: {str(e)}")
+        groups = group_questions(questions, vectors, threshold=settings.QUESTION_DEDUP_SIMILARITY)
+
+    for group in groups:
+        for position, index in enumerate(group):
+            record_cache("duplicate_question", position > 0)
+    if len(groups) < len(questions):
+        logger.info(f"Answering {len(groups)} distinct questions for {len(questions)} asked")
+    return groups
+
+
+async def answer_questions(
+    documents: List[IndexedDocument],
+    questions: List[str],
+    on_answer: Optional[AnswerCallback] = None
+) -> List[str]:
+    """
+    Complete and answer all questions concurrently, in the order they were asked,
+    with retrieval restricted to the given documents. Duplicate questions are answered
+    once and share the answer.
+    """
+    logger.info("Step 3: Initializing agent executor...")
+    agent_executor = RAGAgentExecutor(documents[0].vector_store, [indexed.ingested for indexed in documents])
+
+    groups = await _group_duplicate_questions(documents[0].vector_store, questions)
+
+    logger.info("Step 4: Processing questions concurrently through agent...")
+
+    async def process_single_question(question: str, index: int) -> str:
+        """Helper function to manage the completion and processing of one question."""
+        hot_logger().info(f"Starting pipeline for question {index + 1}/{len(questions)}...")
+        try:
+            with track_stage("question"):
+                # First, complete the question if it's a fragment
+                completed_question = await agent_executor.complete_question(question)
+                if completed_question != question:
+                    hot_logger().info(f"Completed Q{index + 1}: '{question[:50]}...' -> '{completed_question[:100]}...'")
+
+                # Then, process the now-complete question
+                answer = await agent_executor.process_question(completed_question)
+        except Exception as e:
+            logger.error(f"Error processing question {index + 1}: {str(e)}")
+            answer = "An error occurred while processing this question."
+
+        return answer
+
+    answers: List[Optional[str]] = [None] * len(questions)
+
+    async def process_group(group: List[int]):
+        # The first wording asked stands for the group
+        answer = await process_single_question(questions[group[0]], group[0])
+        for index in group:
+            answers[index] = answer
+            if on_answer is not None:
+                await on_answer(index, answer)
+
+    await asyncio.gather(*(process_group(group) for group in groups))
+    return answers
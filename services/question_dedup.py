@@ -0,0 +1,92 @@
+# services/question_dedup.py
+import re
+import unicodedata
+from typing import Dict, FrozenSet, List, Optional, Sequence
+
+import numpy as np
+
+PUNCTUATION_PATTERN = re.compile(r"[^\w\s%]")
+
+# Words that change how a question is phrased but not what it asks. Negations are not in
+# here: "covered" and "not covered" must never share an answer.
+STOP_WORDS = frozenset({
+    'a', 'about', 'an', 'and', 'any', 'are', 'as', 'at', 'be', 'been', 'by', 'can', 'could',
+    'did', 'do', 'does', 'for', 'from', 'how', 'i', 'in', 'is', 'it', 'its', 'me', 'my', 'of',
+    'on', 'or', 'our', 'please', 's', 'shall', 'should', 'tell', 'that', 'the', 'there', 'this',
+    'to', 'under', 'was', 'we', 'were', 'what', 'when', 'where', 'which', 'who', 'will', 'with',
+    'would', 'you', 'your',
+})
+
+
+def normalize_question(question: str) -> str:
+    """Case, Unicode form, punctuation and whitespace folded, for exact duplicate detection"""
+    text = unicodedata.normalize("NFKC", question).lower()
+    text = PUNCTUATION_PATTERN.sub(" ", text)
+    return " ".join(text.split())
+
+
+def content_tokens(question: str) -> FrozenSet[str]:
+    """
+    The words a question is about: numbers, negations and identifiers included, stop words
+    and plural endings left out. A capital single letter ("Plan A") is kept as an identifier.
+    """
+    text = PUNCTUATION_PATTERN.sub(" ", unicodedata.normalize("NFKC", question)).replace("%", " % ")
+    tokens = set()
+    for word in text.split():
+        if len(word) == 1 and word.isupper():
+            tokens.add(word)
+            continue
+        word = word.lower()
+        if word in STOP_WORDS:
+            continue
+        if len(word) > 4 and word.endswith("ies"):
+            word = word[:-3] + "y"
+        elif len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        tokens.add(word)
+    return frozenset(tokens)
+
+
+def group_questions(
+    questions: Sequence[str],
+    vectors: Optional[Sequence[Sequence[float]]] = None,
+    threshold: float = 0.97
+) -> List[List[int]]:
+    """
+    Group the indices of duplicate questions, in order of first appearance. Questions
+    with the same normalized text always share a group; with `vectors`, so do questions
+    whose embeddings have a cosine similarity of at least `threshold` and which use the
+    same content words. Embeddings alone would merge "30 days" with "60 days", "Plan A"
+    with "Plan B" and "covered" with "not covered".
+    """
+    groups: List[List[int]] = []
+    by_text: Dict[str, int] = {}
+    representatives: List[int] = []
+
+    matrix = None
+    if vectors is not None and len(vectors):
+        matrix = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix = matrix / np.maximum(norms, 1e-12)
+
+    tokens = [content_tokens(question) for question in questions]
+    for index, question in enumerate(questions):
+        key = normalize_question(question)
+        group = by_text.get(key)
+
+        if group is None and matrix is not None and representatives:
+            similarities = matrix[representatives] @ matrix[index]
+            for candidate in np.argsort(-similarities):
+                if similarities[candidate] < threshold:
+                    break
+                if tokens[groups[candidate][0]] == tokens[index]:
+                    group = int(candidate)
+                    break
+
+        if group is None:
+            group = len(groups)
+            groups.append([])
+            representatives.append(index)
+        groups[group].append(index)
+        by_text.setdefault(key, group)
+    return groups
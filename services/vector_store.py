@@ -1,30 +1,65 @@
 # services/vector_store.py
-from pinecone import Pinecone  # MODIFIED: Import the Pinecone class
+import time
 import uuid
-from typing import List, Optional
+from typing import Dict, List, Optional, Set, Tuple
 from langchain.schema import Document
-from langchain_community.vectorstores import Pinecone as LangchainPinecone # RENAMED: To avoid confusion
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
 from loguru import logger
+from core.logger import hot_logger
 from core.config import settings
+from core.llm import create_embeddings
+from core.offload import run_in_thread
+from core.shared_cache import SharedCacheEmbeddings, get_shared_cache
+from utils.bm25 import BM25Index
+from utils.reranker import LocalReranker
+from utils.quantized_index import QuantizedVectorIndex
+from core.metrics import track_stage, observe_stage
 import asyncio
 from concurrent.futures import ThreadPoolExecutor
-from pinecone import ServerlessSpec
 
 class VectorStoreManager:
     def __init__(self):
-        self.embeddings = GoogleGenerativeAIEmbeddings(
-            model=settings.EMBEDDING_MODEL,
-            google_api_key=settings.GOOGLE_API_KEY
-        )
-        self.pc = Pinecone(api_key=settings.PINECONE_API_KEY) # NEW: Initialize client here
+        self.embeddings = create_embeddings()
+        shared_cache = get_shared_cache()
+        if shared_cache is not None:
+            # Chunks and queries another worker on this node already embedded are not sent again
+            self.embeddings = SharedCacheEmbeddings(self.embeddings, shared_cache, model_name=settings.EMBEDDING_MODEL)
+        self.memory_only = settings.VECTOR_BACKEND == "memory"
+        self.pc = None
+        if not self.memory_only:
+            # Imported here so the in-memory backend never loads the Pinecone client
+            from pinecone import Pinecone
+            self.pc = Pinecone(api_key=settings.PINECONE_API_KEY) # NEW: Initialize client here
         self.index = None
         self.vector_store = None
         self.executor = ThreadPoolExecutor(max_workers=4)
+        # Parent sections of the indexed child chunks, keyed by parent_id
+        self.parent_sections: Dict[str, Document] = {}
+        # Local lexical index over the same chunks, built as they are added
+        self.bm25 = BM25Index()
+        self.reranker = LocalReranker()
+        # Optional in-process copy of the dense vectors, quantized to keep workers small
+        self.local_index: Optional[QuantizedVectorIndex] = None
+        self.local_documents: Dict[str, Document] = {}
+        # Vector ids of every source document, and of every section of one, for filtered searches
+        self.ids_by_document: Dict[str, List[str]] = {}
+        self.ids_by_section: Dict[Tuple[str, str], List[str]] = {}
+        if settings.LOCAL_DENSE_SEARCH or self.memory_only:
+            self.local_index = QuantizedVectorIndex(
+                settings.VECTOR_DIMENSION,
+                quantization=settings.VECTOR_QUANTIZATION,
+                rescore_multiplier=settings.QUANTIZED_RESCORE_MULTIPLIER,
+                storage_dir=settings.QUANTIZED_INDEX_DIR
+            )
     
     async def initialize(self):
         """Initialize Pinecone connection"""
+        if self.memory_only:
+            logger.info("Using the in-memory vector index, Pinecone is disabled")
+            return
         try:
+            from pinecone import ServerlessSpec
+            from langchain_community.vectorstores import Pinecone as LangchainPinecone # RENAMED: To avoid confusion
+            
             # MODIFIED: The client is now initialized in __init__.
             # We now use the self.pc instance for all operations.
             index_name = settings.PINECONE_INDEX_NAME
@@ -71,16 +106,31 @@ class VectorStoreManager:
                 batch_ids = doc_ids[i:i+batch_size]
                 
                 loop = asyncio.get_event_loop()
-                await loop.run_in_executor(
-                    self.executor,
-                    # MODIFIED: Use the 'from_documents' class method for clarity and correctness
-                    lambda: self.vector_store.add_documents(
-                        documents=batch_docs, 
-                        ids=batch_ids
+                # Embedding and upserting run as separate steps so each can be timed
+                with track_stage("embed"):
+                    embeddings = await loop.run_in_executor(
+                        self.executor,
+                        lambda: self.embeddings.embed_documents([doc.page_content for doc in batch_docs])
                     )
-                )
+                if not self.memory_only:
+                    with track_stage("upsert"):
+                        await loop.run_in_executor(
+                            self.executor,
+                            lambda: self._upsert(batch_docs, batch_ids, embeddings)
+                        )
+                if self.local_index is not None:
+                    self.local_index.add(batch_ids, embeddings)
+                    self.local_documents.update(zip(batch_ids, batch_docs))
                 
-                logger.info(f"Added batch {i//batch_size + 1}/{(len(documents)-1)//batch_size + 1}")
+                hot_logger().info(f"Added batch {i//batch_size + 1}/{(len(documents)-1)//batch_size + 1}")
+            
+            # Tokenize off the event loop; only the merge into the shared index runs on it
+            term_counts = await run_in_thread(BM25Index.term_counts, documents)
+            self.bm25.add(documents, doc_ids, term_counts=term_counts)
+            for doc, doc_id in zip(documents, doc_ids):
+                self.ids_by_document.setdefault(doc.metadata.get("document_id"), []).append(doc_id)
+                if doc.metadata.get("section"):
+                    self.ids_by_section.setdefault((doc.metadata.get("document_id"), doc.metadata["section"]), []).append(doc_id)
             
             logger.info(f"Successfully added {len(documents)} documents with IDs: {doc_ids[:5]}...")
             return doc_ids
@@ -89,49 +139,86 @@ class VectorStoreManager:
             logger.error(f"Error adding documents to vector store: {str(e)}")
             raise
     
+    def _upsert(self, documents: List[Document], ids: List[str], embeddings: List[List[float]]):
+        """Upsert embedded documents the way the LangChain store does, text under the "text" key"""
+        self.index.upsert(vectors=[
+            {"id": doc_id, "values": embedding, "metadata": {**doc.metadata, "text": doc.page_content}}
+            for doc, doc_id, embedding in zip(documents, ids, embeddings)
+        ])
+    
     # ... The rest of your methods (similarity_search, etc.) are correct and do not need changes ...
-    async def similarity_search(self, query: str, k: int = None) -> List[Document]:
-        """Perform similarity search"""
+    async def similarity_search(
+        self,
+        query: str,
+        k: int = None,
+        document_ids: Optional[List[str]] = None
+    ) -> List[Document]:
+        """Perform similarity search, optionally restricted to some source documents"""
         try:
-            if not self.vector_store:
+            if not self.vector_store and not self.memory_only:
                 raise Exception("Vector store not initialized")
             
             k = k or settings.TOP_K_RESULTS
             
             # Run search in thread pool
             loop = asyncio.get_event_loop()
-            results = await loop.run_in_executor(
-                self.executor,
-                lambda: self.vector_store.similarity_search(
-                    query, 
-                    k=k
-                )
-            )
+            with track_stage("dense_search"):
+                if self.memory_only:
+                    ids = self._local_ids(document_ids)
+                    results = await loop.run_in_executor(
+                        self.executor,
+                        lambda: [doc for doc, _ in self._local_search(query, k, ids)]
+                    )
+                else:
+                    results = await loop.run_in_executor(
+                        self.executor,
+                        lambda: self.vector_store.similarity_search(
+                            query, 
+                            k=k,
+                            filter=self._document_filter(document_ids)
+                        )
+                    )
             
-            logger.info(f"Found {len(results)} similar documents for query: {query[:100]}...")
+            hot_logger().info(f"Found {len(results)} similar documents for query: {query[:100]}...")
             return results
             
         except Exception as e:
             logger.error(f"Error performing similarity search: {str(e)}")
             raise
     
-    async def similarity_search_with_score(self, query: str, k: int = None) -> List[tuple]:
-        """Perform similarity search with relevance scores"""
+    async def similarity_search_with_score(
+        self,
+        query: str,
+        k: int = None,
+        document_ids: Optional[List[str]] = None,
+        sections: Optional[List[str]] = None
+    ) -> List[tuple]:
+        """Perform similarity search with relevance scores, optionally restricted to some source documents or sections"""
         try:
-            if not self.vector_store:
+            if not self.vector_store and not self.memory_only:
                 raise Exception("Vector store not initialized")
             
             k = k or settings.TOP_K_RESULTS
             
             # Run search in thread pool
             loop = asyncio.get_event_loop()
-            results = await loop.run_in_executor(
-                self.executor,
-                lambda: self.vector_store.similarity_search_with_score(
-                    query, 
-                    k=k
-                )
-            )
+            with track_stage("dense_search"):
+                if self.memory_only or (self.local_index is not None and len(self.local_index)):
+                    # The id maps change on the event loop, so they are read here and not in the worker thread
+                    ids = self._local_ids(document_ids, sections)
+                    results = await loop.run_in_executor(
+                        self.executor,
+                        lambda: self._local_search(query, k, ids)
+                    )
+                else:
+                    results = await loop.run_in_executor(
+                        self.executor,
+                        lambda: self.vector_store.similarity_search_with_score(
+                            query, 
+                            k=k,
+                            filter=self._document_filter(document_ids, sections)
+                        )
+                    )
             
             # Filter by similarity threshold
             filtered_results = [
@@ -139,25 +226,217 @@ class VectorStoreManager:
                 if score >= settings.SIMILARITY_THRESHOLD
             ]
             
-            logger.info(f"Found {len(filtered_results)} relevant documents (threshold: {settings.SIMILARITY_THRESHOLD})")
+            hot_logger().info(f"Found {len(filtered_results)} relevant documents (threshold: {settings.SIMILARITY_THRESHOLD})")
             return filtered_results
             
         except Exception as e:
             logger.error(f"Error performing similarity search with score: {str(e)}")
             raise
     
-    async def cleanup(self, doc_ids: List[str]):
-        """Clean up documents from vector store"""
+    def _local_ids(
+        self,
+        document_ids: Optional[List[str]] = None,
+        sections: Optional[List[str]] = None
+    ) -> Optional[List[str]]:
+        """Vector ids of the given source documents and sections, None for all of them"""
+        if sections:
+            return [
+                doc_id
+                for (document_id, section), section_ids in self.ids_by_section.items()
+                if section in sections and (document_ids is None or document_id in document_ids)
+                for doc_id in section_ids
+            ]
+        if document_ids is not None:
+            return [doc_id for document_id in document_ids for doc_id in self.ids_by_document.get(document_id, [])]
+        return None
+    
+    def _local_search(self, query: str, k: int, ids: Optional[List[str]] = None) -> List[tuple]:
+        """Dense search against the in-process quantized index instead of Pinecone, optionally only among `ids`"""
+        query_embedding = self.embeddings.embed_query(query)
+        hits = [
+            (self.local_documents.get(doc_id), score)
+            for doc_id, score in self.local_index.search(query_embedding, k, ids=ids)
+        ]
+        # A document cleaned up while the search ran is left out
+        return [(doc, score) for doc, score in hits if doc is not None]
+    
+    @staticmethod
+    def _document_filter(document_ids: Optional[List[str]], sections: Optional[List[str]] = None) -> Optional[dict]:
+        """Pinecone metadata filter for chunks of the given source documents and sections"""
+        conditions = {}
+        if document_ids:
+            conditions["document_id"] = {"$in": list(document_ids)}
+        if sections:
+            conditions["section"] = {"$in": list(sections)}
+        return conditions or None
+    
+    async def hybrid_search(
+        self,
+        query: str,
+        k: int = None,
+        sparse_query: Optional[str] = None,
+        dense_weight: Optional[float] = None,
+        sparse_weight: Optional[float] = None,
+        document_ids: Optional[List[str]] = None,
+        sections: Optional[List[str]] = None
+    ) -> List[tuple]:
+        """
+        Run dense search and local BM25 search side by side and merge the two rankings
+        with weighted reciprocal rank fusion. `sparse_query` lets callers add exact
+        keywords for the lexical side without polluting the embedding query.
+        `document_ids` and `sections` restrict both sides to chunks of those source
+        documents and sections.
+        """
+        k = k or settings.TOP_K_RESULTS
+        dense_weight = settings.HYBRID_DENSE_WEIGHT if dense_weight is None else dense_weight
+        sparse_weight = settings.HYBRID_SPARSE_WEIGHT if sparse_weight is None else sparse_weight
+        
+        allowed: Optional[Set[str]] = set(document_ids) if document_ids else None
+        allowed_sections: Optional[Set[str]] = set(sections) if sections else None
+        dense_results = await self.similarity_search_with_score(
+            query, k=k, document_ids=document_ids, sections=sections
+        ) if dense_weight > 0 else []
+        with track_stage("sparse_search"):
+            sparse_results = self.bm25.search(
+                sparse_query or query, k=k, document_ids=allowed, sections=allowed_sections
+            ) if sparse_weight > 0 else []
+        
+        fused: Dict[str, list] = {}
+        for weight, ranking in ((dense_weight, dense_results), (sparse_weight, sparse_results)):
+            for rank, (doc, _) in enumerate(ranking):
+                entry = fused.setdefault(doc.page_content, [doc, 0.0])
+                entry[1] += weight / (settings.RRF_K + rank + 1)
+        
+        results = sorted(((doc, score) for doc, score in fused.values()), key=lambda item: item[1], reverse=True)[:k]
+        
+        hot_logger().info(f"Hybrid search fused {len(dense_results)} dense and {len(sparse_results)} sparse hits into {len(results)}")
+        return results
+    
+    def register_parents(self, parents: Dict[str, Document]):
+        """Register the parent sections that indexed child chunks point to"""
+        self.parent_sections.update(parents)
+        logger.info(f"Registered {len(parents)} parent sections")
+    
+    async def search_with_parent_context(
+        self,
+        query: str,
+        k: int = None,
+        token_budget: int = None,
+        sparse_query: Optional[str] = None,
+        document_ids: Optional[List[str]] = None,
+        sections: Optional[List[str]] = None
+    ) -> List[tuple]:
+        """
+        Search the small child chunks, deduplicate hits by parent section and expand
+        each to its section text, staying within a total token budget.
+        """
+        started = time.perf_counter()
+        k = k or settings.TOP_K_RESULTS
+        token_budget = token_budget or settings.PARENT_CONTEXT_TOKEN_BUDGET
+        
+        child_k = k * settings.CHILD_SEARCH_FETCH_MULTIPLIER
+        fetch_k = max(child_k, k * settings.RERANK_FETCH_MULTIPLIER) if settings.RERANK_ENABLED else child_k
+        hits = await self.hybrid_search(
+            query, k=fetch_k, sparse_query=sparse_query, document_ids=document_ids, sections=sections
+        )
+        if settings.RERANK_ENABLED:
+            # Over-fetch, then keep the children the local reranker likes best
+            with track_stage("rerank"):
+                hits = self.reranker.rerank(query, hits, child_k)
+        
+        # Group hits by parent, keeping the order of the best-scoring hit
+        groups: Dict[str, List[tuple]] = {}
+        for i, (doc, score) in enumerate(hits):
+            parent_id = doc.metadata.get("parent_id")
+            key = parent_id if parent_id in self.parent_sections else f"chunk-{i}"
+            groups.setdefault(key, []).append((doc, score))
+        
+        results = []
+        used_tokens = 0
+        for key, group in groups.items():
+            remaining = token_budget - used_tokens
+            if len(results) >= k or remaining <= 0:
+                break
+            
+            best_score = group[0][1]
+            parent = self.parent_sections.get(key)
+            if parent is None:
+                doc = group[0][0]
+            else:
+                doc = self._expand_to_parent(parent, [child for child, _ in group], remaining)
+            
+            used_tokens += doc.metadata.get("token_count", 0)
+            results.append((doc, best_score))
+        
+        hot_logger().info(f"Expanded {len(hits)} child hits to {len(results)} parent contexts ({used_tokens} tokens)")
+        observe_stage("retrieval", time.perf_counter() - started)
+        return results
+    
+    def _expand_to_parent(self, parent: Document, children: List[Document], token_budget: int) -> Document:
+        """Return the parent section, or the window of it around the hits that fits the budget"""
+        parent_tokens = parent.metadata.get("token_count", 0)
+        if parent_tokens <= token_budget:
+            return Document(page_content=parent.page_content, metadata=dict(parent.metadata))
+        
+        text = parent.page_content
+        base = parent.metadata["start_index"]
+        chars_per_token = len(text) / max(parent_tokens, 1)
+        budget_chars = int(token_budget * chars_per_token)
+        
+        # Window covering the hits, grown evenly around them (or cut at the best hit)
+        lo = min(child.metadata["start_index"] for child in children) - base
+        hi = max(child.metadata["end_index"] for child in children) - base
+        if hi - lo > budget_chars:
+            lo = children[0].metadata["start_index"] - base
+        lo = max(0, lo - max(0, budget_chars - (hi - lo)) // 2)
+        hi = min(len(text), lo + budget_chars)
+        lo = max(0, hi - budget_chars)
+        
+        window = text[lo:hi]
+        if lo > 0:
+            # Keep the section header for grounding
+            header = text[:text.find("\n")] if "\n" in text else ""
+            window = f"{header}\n...\n{window}" if header else window
+        
+        metadata = {
+            **parent.metadata,
+            "start_index": base + lo,
+            "end_index": base + hi,
+            "token_count": int((hi - lo) / chars_per_token)
+        }
+        return Document(page_content=window, metadata=metadata)
+    
+    async def cleanup(self, doc_ids: List[str], parent_ids: Optional[List[str]] = None):
+        """Clean up documents from vector store, and their parent sections (all of them if not given)"""
         try:
-            if doc_ids and self.index:
+            if doc_ids and (self.index or self.memory_only):
                 logger.info(f"Cleaning up {len(doc_ids)} documents from vector store")
                 
-                # Run cleanup in thread pool
-                loop = asyncio.get_event_loop()
-                await loop.run_in_executor(
-                    self.executor,
-                    lambda: self.index.delete(ids=doc_ids)
-                )
+                if self.index:
+                    # Run cleanup in thread pool
+                    loop = asyncio.get_event_loop()
+                    await loop.run_in_executor(
+                        self.executor,
+                        lambda: self.index.delete(ids=doc_ids)
+                    )
+                if parent_ids is None:
+                    self.parent_sections.clear()
+                else:
+                    for parent_id in parent_ids:
+                        self.parent_sections.pop(parent_id, None)
+                removed = set(doc_ids)
+                for ids_by_key in (self.ids_by_document, self.ids_by_section):
+                    for key in list(ids_by_key):
+                        remaining = [doc_id for doc_id in ids_by_key[key] if doc_id not in removed]
+                        if remaining:
+                            ids_by_key[key] = remaining
+                        else:
+                            del ids_by_key[key]
+                self.bm25.remove(doc_ids)
+                if self.local_index is not None:
+                    self.local_index.remove(doc_ids)
+                    for doc_id in doc_ids:
+                        self.local_documents.pop(doc_id, None)
                 
                 logger.info("Cleanup completed")
                 
@@ -0,0 +1,113 @@
+# services/warmup.py
+"""
+Start-up warm-up, so the first request does not pay for lazy imports, the tokenizer
+download, regex compilation and the vector store connection.
+
+Steps run in the background after start-up; a failed step is retried every
+WARMUP_RETRY_SECONDS until it succeeds. `/ready` reports the state of each step.
+"""
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from langchain.schema import Document
+from loguru import logger
+
+from core.config import settings
+from core.llm import create_chat_model, create_embeddings
+from core.offload import run_in_thread
+
+# A small policy-shaped document: headings, a clause, a waiting period and a table row
+SAMPLE_TEXT = """SECTION 1. DEFINITIONS
+1.1 Hospital means any institution established for in-patient care.
+
+SECTION 2. WAITING PERIODS
+2.1 Pre-existing diseases are covered after a waiting period of 36 months.
+2.2 The grace period for premium payment is 30 days.
+
+Plan        Room Rent    ICU
+Plan A      1% of SI     2% of SI
+"""
+
+
+def _load_models():
+    # Building the clients imports the model SDK and sets up its transport
+    create_chat_model()
+    create_embeddings()
+
+
+def _load_tokenizer():
+    from utils.chunking import get_encoding
+    get_encoding().encode("warm-up")
+
+
+def _ingest_sample():
+    # Runs every ingestion step once: compiles the cleaner, chunker and extractor regexes
+    # and imports sklearn for the clause matcher
+    from services.document_loader import DocumentLoader
+    document = Document(page_content=SAMPLE_TEXT, metadata={"source": "warmup", "page": 0})
+    DocumentLoader()._build([document], "warmup", "")
+
+
+async def _connect_vector_store():
+    from services.pipeline import get_vector_store
+    await get_vector_store()
+
+
+class Warmup:
+    """Runs the warm-up steps and tracks which ones have completed"""
+
+    def __init__(self):
+        self.steps: List[Tuple[str, Callable[[], Awaitable]]] = [
+            ("models", lambda: run_in_thread(_load_models)),
+            ("tokenizer", lambda: run_in_thread(_load_tokenizer)),
+            ("ingestion", lambda: run_in_thread(_ingest_sample)),
+            ("vector_store", _connect_vector_store),
+        ]
+        self.status: Dict[str, dict] = {name: {"state": "pending"} for name, _ in self.steps}
+        self.started = time.perf_counter()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def ready(self) -> bool:
+        return all(step["state"] == "done" for step in self.status.values())
+
+    def start(self):
+        if self._task is None:
+            self.started = time.perf_counter()
+            self._task = asyncio.create_task(self._run())
+
+    def skip(self):
+        """Mark every step done without running it (WARMUP_ENABLED=false)"""
+        for step in self.status.values():
+            step["state"] = "done"
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self):
+        while True:
+            for name, step in self.steps:
+                if self.status[name]["state"] == "done":
+                    continue
+                started = time.perf_counter()
+                try:
+                    await step()
+                    self.status[name] = {"state": "done", "ms": round((time.perf_counter() - started) * 1000, 1)}
+                except Exception as e:
+                    logger.warning(f"Warm-up step {name} failed: {str(e)}")
+                    self.status[name] = {"state": "failed", "error": str(e)}
+            if self.ready:
+                logger.info(f"Warm-up finished in {time.perf_counter() - self.started:.2f}s")
+                return
+            await asyncio.sleep(settings.WARMUP_RETRY_SECONDS)
+
+
+warmup = Warmup()
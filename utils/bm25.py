@@ -0,0 +1,129 @@
+# utils/bm25.py
+import heapq
+import math
+import re
+from collections import Counter
+from typing import List, Dict, Iterable, Optional, Set, Tuple
+from langchain.schema import Document
+
+# Keeps clause numbers ("4.2.1") and roman numerals ("ii") as single tokens
+TOKEN_PATTERN = re.compile(r'[a-z0-9]+(?:\.[0-9]+)*')
+
+STOP_WORDS = frozenset({
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'has', 'have', 'if',
+    'in', 'is', 'it', 'its', 'of', 'on', 'or', 'shall', 'such', 'that', 'the', 'this',
+    'to', 'was', 'were', 'will', 'with', 'what', 'which', 'who', 'how', 'does', 'do'
+})
+
+# Deleted documents are dropped from the postings once they make up this share of the index
+COMPACT_DELETED_RATIO = 0.25
+
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOP_WORDS]
+
+
+class BM25Index:
+    """Incremental inverted-index BM25 over LangChain documents"""
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, List[Tuple[int, int]]] = {}
+        self.documents: List[Document] = []
+        self.doc_lengths: List[int] = []
+        self.id_to_index: Dict[str, int] = {}
+        self.deleted: Set[int] = set()
+        self.total_length = 0
+
+    def __len__(self) -> int:
+        return len(self.documents) - len(self.deleted)
+
+    @staticmethod
+    def term_counts(documents: List[Document]) -> List[Counter]:
+        """Tokenized term frequencies of documents; the expensive part of `add`, safe to run in another thread"""
+        return [Counter(tokenize(doc.page_content)) for doc in documents]
+
+    def add(self, documents: List[Document], ids: List[str], term_counts: Optional[List[Counter]] = None):
+        """Index documents under the same ids they were upserted with"""
+        if term_counts is None:
+            term_counts = self.term_counts(documents)
+        for doc, doc_id, counts in zip(documents, ids, term_counts):
+            index = len(self.documents)
+            for token, tf in counts.items():
+                self.postings.setdefault(token, []).append((index, tf))
+
+            length = sum(counts.values())
+            self.documents.append(doc)
+            self.doc_lengths.append(length)
+            self.id_to_index[doc_id] = index
+            self.total_length += length
+
+    def remove(self, ids: Iterable[str]):
+        for doc_id in ids:
+            index = self.id_to_index.pop(doc_id, None)
+            if index is not None and index not in self.deleted:
+                self.deleted.add(index)
+                self.total_length -= self.doc_lengths[index]
+        if self.deleted and len(self.deleted) >= COMPACT_DELETED_RATIO * len(self.documents):
+            self._compact()
+
+    def _compact(self):
+        """Rebuild the postings and document lists without the deleted documents"""
+        kept = [index for index in range(len(self.documents)) if index not in self.deleted]
+        new_index = {old: new for new, old in enumerate(kept)}
+        postings: Dict[str, List[Tuple[int, int]]] = {}
+        for token, entries in self.postings.items():
+            live = [(new_index[index], tf) for index, tf in entries if index in new_index]
+            if live:
+                postings[token] = live
+        self.postings = postings
+        self.documents = [self.documents[index] for index in kept]
+        self.doc_lengths = [self.doc_lengths[index] for index in kept]
+        self.id_to_index = {doc_id: new_index[index] for doc_id, index in self.id_to_index.items()}
+        self.deleted = set()
+
+    def search(
+        self,
+        query: str,
+        k: int = 5,
+        document_ids: Optional[Set[str]] = None,
+        sections: Optional[Set[str]] = None
+    ) -> List[Tuple[Document, float]]:
+        """Return the top-k documents for the query, best first, optionally only from some source documents or sections"""
+        n_docs = len(self)
+        if n_docs == 0:
+            return []
+
+        avg_length = self.total_length / n_docs if self.total_length else 1.0
+        scores: Dict[int, float] = {}
+
+        for token in set(tokenize(query)):
+            postings = self.postings.get(token)
+            if not postings:
+                continue
+
+            if self.deleted:
+                postings = [(index, tf) for index, tf in postings if index not in self.deleted]
+            # Document frequency over live documents only, like n_docs
+            df = len(postings)
+            if df == 0:
+                continue
+            idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+            for index, tf in postings:
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[index] / avg_length)
+                scores[index] = scores.get(index, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+
+        if document_ids is not None:
+            scores = {
+                index: score for index, score in scores.items()
+                if self.documents[index].metadata.get("document_id") in document_ids
+            }
+        if sections is not None:
+            scores = {
+                index: score for index, score in scores.items()
+                if self.documents[index].metadata.get("section") in sections
+            }
+        
+        top = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+        return [(self.documents[index], score) for index, score in top]
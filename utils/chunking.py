@@ -1,168 +1,361 @@
-
 # utils/chunking.py
-from typing import List, Dict, Any
-from langchain.text_splitter import RecursiveCharacterTextSplitter, CharacterTextSplitter
+import bisect
+import hashlib
+import re
+from functools import lru_cache
+from typing import List, Dict, Any, NamedTuple, Optional, Tuple
 from langchain.schema import Document
-import tiktoken
 from loguru import logger
 
+# All recognised section headers combined into a single pattern, compiled once.
+# Each alternative captures the header title in its own named group.
+SECTION_HEADER_PATTERN = re.compile(
+    r'^[ \t]*(?:'
+    r'(?i:section|clause)[ \t]+(?P<kw_number>\d+(?:\.\d+)*)[ \t]*[-:.]?[ \t]*(?P<kw_title>[^\n]*?)'
+    r'|(?P<number>\d+\.(?:\d+\.)*\d*)[ \t]+(?P<title>[A-Za-z(][^\n]{0,120}?)'
+    r'|(?P<caps>[A-Z][A-Z \t&/,-]{1,80}?)[ \t]*:'
+    r')[ \t]*$',
+    re.MULTILINE
+)
+
+WHITESPACE_PATTERN = re.compile(r'\s')
+SENTENCE_END_PATTERN = re.compile(r'[.!?]["\')\]]?\s')
+
+# Separator used when pages of one source are joined into a shared string
+PAGE_SEPARATOR = "\n\n"
+
+
+@lru_cache(maxsize=None)
+def get_encoding(model_name: str = "gpt-3.5-turbo") -> "tiktoken.Encoding":
+    """Return the (cached) tiktoken encoding for a model"""
+    import tiktoken
+    return tiktoken.encoding_for_model(model_name)
+
+
+class ChunkSpan(NamedTuple):
+    """A chunk expressed as offsets into a shared source string"""
+    start: int
+    end: int
+    token_start: int
+    token_end: int
+    section: Optional[str] = None
+    section_index: int = -1
+
+    @property
+    def token_count(self) -> int:
+        return self.token_end - self.token_start
+
+
+class SectionHeader(NamedTuple):
+    """A section header found in a source string"""
+    start: int
+    name: str
+    number: Optional[str] = None
+
+
 class AdvancedChunker:
-    def __init__(self, 
-                 chunk_size: int = 1000, 
-                 chunk_overlap: int = 200,
+    def __init__(self,
+                 chunk_size: int = 250,
+                 chunk_overlap: int = 50,
                  model_name: str = "gpt-3.5-turbo"):
+        """
+        Token-aware chunker. `chunk_size` and `chunk_overlap` are measured in tokens.
+        """
+        if chunk_overlap >= chunk_size:
+            raise ValueError("chunk_overlap must be smaller than chunk_size")
+
         self.chunk_size = chunk_size
         self.chunk_overlap = chunk_overlap
-        self.encoding = tiktoken.encoding_for_model(model_name)
-        
-        # Different splitters for different content types
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=chunk_size,
-            chunk_overlap=chunk_overlap,
-            separators=["\n\n", "\n", ".", "!", "?", ",", " ", ""]
-        )
-        
-        self.policy_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=chunk_size,
-            chunk_overlap=chunk_overlap,
-            separators=["\n\nSection", "\n\nClause", "\n\n", "\n", ".", " ", ""]
-        )
-    
+        self.encoding = get_encoding(model_name)
+
+        # Chunks are not cut at a section header before they reach this size
+        self.min_chunk_tokens = max(1, chunk_size // 4)
+
     def chunk_documents(self, documents: List[Document], content_type: str = "general") -> List[Document]:
         """Chunk documents based on content type"""
         try:
-            if content_type == "policy":
-                return self._chunk_policy_documents(documents)
-            else:
-                return self._chunk_general_documents(documents)
-                
+            chunks = self.split_documents(documents, respect_sections=(content_type == "policy"))
+            logger.info(f"Created {len(chunks)} {content_type} chunks from {len(documents)} documents")
+            return chunks
+
         except Exception as e:
             logger.error(f"Error chunking documents: {str(e)}")
             return documents
-    
-    def _chunk_general_documents(self, documents: List[Document]) -> List[Document]:
-        """Chunk general documents"""
+
+    def split_documents(self, documents: List[Document], respect_sections: bool = True) -> List[Document]:
+        """
+        Split documents into token-bounded chunks. Pages coming from the same source are
+        joined into one shared string so chunks and sections can span page breaks.
+        """
         all_chunks = []
-        
-        for doc in documents:
-            chunks = self.text_splitter.split_documents([doc])
-            
-            # Add chunk metadata
-            for i, chunk in enumerate(chunks):
-                chunk.metadata.update({
-                    "chunk_id": i,
-                    "total_chunks": len(chunks),
-                    "chunk_size": len(chunk.page_content),
-                    "token_count": len(self.encoding.encode(chunk.page_content))
-                })
-            
-            all_chunks.extend(chunks)
-        
-        logger.info(f"Created {len(all_chunks)} chunks from {len(documents)} documents")
+
+        for source_docs in self._group_by_source(documents):
+            text, page_starts = self._join_pages(source_docs)
+            spans = self.split_text_spans(text, respect_sections=respect_sections)
+            all_chunks.extend(self._materialize(text, spans, source_docs, page_starts))
+
         return all_chunks
-    
-    def _chunk_policy_documents(self, documents: List[Document]) -> List[Document]:
-        """Chunk policy documents with special handling"""
-        all_chunks = []
-        
+
+    def build_hierarchy(
+        self,
+        documents: List[Document],
+        max_parent_tokens: int = 1200
+    ) -> Tuple[List[Document], Dict[str, Document]]:
+        """
+        Build small child chunks for embedding plus the parent sections they belong to.
+        Every child carries a `parent_id`; sections longer than `max_parent_tokens`
+        are split into several parents.
+        """
+        children = []
+        parents = {}
+
+        for source_docs in self._group_by_source(documents):
+            text, page_starts = self._join_pages(source_docs)
+            spans = self.split_text_spans(text, respect_sections=True)
+            source_children = self._materialize(text, spans, source_docs, page_starts)
+            source_key = hashlib.md5(str(source_docs[0].metadata.get("source", "")).encode()).hexdigest()[:12]
+
+            for parent_index, (first, last) in enumerate(self._group_into_parents(spans, max_parent_tokens)):
+                parent_id = f"{source_key}-p{parent_index}"
+                group = spans[first:last]
+                start = group[0].start
+                end = max(span.end for span in group)
+                page_doc = source_docs[bisect.bisect_right(page_starts, start) - 1]
+
+                metadata = {
+                    **page_doc.metadata,
+                    "parent_id": parent_id,
+                    "start_index": start,
+                    "end_index": end,
+                    "token_count": group[-1].token_end - group[0].token_start
+                }
+                if group[0].section:
+                    metadata["section"] = group[0].section
+                parents[parent_id] = Document(page_content=text[start:end], metadata=metadata)
+
+                for child in source_children[first:last]:
+                    child.metadata["parent_id"] = parent_id
+
+            children.extend(source_children)
+
+        logger.info(f"Built {len(children)} child chunks under {len(parents)} parent sections")
+        return children, parents
+
+    @staticmethod
+    def _group_into_parents(spans: List[ChunkSpan], max_parent_tokens: int) -> List[Tuple[int, int]]:
+        """Group consecutive spans of the same section into [first, last) ranges"""
+        groups = []
+        first = 0
+        for i in range(1, len(spans)):
+            same_section = spans[i].section_index == spans[first].section_index
+            if not same_section or spans[i].token_end - spans[first].token_start > max_parent_tokens:
+                groups.append((first, i))
+                first = i
+        if spans:
+            groups.append((first, len(spans)))
+        return groups
+
+    def split_text_spans(self, text: str, respect_sections: bool = True) -> List[ChunkSpan]:
+        """
+        Tokenize `text` once and cut it into (start, end) spans on token boundaries.
+        Cuts prefer section headers, then line breaks, then sentence ends.
+        """
+        if not text:
+            return []
+
+        tokens = self.encoding.encode(text, disallowed_special=())
+        if not tokens:
+            return []
+
+        # Character offset at which every token starts
+        _, offsets = self.encoding.decode_with_offsets(tokens)
+        n_tokens = len(tokens)
+        text_length = len(text)
+
+        headers = self.find_section_headers(text)
+        header_starts = [header.start for header in headers]
+        # Index of the token containing each header start
+        header_tokens = [bisect.bisect_right(offsets, pos) - 1 for pos in header_starts] if respect_sections else []
+
+        spans = []
+        token_start = 0
+
+        while token_start < n_tokens:
+            token_end = min(token_start + self.chunk_size, n_tokens)
+            # The last window is cut too when a section header starts inside it
+            token_end, cut_at_header = self._choose_cut(
+                text, offsets, token_start, token_end, header_tokens, final=token_end >= n_tokens
+            )
+
+            char_start = offsets[token_start]
+            char_end = offsets[token_end] if token_end < n_tokens else text_length
+            char_start, char_end = self._trim_whitespace(text, char_start, char_end)
+
+            if char_start < char_end:
+                section_index = bisect.bisect_right(header_starts, char_start) - 1
+                section = headers[section_index].name if section_index >= 0 else None
+                spans.append(ChunkSpan(char_start, char_end, token_start, token_end, section, section_index))
+
+            if token_end >= n_tokens:
+                break
+
+            # Overlap with the previous chunk, except when a new section starts
+            if cut_at_header:
+                token_start = token_end
+            else:
+                token_start = max(token_end - self.chunk_overlap, token_start + 1)
+
+        return spans
+
+    def _choose_cut(
+        self,
+        text: str,
+        offsets: List[int],
+        token_start: int,
+        token_end: int,
+        header_tokens: List[int],
+        final: bool = False
+    ) -> Tuple[int, bool]:
+        """Pick the best token index to end the current chunk at; the `final` window only ends early at a header"""
+        min_end = token_start + self.min_chunk_tokens
+
+        # 1. The last section header inside the window
+        index = bisect.bisect_right(header_tokens, token_end) - 1
+        if index >= 0 and header_tokens[index] > min_end:
+            return header_tokens[index], True
+        if final:
+            return token_end, False
+
+        # 2. The last line break or sentence end in the back half of the window
+        search_start = offsets[max(min_end, token_start + self.chunk_size // 2)]
+        search_end = offsets[token_end]
+
+        newline = text.rfind('\n', search_start, search_end)
+        if newline == -1:
+            sentence_end = None
+            for match in SENTENCE_END_PATTERN.finditer(text, search_start, search_end):
+                sentence_end = match.end() - 1
+            if sentence_end is None:
+                return token_end, False
+            boundary = sentence_end
+        else:
+            boundary = newline + 1
+
+        cut = bisect.bisect_left(offsets, boundary, token_start + 1, token_end)
+        return (cut if cut > token_start else token_end), False
+
+    @staticmethod
+    def _trim_whitespace(text: str, start: int, end: int) -> Tuple[int, int]:
+        while start < end and text[start].isspace():
+            start += 1
+        while end > start and text[end - 1].isspace():
+            end -= 1
+        return start, end
+
+    @staticmethod
+    def _group_by_source(documents: List[Document]) -> List[List[Document]]:
+        """Group consecutive documents (e.g. PDF pages) that share a source"""
+        groups = []
         for doc in documents:
-            # Try to identify sections first
-            sections = self._identify_policy_sections(doc.page_content)
-            
-            if sections:
-                # Chunk by sections
-                for section_name, section_content in sections.items():
-                    section_doc = Document(
-                        page_content=section_content,
-                        metadata={**doc.metadata, "section": section_name}
-                    )
-                    
-                    chunks = self.policy_splitter.split_documents([section_doc])
-                    all_chunks.extend(chunks)
+            source = doc.metadata.get("source")
+            if groups and source is not None and groups[-1][0].metadata.get("source") == source:
+                groups[-1].append(doc)
             else:
-                # Regular chunking
-                chunks = self.policy_splitter.split_documents([doc])
-                all_chunks.extend(chunks)
-        
-        # Add token counts
-        for chunk in all_chunks:
-            chunk.metadata["token_count"] = len(self.encoding.encode(chunk.page_content))
-        
-        logger.info(f"Created {len(all_chunks)} policy chunks from {len(documents)} documents")
-        return all_chunks
-    
+                groups.append([doc])
+        return groups
+
+    @staticmethod
+    def _join_pages(documents: List[Document]) -> Tuple[str, List[int]]:
+        """Join pages into one source string and return the start offset of every page"""
+        page_starts = []
+        position = 0
+        for doc in documents:
+            page_starts.append(position)
+            position += len(doc.page_content) + len(PAGE_SEPARATOR)
+        return PAGE_SEPARATOR.join(doc.page_content for doc in documents), page_starts
+
+    def _materialize(
+        self,
+        text: str,
+        spans: List[ChunkSpan],
+        source_docs: List[Document],
+        page_starts: List[int]
+    ) -> List[Document]:
+        """Turn spans into LangChain documents carrying their offsets as metadata"""
+        chunks = []
+        for i, span in enumerate(spans):
+            page_doc = source_docs[bisect.bisect_right(page_starts, span.start) - 1]
+            metadata = {
+                **page_doc.metadata,
+                "chunk_id": i,
+                "total_chunks": len(spans),
+                "start_index": span.start,
+                "end_index": span.end,
+                "chunk_size": span.end - span.start,
+                "token_count": span.token_count
+            }
+            if span.section:
+                metadata["section"] = span.section
+            chunks.append(Document(page_content=text[span.start:span.end], metadata=metadata))
+        return chunks
+
+    def find_section_headers(self, text: str) -> List[SectionHeader]:
+        """Find all section headers in a single pass over the text"""
+        headers = []
+        for match in SECTION_HEADER_PATTERN.finditer(text):
+            if match.group("caps") is not None:
+                name, number = match.group("caps"), None
+            elif match.group("number") is not None:
+                name, number = match.group("title"), match.group("number").rstrip('.')
+            else:
+                name, number = match.group("kw_title") or match.group("kw_number"), match.group("kw_number")
+            headers.append(SectionHeader(match.start(), name.strip().lower(), number))
+        return headers
+
     def _identify_policy_sections(self, text: str) -> Dict[str, str]:
         """Identify common policy sections"""
-        import re
-        
+        headers = self.find_section_headers(text)
         sections = {}
-        current_section = None
-        current_content = []
-        
-        # Common section headers
-        section_headers = [
-            r'^\s*(?:SECTION|Section)\s+\d+\s*[-:]?\s*(.+),
-            r'^\s*(?:CLAUSE|Clause)\s+\d+\s*[-:]?\s*(.+),
-            r'^\s*(\d+\.\s*.+),
-            r'^\s*([A-Z][A-Z\s]+):\s*
-        ]
-        
-        lines = text.split('\n')
-        
-        for line in lines:
-            line = line.strip()
-            if not line:
+
+        for i, header in enumerate(headers):
+            body_start = text.find('\n', header.start)
+            body_end = headers[i + 1].start if i + 1 < len(headers) else len(text)
+            if body_start == -1 or body_start >= body_end:
                 continue
-            
-            # Check if this is a section header
-            is_header = False
-            for pattern in section_headers:
-                match = re.match(pattern, line, re.IGNORECASE)
-                if match:
-                    # Save previous section
-                    if current_section and current_content:
-                        sections[current_section] = '\n'.join(current_content)
-                    
-                    # Start new section
-                    current_section = match.group(1).strip().lower()
-                    current_content = []
-                    is_header = True
-                    break
-            
-            if not is_header:
-                current_content.append(line)
-        
-        # Save last section
-        if current_section and current_content:
-            sections[current_section] = '\n'.join(current_content)
-        
+
+            content = '\n'.join(
+                line.strip() for line in text[body_start:body_end].split('\n') if line.strip()
+            )
+            if content:
+                sections[header.name] = content
+
         return sections if len(sections) > 1 else {}
-    
+
     def optimize_chunks_for_retrieval(self, chunks: List[Document]) -> List[Document]:
         """Optimize chunks for better retrieval performance"""
         optimized_chunks = []
-        
+
         for chunk in chunks:
             # Skip very short chunks
             if len(chunk.page_content.strip()) < 50:
                 continue
-            
+
             # Skip chunks that are mostly formatting
             if self._is_mostly_formatting(chunk.page_content):
                 continue
-            
+
             # Add context markers for better retrieval
             if "section" in chunk.metadata:
                 chunk.page_content = f"Section: {chunk.metadata['section']}\n\n{chunk.page_content}"
-            
+
             optimized_chunks.append(chunk)
-        
+
         logger.info(f"Optimized {len(chunks)} chunks to {len(optimized_chunks)} chunks")
         return optimized_chunks
-    
+
     def _is_mostly_formatting(self, text: str) -> bool:
         """Check if text is mostly formatting/whitespace"""
-        text_chars = len(re.sub(r'\s', '', text))
+        text_chars = len(WHITESPACE_PATTERN.sub('', text))
         total_chars = len(text)
-        
+
         return (text_chars / total_chars) < 0.3 if total_chars > 0 else True
@@ -64,6 +64,22 @@ class FileDownloader:
             logger.error(f"Error downloading file: {str(e)}")
             raise
     
+    async def probe_size(self, url: str, timeout: float = 2.0) -> Optional[int]:
+        """Content-Length of a URL from a HEAD request, None when unknown"""
+        try:
+            if not self.session:
+                self.session = aiohttp.ClientSession()
+            
+            async with self.session.head(
+                url, allow_redirects=True, timeout=aiohttp.ClientTimeout(total=timeout)
+            ) as response:
+                length = response.headers.get('Content-Length')
+                return int(length) if response.status == 200 and length else None
+                
+        except Exception as e:
+            logger.warning(f"Could not probe size of {url}: {str(e)}")
+            return None
+    
     def _get_file_extension(self, url: str, response) -> str:
         """Determine file extension from URL or content type"""
         # Try to get extension from URL
@@ -0,0 +1,252 @@
+# utils/quantized_index.py
+import json
+import os
+import tempfile
+import threading
+from typing import List, Iterable, Optional, Tuple
+import numpy as np
+
+QUANTIZATION_MODES = ("float32", "int8", "binary")
+
+# The 8 bits of every byte value, for scoring queries against packed sign bits
+BYTE_BITS = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1).astype(np.float32)
+
+# Rows dequantized per step while scoring, bounds the temporary float32 copy
+SCORE_BLOCK_ROWS = 4096
+
+# Removed rows are dropped from the arrays once they make up this share of the index
+COMPACT_DELETED_RATIO = 0.25
+
+
+class QuantizedVectorIndex:
+    """
+    Compact in-memory cosine index over embeddings, stored in contiguous arrays.
+
+    - "float32": the raw normalized vectors (baseline)
+    - "int8":    symmetric per-vector scalar quantization, 4x smaller
+    - "binary":  packed sign bits scored against the float query, 32x smaller in memory;
+                 the top `rescore_multiplier * k` candidates are rescored with their float32
+                 vectors, which stay on disk when a `storage_dir` is given (or the index is
+                 loaded memory-mapped), so only the pages of those candidates are read
+    """
+
+    def __init__(
+        self,
+        dimension: int,
+        quantization: str = "int8",
+        rescore_multiplier: int = 10,
+        storage_dir: Optional[str] = None
+    ):
+        if quantization not in QUANTIZATION_MODES:
+            raise ValueError(f"Unknown quantization '{quantization}', expected one of {QUANTIZATION_MODES}")
+
+        self.dimension = dimension
+        self.quantization = quantization
+        self.rescore_multiplier = rescore_multiplier
+        self.storage_dir = storage_dir
+        # Searches run in worker threads while the event loop adds, removes and compacts
+        self.lock = threading.Lock()
+        self.ids: List[str] = []
+        self.id_to_row = {}
+        self.active = np.zeros(0, dtype=bool)
+        # float32 mode, and the rescoring vectors of binary mode
+        self.vectors = np.zeros((0, dimension), dtype=np.float32)
+        self.codes = np.zeros((0, dimension), dtype=np.int8)        # int8 only
+        self.scales = np.zeros(0, dtype=np.float32)
+        self.bits = np.zeros((0, (dimension + 7) // 8), dtype=np.uint8)  # binary only
+        # Binary mode appends the rescoring vectors to an unlinked file in `storage_dir` and maps it
+        self._vector_file = None
+        if quantization == "binary" and storage_dir:
+            os.makedirs(storage_dir, exist_ok=True)
+            self._vector_file = self._open_vector_file()
+
+    def __len__(self) -> int:
+        return int(self.active.sum())
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes of all vector arrays, on disk or in memory"""
+        if self.quantization == "float32":
+            return self.vectors.nbytes
+        if self.quantization == "int8":
+            return self.codes.nbytes + self.scales.nbytes
+        return self.bits.nbytes + self.vectors.nbytes
+
+    @property
+    def resident_nbytes(self) -> int:
+        """
+        Bytes of the arrays held in process memory. Memory-mapped arrays are left out: their
+        pages live in the shared OS page cache, are read on demand and can be evicted.
+        """
+        arrays = (self.active, self.vectors, self.codes, self.scales, self.bits)
+        return sum(array.nbytes for array in arrays if not isinstance(array, np.memmap))
+
+    def add(self, ids: List[str], embeddings: List[List[float]]):
+        vectors = self._normalize(np.asarray(embeddings, dtype=np.float32).reshape(-1, self.dimension))
+
+        with self.lock:
+            if self.quantization == "int8":
+                codes, scales = self._quantize_int8(vectors)
+                self.codes = np.concatenate([self.codes, codes])
+                self.scales = np.concatenate([self.scales, scales])
+            else:
+                if self.quantization == "binary":
+                    self.bits = np.concatenate([self.bits, np.packbits(vectors > 0, axis=1)])
+                self._append_vectors(vectors)
+
+            for doc_id in ids:
+                self.id_to_row[doc_id] = len(self.ids)
+                self.ids.append(doc_id)
+            self.active = np.concatenate([self.active, np.ones(len(ids), dtype=bool)])
+
+    def remove(self, ids: Iterable[str]):
+        with self.lock:
+            for doc_id in ids:
+                row = self.id_to_row.pop(doc_id, None)
+                if row is not None:
+                    self.active[row] = False
+            removed = len(self.ids) - len(self.id_to_row)
+            if removed and removed >= COMPACT_DELETED_RATIO * len(self.ids):
+                self._compact()
+
+    def search(self, query: List[float], k: int = 5, ids: Optional[Iterable[str]] = None) -> List[Tuple[str, float]]:
+        """Return the top-k (id, cosine score) pairs, best first, optionally only among `ids`"""
+        query_vector = self._normalize(np.asarray(query, dtype=np.float32).reshape(1, -1))[0]
+        with self.lock:
+            mask = self.active if ids is None else self._mask(ids)
+            n_active = int(mask.sum())
+            if n_active == 0:
+                return []
+            k = min(k, n_active)
+
+            if self.quantization == "binary":
+                candidates = self._binary_candidates(query_vector, min(n_active, k * self.rescore_multiplier), mask)
+                # Sorted rows read the mapped file front to back
+                candidates = np.sort(candidates)
+                scores = self.vectors[candidates] @ query_vector
+            else:
+                candidates = np.flatnonzero(mask)
+                if self.quantization == "int8":
+                    scores = self._int8_scores(query_vector, candidates)
+                elif len(candidates) == len(self.ids):
+                    scores = self.vectors @ query_vector
+                else:
+                    scores = self.vectors[candidates] @ query_vector
+
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top], kind="stable")]
+            return [(self.ids[candidates[i]], float(scores[i])) for i in top]
+
+    def save(self, directory: str):
+        """Write the arrays as .npy files so other workers can memory-map them"""
+        os.makedirs(directory, exist_ok=True)
+        for name in ("active", "vectors", "codes", "scales", "bits"):
+            np.save(os.path.join(directory, f"{name}.npy"), getattr(self, name))
+        with open(os.path.join(directory, "index.json"), "w") as f:
+            json.dump({
+                "dimension": self.dimension,
+                "quantization": self.quantization,
+                "rescore_multiplier": self.rescore_multiplier,
+                "ids": self.ids
+            }, f)
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = True) -> "QuantizedVectorIndex":
+        """Load a saved index; with `mmap` the vector pages are shared through the OS page cache"""
+        with open(os.path.join(directory, "index.json")) as f:
+            meta = json.load(f)
+
+        index = cls(meta["dimension"], meta["quantization"], meta["rescore_multiplier"])
+        mmap_mode = "r" if mmap else None
+        for name in ("vectors", "codes", "scales", "bits"):
+            setattr(index, name, np.load(os.path.join(directory, f"{name}.npy"), mmap_mode=mmap_mode))
+        # Deletions write to the mask, so it is always a private copy
+        index.active = np.load(os.path.join(directory, "active.npy"))
+        index.ids = meta["ids"]
+        index.id_to_row = {doc_id: row for row, doc_id in enumerate(index.ids) if index.active[row]}
+        return index
+
+    def close(self):
+        """Release the rescoring file; the index must not be used afterwards"""
+        if self._vector_file is not None:
+            self.vectors = np.zeros((0, self.dimension), dtype=np.float32)
+            self._vector_file.close()
+            self._vector_file = None
+
+    def _compact(self):
+        """Rebuild the arrays from the active rows; rescoring vectors in a file go to a fresh one"""
+        rows = np.flatnonzero(self.active)
+        # np.asarray: rows taken from a memory-mapped array are an in-memory copy
+        if self.quantization == "int8":
+            self.codes = np.asarray(self.codes[rows])
+            self.scales = np.asarray(self.scales[rows])
+        else:
+            if self.quantization == "binary":
+                self.bits = np.asarray(self.bits[rows])
+            vectors = np.asarray(self.vectors[rows])
+            if self._vector_file is not None:
+                # Mappings of the old file stay valid after it is closed
+                previous, self._vector_file = self._vector_file, self._open_vector_file()
+                previous.close()
+                self.vectors = np.zeros((0, self.dimension), dtype=np.float32)
+                self._append_vectors(vectors)
+            else:
+                self.vectors = vectors
+        self.ids = [self.ids[row] for row in rows]
+        self.id_to_row = {doc_id: row for row, doc_id in enumerate(self.ids)}
+        self.active = np.ones(len(rows), dtype=bool)
+
+    def _open_vector_file(self):
+        return tempfile.TemporaryFile(dir=self.storage_dir, prefix="rescore-", suffix=".f32")
+
+    def _append_vectors(self, vectors: np.ndarray):
+        if not len(vectors):
+            return
+        if self._vector_file is None:
+            self.vectors = np.concatenate([self.vectors, vectors])
+            return
+        self._vector_file.seek(0, os.SEEK_END)
+        self._vector_file.write(np.ascontiguousarray(vectors).tobytes())
+        self._vector_file.flush()
+        rows = len(self.vectors) + len(vectors)
+        # Re-mapped after every append: a mapping cannot grow with its file
+        self.vectors = np.memmap(self._vector_file, dtype=np.float32, mode="r", shape=(rows, self.dimension))
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms > 0, norms, 1.0)
+
+    @staticmethod
+    def _quantize_int8(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        scales = np.where(scales > 0, scales, 1.0).astype(np.float32)
+        codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+        return codes, scales
+
+    def _int8_scores(self, query_vector: np.ndarray, rows: np.ndarray) -> np.ndarray:
+        scores = np.empty(len(rows), dtype=np.float32)
+        for start in range(0, len(rows), SCORE_BLOCK_ROWS):
+            block = rows[start:start + SCORE_BLOCK_ROWS]
+            scores[start:start + len(block)] = (self.codes[block].astype(np.float32) @ query_vector) * self.scales[block]
+        return scores
+
+    def _mask(self, ids: Iterable[str]) -> np.ndarray:
+        mask = np.zeros(len(self.ids), dtype=bool)
+        rows = [self.id_to_row[doc_id] for doc_id in ids if doc_id in self.id_to_row]
+        mask[rows] = True
+        return mask
+
+    def _binary_candidates(self, query_vector: np.ndarray, n_candidates: int, mask: np.ndarray) -> np.ndarray:
+        """
+        Asymmetric first stage: the float query against the stored sign bits. A per-byte
+        table holds the sum of query components for every possible byte value, so scoring
+        a row is one table gather per byte instead of unpacking its bits.
+        """
+        padded = np.zeros(self.bits.shape[1] * 8, dtype=np.float32)
+        padded[:len(query_vector)] = query_vector
+        # BYTE_BITS[v] are the bits of byte value v, most significant first like np.packbits
+        table = padded.reshape(-1, 8) @ BYTE_BITS.T
+        scores = table[np.arange(self.bits.shape[1]), self.bits].sum(axis=1)
+        scores[~mask] = -np.inf
+        return np.argpartition(-scores, n_candidates - 1)[:n_candidates]
@@ -0,0 +1,75 @@
+# utils/reranker.py
+import re
+from typing import List, Set
+import numpy as np
+from langchain.schema import Document
+
+from utils.bm25 import tokenize
+
+CLAUSE_NUMBER_PATTERN = re.compile(r'\b\d+(?:\.\d+)+\b')
+
+# Query intent -> sections that usually hold the answer
+SECTION_PRIORS = [
+    (re.compile(r'\bexclu|not covered|excluded', re.IGNORECASE), re.compile(r'exclu', re.IGNORECASE)),
+    (re.compile(r'\bwait', re.IGNORECASE), re.compile(r'wait', re.IGNORECASE)),
+    (re.compile(r'\bclaim', re.IGNORECASE), re.compile(r'claim', re.IGNORECASE)),
+    (re.compile(r'\b(?:define|definition|meaning|means)\b', re.IGNORECASE), re.compile(r'defin', re.IGNORECASE)),
+    (re.compile(r'\b(?:limit|sub-?limit|co-?pay|benefit|table)', re.IGNORECASE), re.compile(r'benefit|schedule|limit|table', re.IGNORECASE)),
+]
+
+
+class LocalReranker:
+    """
+    Cheap second-stage scorer for retrieved chunks. Combines the retrieval score with
+    query-term overlap, clause-number matches and section priors from chunk metadata.
+    """
+
+    def __init__(
+        self,
+        retrieval_weight: float = 0.4,
+        lexical_weight: float = 0.35,
+        clause_weight: float = 0.15,
+        section_weight: float = 0.1
+    ):
+        self.weights = np.array([retrieval_weight, lexical_weight, clause_weight, section_weight])
+
+    def rerank(self, query: str, results: List[tuple], top_k: int) -> List[tuple]:
+        """Reorder (document, score) results and keep the best `top_k`"""
+        if len(results) <= 1:
+            return results[:top_k]
+
+        features = self._features(query, [doc for doc, _ in results], np.array([score for _, score in results], dtype=float))
+        scores = features @ self.weights
+        order = np.argsort(-scores, kind="stable")[:top_k]
+        return [(results[i][0], float(scores[i])) for i in order]
+
+    def _features(self, query: str, documents: List[Document], retrieval_scores: np.ndarray) -> np.ndarray:
+        n = len(documents)
+        doc_tokens: List[Set[str]] = [set(tokenize(doc.page_content)) for doc in documents]
+        sections = [str(doc.metadata.get("section") or "") for doc in documents]
+
+        # Retrieval scores come from different scales (cosine, RRF); min-max them
+        spread = retrieval_scores.max() - retrieval_scores.min()
+        retrieval = (retrieval_scores - retrieval_scores.min()) / spread if spread > 0 else np.ones(n)
+
+        # Query-term incidence matrix, terms weighted by how rare they are among the candidates
+        query_terms = list(dict.fromkeys(tokenize(query)))
+        if query_terms:
+            incidence = np.array([[term in tokens for term in query_terms] for tokens in doc_tokens], dtype=float)
+            term_weights = np.log1p(n / (1.0 + incidence.sum(axis=0)))
+            lexical = incidence @ term_weights / term_weights.sum()
+        else:
+            lexical = np.zeros(n)
+
+        clause_numbers = CLAUSE_NUMBER_PATTERN.findall(query)
+        clause = np.array([
+            any(number in tokens or section.startswith(number) for number in clause_numbers)
+            for tokens, section in zip(doc_tokens, sections)
+        ], dtype=float)
+
+        section_patterns = [section_pattern for query_pattern, section_pattern in SECTION_PRIORS if query_pattern.search(query)]
+        section_prior = np.array([
+            any(pattern.search(section) for pattern in section_patterns) for section in sections
+        ], dtype=float)
+
+        return np.column_stack([retrieval, lexical, clause, section_prior])
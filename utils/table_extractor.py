@@ -0,0 +1,197 @@
+# utils/table_extractor.py
+import re
+from dataclasses import dataclass, field
+from typing import List, Dict, Optional, Set, Tuple
+from langchain.schema import Document
+from loguru import logger
+
+# Column headers of benefit tables: "Plan A", "Option 2", "Gold", ...
+COLUMN_PATTERN = re.compile(
+    r'\b(?:(?:plan|option|variant|tier)[ \t]*[-:]?[ \t]*[A-Z0-9]{1,3}\b'
+    r'|silver|gold|platinum|diamond|basic|standard|premium|essential|enhanced)',
+    re.IGNORECASE
+)
+
+# A single table cell value: amounts, percentages, durations and the usual keywords
+VALUE = (
+    r'(?:(?:Rs\.?|INR|₹)[ \t]?)?[\d,]+(?:\.\d+)?[ \t]?'
+    r'(?:%(?:[ \t]+of[ \t]+(?:SI|sum[ \t]+insured))?|lakhs?|lacs?|crores?|days?|months?|years?)?'
+    r'|Nil|Yes|No|Covered|Not[ \t]+Covered|N\.?A\.?|Up[ \t]?to[ \t]+SI|Unlimited'
+)
+
+# Cells separated by tabs, pipes or runs of spaces (layout-preserving extractors)
+CELL_SEPARATOR = re.compile(r'\t|[ ]{2,}|[ \t]*\|[ \t]*')
+
+WORD_PATTERN = re.compile(r'[a-z0-9]+')
+
+STOP_WORDS = frozenset({
+    'a', 'an', 'the', 'of', 'for', 'in', 'on', 'to', 'is', 'are', 'what', 'which', 'how',
+    'much', 'under', 'with', 'per', 'and', 'or', 'does', 'do', 'plan', 'option', 'policy'
+})
+
+
+def _tokens(text: str) -> List[str]:
+    return [t for t in WORD_PATTERN.findall(text.lower()) if t not in STOP_WORDS]
+
+
+def _column_key(name: str) -> str:
+    return ''.join(WORD_PATTERN.findall(name.lower()))
+
+
+@dataclass
+class ExtractedTable:
+    """A table stored column-major: columns[j][i] is the value of row i in column j"""
+    headers: List[str]
+    row_labels: List[str]
+    columns: List[List[str]]
+    page: Optional[int] = None
+
+
+@dataclass
+class TableMatch:
+    """Result of a direct table lookup"""
+    row_label: str
+    values: Dict[str, str]
+    page: Optional[int] = None
+
+    def to_text(self) -> str:
+        location = f" (benefit table, page {self.page + 1})" if self.page is not None else ""
+        cells = "; ".join(f"{column}: {value}" for column, value in self.values.items())
+        return f"{self.row_label} - {cells}{location}"
+
+
+@dataclass
+class TableStore:
+    """In-memory store of extracted tables with an inverted index over row labels"""
+    tables: List[ExtractedTable] = field(default_factory=list)
+    label_index: Dict[str, Set[Tuple[int, int]]] = field(default_factory=dict)
+
+    def add(self, table: ExtractedTable):
+        table_id = len(self.tables)
+        self.tables.append(table)
+        for row, label in enumerate(table.row_labels):
+            for token in set(_tokens(label)):
+                self.label_index.setdefault(token, set()).add((table_id, row))
+
+    def __len__(self) -> int:
+        return len(self.tables)
+
+    def lookup(self, query: str, min_score: float = 0.5) -> Optional[TableMatch]:
+        """
+        Answer a lookup like "co-payment for plan B" straight from the tables.
+        Returns None when no row label matches the query well enough.
+        """
+        mentioned_columns = {_column_key(m.group(0)) for m in COLUMN_PATTERN.finditer(query)}
+        query_tokens = set(_tokens(COLUMN_PATTERN.sub(' ', query)))
+        if not query_tokens:
+            return None
+
+        # Count overlapping label tokens per candidate row
+        overlaps: Dict[Tuple[int, int], int] = {}
+        for token in query_tokens:
+            for key in self.label_index.get(token, ()):
+                overlaps[key] = overlaps.get(key, 0) + 1
+
+        best_key, best_score = None, 0.0
+        for (table_id, row), overlap in overlaps.items():
+            table = self.tables[table_id]
+            label_tokens = set(_tokens(table.row_labels[row]))
+            score = overlap / len(label_tokens)
+            # Prefer tables that have the column the query asks for
+            if mentioned_columns & {_column_key(h) for h in table.headers}:
+                score += 0.25
+            if score > best_score:
+                best_key, best_score = (table_id, row), score
+
+        if best_key is None or best_score < min_score:
+            return None
+
+        table_id, row = best_key
+        table = self.tables[table_id]
+        values = {
+            header: table.columns[j][row]
+            for j, header in enumerate(table.headers)
+            if not mentioned_columns or _column_key(header) in mentioned_columns
+        }
+        if not values:
+            return None
+
+        return TableMatch(row_label=table.row_labels[row], values=values, page=table.page)
+
+
+class TableExtractor:
+    def __init__(self, min_rows: int = 2):
+        self.min_rows = min_rows
+        self._row_patterns: Dict[int, re.Pattern] = {}
+
+    def extract(self, documents: List[Document]) -> TableStore:
+        """Detect benefit tables in loaded pages and store them column-major"""
+        store = TableStore()
+
+        for doc in documents:
+            try:
+                for table in self._extract_from_text(doc.page_content, doc.metadata.get("page")):
+                    store.add(table)
+            except Exception as e:
+                logger.error(f"Error extracting tables: {str(e)}")
+
+        logger.info(f"Extracted {len(store)} tables")
+        return store
+
+    def _row_pattern(self, n_columns: int) -> re.Pattern:
+        """Pattern for a row label followed by exactly `n_columns` value cells"""
+        if n_columns not in self._row_patterns:
+            self._row_patterns[n_columns] = re.compile(
+                r'^[ \t]*(?P<label>[A-Za-z(][^\n]*?)'
+                + (r'[ \t]+(' + VALUE + r')') * n_columns + r'[ \t]*$',
+                re.IGNORECASE
+            )
+        return self._row_patterns[n_columns]
+
+    def _extract_from_text(self, text: str, page: Optional[int]) -> List[ExtractedTable]:
+        tables = []
+        lines = text.split('\n')
+        i = 0
+
+        while i < len(lines):
+            headers = [m.group(0).strip() for m in COLUMN_PATTERN.finditer(lines[i])]
+            if len(headers) < 2:
+                i += 1
+                continue
+
+            row_labels, rows = [], []
+            j = i + 1
+            while j < len(lines):
+                cells = self._split_row(lines[j], len(headers))
+                if cells is None:
+                    if not lines[j].strip():
+                        j += 1
+                        continue
+                    break
+                row_labels.append(cells[0])
+                rows.append(cells[1:])
+                j += 1
+
+            if len(rows) >= self.min_rows:
+                columns = [[row[c] for row in rows] for c in range(len(headers))]
+                tables.append(ExtractedTable(headers, row_labels, columns, page))
+                i = j
+            else:
+                i += 1
+
+        return tables
+
+    def _split_row(self, line: str, n_columns: int) -> Optional[List[str]]:
+        """Split a table row into [label, value_1, ..., value_n] or return None"""
+        cells = [cell.strip() for cell in CELL_SEPARATOR.split(line.strip()) if cell.strip()]
+        if len(cells) == n_columns + 1 and not COLUMN_PATTERN.fullmatch(cells[0]):
+            return cells
+
+        # Plain-text extraction collapses spacing; peel the value cells off the end
+        match = self._row_pattern(n_columns).match(line)
+        if not match:
+            return None
+        # Group 1 is the label, the value cells follow
+        return [match.group("label").strip()] + [
+            ' '.join(match.group(k).split()) for k in range(2, n_columns + 2)
+        ]
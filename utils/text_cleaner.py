@@ -1,9 +1,47 @@
-
 # utils/text_cleaner.py
 import re
-from typing import List, Dict
+from typing import List, Dict, Optional, Tuple
 import unicodedata
 
+PAGE_NUMBER_PATTERN = re.compile(r'page[ \t]+\d+(?:[ \t]*of[ \t]*\d+)?', re.IGNORECASE)
+BULLET_CHARS = frozenset('•·▪▫‣⁃')
+
+# Only used when cleaning aggressively
+URL_OR_EMAIL_PATTERN = re.compile(
+    r'(?P<url>https?://[^\s]+)|(?P<email>\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}\b)'
+)
+
+POLICY_SECTION_PATTERN = re.compile(
+    r'(?P<definitions>definitions?)|(?P<coverage>coverage)|(?P<exclusions>exclusions?)'
+    r'|(?P<waiting_period>waiting[ \t\r\n]+period)|(?P<claims>claims?)',
+    re.IGNORECASE
+)
+# A line that starts a new section: "Some Heading:" or "12."
+SECTION_BOUNDARY_PATTERN = re.compile(r'^(?:[A-Za-z \t]+:|\d+\.)', re.MULTILINE)
+SECTION_SEPARATOR_PATTERN = re.compile(r'[ \t\r\n]*:?[ \t\r\n]*')
+
+# Candidate sentence ends: terminal punctuation followed by whitespace or the end of the text,
+# so "1.5%" and "5.000" never end a sentence
+SENTENCE_END_PATTERN = re.compile(r'[.!?]+["\')\]]*(?=\s|$)')
+LAST_TOKEN_PATTERN = re.compile(r'(\S+)$')
+# Tokens a period follows without ending the sentence
+ABBREVIATIONS = frozenset({
+    'rs', 'inr', 'no', 'nos', 'sr', 'dr', 'mr', 'mrs', 'ms', 'st', 'vs', 'viz', 'etc', 'approx',
+    'e.g', 'i.e', 'cf', 'incl', 'max', 'min', 'yr', 'yrs', 'mo', 'mos', 'sec', 'cl', 'art',
+    'para', 'fig', 'p', 'pp', 'co', 'ltd', 'inc', 'pvt', 'govt', 'dept', 'ref', 'u.s',
+})
+# Clause numbers such as "4.2." that open a line
+CLAUSE_NUMBER_TOKEN = re.compile(r'^\d+(?:\.\d+)*$')
+
+# Pages below this count are not worth shipping to worker processes
+PARALLEL_MIN_PAGES = 32
+
+
+def clean_pages(pages: List[str]) -> List[str]:
+    """Module-level entry point so batches of pages can be cleaned in worker processes"""
+    return TextCleaner().clean_pages(pages)
+
+
 class TextCleaner:
     def __init__(self):
         # Common patterns to clean
@@ -16,69 +54,134 @@ class TextCleaner:
             'urls': re.compile(r'https?://[^\s]+'),
             'emails': re.compile(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b'),
         }
-    
+
     def clean_text(self, text: str, aggressive: bool = False) -> str:
         """Clean text with various preprocessing steps"""
         if not text:
             return ""
-        
-        # Normalize unicode characters
-        text = unicodedata.normalize('NFKD', text)
-        
-        # Remove page numbers
-        text = self.patterns['page_numbers'].sub('', text)
-        
+
         # Remove headers/footers (if aggressive)
         if aggressive:
             text = self.patterns['headers_footers'].sub('', text)
-        
-        # Clean bullet points and numbered lists
-        text = self.patterns['bullet_points'].sub('• ', text)
-        text = self.patterns['numbered_lists'].sub('', text)
-        
-        # Remove URLs (if aggressive)
+
+        text = self._fused_clean(self._normalize(text), preserve_lines=False)
+
+        # Replace URLs and emails (if aggressive)
         if aggressive:
-            text = self.patterns['urls'].sub('[URL]', text)
-            text = self.patterns['emails'].sub('[EMAIL]', text)
-        
-        # Clean extra whitespace
-        text = self.patterns['extra_whitespace'].sub(' ', text)
-        
-        # Remove leading/trailing whitespace
-        text = text.strip()
-        
+            text = URL_OR_EMAIL_PATTERN.sub(lambda m: '[URL]' if m.group('url') else '[EMAIL]', text)
+
         return text
-    
+
+    def clean_page(self, text: str) -> str:
+        """
+        Clean one loaded page before chunking. Unlike `clean_text` this keeps line breaks
+        and list numbering, which section and clause detection rely on.
+        """
+        if not text:
+            return ""
+        return self._fused_clean(self._normalize(text), preserve_lines=True)
+
+    def clean_pages(self, pages: List[str]) -> List[str]:
+        """Clean many pages; see `clean_pages` at module level for running it in worker processes"""
+        return [self.clean_page(page) for page in pages]
+
+    @staticmethod
+    def _normalize(text: str) -> str:
+        # Normalize unicode characters; ASCII text is already in normal form
+        return text if text.isascii() else unicodedata.normalize('NFKD', text)
+
+    @staticmethod
+    def _fused_clean(text: str, preserve_lines: bool) -> str:
+        """
+        Strip page numbers, normalize bullets and numbered lists and collapse whitespace
+        in a single line-by-line pass. `str.split` does the whitespace work in C, and
+        there is no regex that can backtrack over long whitespace runs.
+        """
+        text = PAGE_NUMBER_PATTERN.sub('', text)
+
+        lines = []
+        blank_pending = False
+        for line in text.split('\n'):
+            words = line.split()
+            if not words:
+                blank_pending = bool(lines)
+                continue
+
+            first = words[0]
+            if first[0] in BULLET_CHARS:
+                # "•item" and "• item" both become "• item"
+                words[0] = first[1:]
+                if not words[0]:
+                    del words[0]
+                words.insert(0, '•')
+            elif not preserve_lines and first[-1] == '.' and first[:-1].isdigit():
+                # Drop list numbering ("12.") when flattening, keep it otherwise
+                del words[0]
+                if not words:
+                    continue
+
+            if preserve_lines and blank_pending:
+                lines.append('')
+            blank_pending = False
+            lines.append(' '.join(words))
+
+        return ('\n' if preserve_lines else ' ').join(lines)
+
     def extract_policy_sections(self, text: str) -> Dict[str, str]:
         """Extract common policy sections"""
         sections = {}
-        
-        # Common section headers
-        section_patterns = {
-            'definitions': r'definitions?\s*:?\s*(.*?)(?=\n[A-Z\s]+:|\n\d+\.|\Z)',
-            'coverage': r'coverage\s*:?\s*(.*?)(?=\n[A-Z\s]+:|\n\d+\.|\Z)',
-            'exclusions': r'exclusions?\s*:?\s*(.*?)(?=\n[A-Z\s]+:|\n\d+\.|\Z)',
-            'waiting_period': r'waiting\s+period\s*:?\s*(.*?)(?=\n[A-Z\s]+:|\n\d+\.|\Z)',
-            'claims': r'claims?\s*:?\s*(.*?)(?=\n[A-Z\s]+:|\n\d+\.|\Z)',
-        }
-        
-        for section_name, pattern in section_patterns.items():
-            match = re.search(pattern, text, re.IGNORECASE | re.DOTALL)
-            if match:
-                sections[section_name] = self.clean_text(match.group(1))
-        
+
+        for match in POLICY_SECTION_PATTERN.finditer(text):
+            section_name = match.lastgroup
+            if section_name in sections:
+                continue
+
+            body_start = SECTION_SEPARATOR_PATTERN.match(text, match.end()).end()
+            # The section runs until the next line that starts a new section
+            boundary = SECTION_BOUNDARY_PATTERN.search(text, match.end())
+            body_end = boundary.start() - 1 if boundary else len(text)
+
+            sections[section_name] = self.clean_text(text[body_start:max(body_start, body_end)])
+            if len(sections) == 5:
+                break
+
         return sections
-    
+
+    def sentence_spans(self, text: str) -> List[Tuple[int, int]]:
+        """
+        (start, end) offsets of the sentences in `text`, without surrounding whitespace.
+        Decimals, amounts and abbreviations ("Rs.", "No.", "e.g.") do not end a sentence.
+        """
+        spans = []
+        start = 0
+        for match in SENTENCE_END_PATTERN.finditer(text):
+            token = LAST_TOKEN_PATTERN.search(text, start, match.start())
+            if token is not None:
+                word = token.group(1).lstrip('("\'[').lower()
+                if word in ABBREVIATIONS:
+                    continue
+                # A clause number opening a line or the text, not a sentence of its own
+                line_start = text.rfind('\n', 0, token.start()) + 1
+                if CLAUSE_NUMBER_TOKEN.match(word) and not text[line_start:token.start()].strip():
+                    continue
+            # "... 30 days. after which" is one sentence
+            following = text[match.end():match.end() + 2].lstrip()
+            if following[:1].islower():
+                continue
+            spans.append((start, match.end()))
+            start = match.end()
+        spans.append((start, len(text)))
+
+        stripped = []
+        for begin, end in spans:
+            piece = text[begin:end]
+            begin += len(piece) - len(piece.lstrip())
+            end -= len(piece) - len(piece.rstrip())
+            if begin < end:
+                stripped.append((begin, end))
+        return stripped
+
     def split_into_sentences(self, text: str) -> List[str]:
-        """Split text into sentences"""
-        # Simple sentence splitting
-        sentences = re.split(r'[.!?]+', text)
-        
-        # Clean and filter sentences
-        clean_sentences = []
-        for sentence in sentences:
-            sentence = sentence.strip()
-            if len(sentence) > 10:  # Filter very short sentences
-                clean_sentences.append(sentence)
-        
-        return clean_sentences
+        """Split text into sentences, leaving out very short ones"""
+        sentences = (text[start:end] for start, end in self.sentence_spans(text))
+        return [sentence for sentence in sentences if len(sentence) > 10]